@@ -1,78 +1,63 @@
+import argparse
 import json
+import logging
 import os
-from typing import Dict, List, Optional
-
-def score_grow_ease(texts):
-  """育成難易度をスコア化する関数（重み付きキーワード）"""
-  text = " ".join(texts).lower()  # 配列を1つの文字列にまとめて小文字に変換
-  score = 0
-
-  # 育てやすい表現（プラス評価）- 重み付き
-  easy_keywords = {
-      # 高重要度 (重み: 3.0)
-      "育てやすい": 3.0,"初心者": 3.0,"簡単": 3.0,"手間がかからない": 3.0,"失敗しにくい": 3.0,
-      "栽培しやすい": 3.0,"管理が楽": 3.0,"初心者向け": 3.0,"手間いらず": 3.0,"作りやすい": 3.0,
-      "栽培が容易": 3.0,"管理しやすい": 3.0,
-
-      # 中重要度 (重み: 2.0)
-      "丈夫": 2.0,"強い": 2.0,"強健": 2.0,"枯れにくい": 2.0,"耐寒性": 2.0,"耐暑性": 2.0,
-      "寒さに強い": 2.0,"病気に強い": 2.0,"乾燥に強い": 2.0,"手軽": 2.0,"簡単に": 2.0,
-      "ビギナー": 2.0,"丈夫で": 2.0,"強く": 2.0,"優れている": 2.0,
-
-      # 低重要度 (重み: 1.0)
-      "水やり少ない": 1.0,"日光があれば": 1.0,"おすすめ": 1.0,"放置": 1.0,"育てやすく": 1.0,
-      "プランター": 1.0,"室内": 1.0,"ベランダ": 1.0,"育てやすい野菜": 1.0,"日当たりを好み": 1.0,
-      "風通しの良い": 1.0,"真冬でも": 1.0,"ゆっくり": 1.0,"生育します": 1.0,"人気": 1.0,
-  }
-
-  # 育てにくい表現（マイナス評価）- 重み付き
-  hard_keywords = {
-      # 高重要度 (重み: -3.0)
-      "難しい": -3.0,"繊細": -3.0,"デリケート": -3.0,"専門知識": -3.0,"経験者向け": -3.0,
-      "難易度が高い": -3.0,"上級者": -3.0,"複雑": -3.0,"困難": -3.0,"失敗しやすい": -3.0,
-      "栽培が難しい": -3.0,"管理が大変": -3.0,"育てにくい": -3.0,
-
-      # 中重要度 (重み: -2.0)
-      "管理が必要": -2.0,"病気に弱い": -2.0,"寒さに弱い": -2.0,"暑さに弱い": -2.0,"注意が必要": -2.0,
-      "手間がかかる": -2.0,"発芽しにくい": -2.0,"結実が難しい": -2.0,"高温に弱い": -2.0,
-      "低温に弱い": -2.0,"害虫に注意": -2.0,"温度管理": -2.0,"湿度管理": -2.0,"コツが必要": -2.0,
-      "手間": -2.0,"乾燥すると生育が悪く": -2.0,"こまめに行いましょう": -2.0,
-
-      # 低重要度 (重み: -1.0)
-      "剪定": -1.0,"支柱": -1.0,"毎日水やり": -1.0,"加湿に注意": -1.0,"病害虫が発生": -1.0,
-      # "種": -1.0,
-      "アブラムシ": -1.0,"うどんこ病": -1.0,"モザイク病": -1.0,"根腐れ": -1.0,
-      "頻繁に水やり": -1.0,"ヨトウムシ": -1.0,"木酢液": -1.0,"害虫対策": -1.0,"食味が落ち": -1.0,
-  }
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from instrumentation import configure_logging, get_logger, print_stage_summary, registry, stage_timer
+from keyword_matcher import KeywordMatcher
+from lexicon import Lexicon, get_lexicon, set_lexicon
+from plant_records import iter_plant_records, load_plant_records
+from plant_store import DEFAULT_CHANGES_PATH, DEFAULT_DB_PATH, PlantStore
+from score_index import RankedOutput, ScoreIndex, index_path_for, json_block
+from text_normalization import prepare_text
+
+logger = get_logger("assessment")
+
+# キーワード辞書は lexicon.json に置き、lexicon.py で読み込み・コンパイルする
+# （app.py はファイルの更新を検知して再起動なしで差し替える）
+
+def get_keyword_matcher() -> KeywordMatcher:
+  """現在のキーワード辞書をコンパイルしたマッチャーを返す"""
+  return get_lexicon().matcher
+
+def clamp_score(score: float) -> float:
+  """重み付きの合計を0〜10点の範囲に収める"""
+  return max(0, min(score, 10))  # スコアは0〜10の範囲に拡大
 
-  # デバッグ用: マッチしたキーワードを確認
-  matched_easy = []
-  matched_hard = []
+def score_grow_ease(texts, verbose: bool = True, lexicon: Optional[Lexicon] = None):
+  """育成難易度をスコア化する関数（重み付きキーワード）
 
-  # プラス評価キーワードのチェック
-  for keyword, weight in easy_keywords.items():
-    if keyword in text:
-      score += weight
-      matched_easy.append((keyword, weight))
+  texts はテキストの配列、または prepare_text() で正規化済みの文字列。
+  verbose=True でもログレベルが DEBUG でなければ詳細は組み立てない。
+  lexicon を省略した場合は現在のキーワード辞書を使う。
+  """
+  with stage_timer("score"):
+    # 段落ごとに正規化（NFKC・小文字・空白）した照合用の文字列（段落単位でキャッシュ）
+    text = texts if isinstance(texts, str) else prepare_text(texts)
+    score = 0
 
-  # マイナス評価キーワードのチェック
-  for keyword, weight in hard_keywords.items():
-    if keyword in text:
-      score += weight  # weightは既に負の値
-      matched_hard.append((keyword, weight))
+    # 1回の走査で全キーワードを検出し、登録順に加点・減点する
+    matcher = (lexicon or get_lexicon()).matcher
+    matched = matcher.matched_indices(text)
+    for index in matched:
+      score += matcher.weights[index]  # マイナス評価のweightは既に負の値
 
   # デバッグ情報を出力（マッチしたキーワードがある場合のみ）
-  if matched_easy or matched_hard:
-    print(f"  マッチしたキーワード:")
+  if verbose and matched and logger.isEnabledFor(logging.DEBUG):
+    matched_easy = [(matcher.keywords[i], matcher.weights[i]) for i in matched if matcher.weights[i] > 0]
+    matched_hard = [(matcher.keywords[i], matcher.weights[i]) for i in matched if matcher.weights[i] <= 0]
+    logger.debug("  マッチしたキーワード:")
     if matched_easy:
-      easy_str = ", ".join([f"{kw}({w})" for kw, w in matched_easy[:3]])
-      print(f"    簡単: {easy_str}")
+      logger.debug("    簡単: %s", ", ".join([f"{kw}({w})" for kw, w in matched_easy[:3]]))
     if matched_hard:
-      hard_str = ", ".join([f"{kw}({w})" for kw, w in matched_hard[:3]])
-      print(f"    難しい: {hard_str}")
-    print(f"    合計スコア: {score:.1f}")
+      logger.debug("    難しい: %s", ", ".join([f"{kw}({w})" for kw, w in matched_hard[:3]]))
+    logger.debug("    合計スコア: %.1f", score)
 
-  return max(0, min(score, 10))  # スコアは0〜10の範囲に拡大
+  return clamp_score(score)
 
 def load_plant_data(json_file_path: str) -> Optional[Dict]:
   """JSONファイルから植物データを読み込む"""
@@ -81,10 +66,10 @@ def load_plant_data(json_file_path: str) -> Optional[Dict]:
       print(f"❌ ファイルが見つかりません: {json_file_path}")
       return None
 
-    with open(json_file_path, 'r', encoding='utf-8') as f:
-      data = json.load(f)
-      print(f"✅ JSONファイルを読み込みました: {json_file_path}")
-      return data
+    # JSONL形式（1行1植物）も辞書として読み込める
+    data = load_plant_records(json_file_path)
+    print(f"✅ JSONファイルを読み込みました: {json_file_path}")
+    return data
   except json.JSONDecodeError as e:
     print(f"❌ JSONファイルの形式が正しくありません: {e}")
     return None
@@ -92,20 +77,8 @@ def load_plant_data(json_file_path: str) -> Optional[Dict]:
     print(f"❌ ファイル読み込みエラー: {e}")
     return None
 
-def assess_plant_growability(plant_data: Dict, plant_name: str) -> Dict:
-  """単一の植物の育成難易度を評価する"""
-
-  if plant_name not in plant_data:
-    return {
-        "植物名": plant_name,
-        "評価": "データなし",
-        "スコア": 0,
-        "理由": "植物データが見つかりません"
-    }
-
-  plant_info = plant_data[plant_name]
-
-  # テキストデータを収集
+def collect_texts(plant_info) -> List[str]:
+  """植物データ（テキストの配列、または従来の辞書形式）から評価対象のテキストを集める"""
   texts = []
 
   # データがリスト形式の場合
@@ -138,75 +111,196 @@ def assess_plant_growability(plant_data: Dict, plant_name: str) -> Dict:
       else:
         texts.append(str(plant_info["その他"]))
 
-  # デバッグ用: テキストの内容を確認
-  print(f"\n🔍 {plant_name} の分析:")
-  print(f"  テキスト数: {len(texts)}")
-  if texts:
-    combined_text = " ".join(texts)
-    print(f"  テキスト例: {combined_text[:100]}...")
+  return texts
 
-  # スコア計算
-  score = score_grow_ease(texts)
-
-  # 評価レベル決定（10点満点に対応）
-  if score >= 8:
-    level = "とても育てやすい"
-  elif score >= 6:
-    level = "育てやすい"
-  elif score >= 4:
-    level = "普通"
-  elif score >= 2:
-    level = "やや難しい"
-  else:
-    level = "難しい"
+# 評価レベルの下限スコア（高い順）。どれにも満たなければ LOWEST_LEVEL
+LEVEL_THRESHOLDS = [(8, "とても育てやすい"), (6, "育てやすい"), (4, "普通"), (2, "やや難しい")]
+LOWEST_LEVEL = "難しい"
+
+def score_to_level(score: float) -> str:
+  """0〜10点のスコアを評価レベルに変換する（10点満点に対応）"""
+  for threshold, level in LEVEL_THRESHOLDS:
+    if score >= threshold:
+      return level
+  return LOWEST_LEVEL
 
+def make_assessment(plant_name: str, score: float, text_count: int,
+                    lexicon_version: Optional[str] = None) -> Dict:
+  """スコアから評価結果の辞書を作る（評価に使ったキーワード辞書のバージョン付き）"""
   return {
       "植物名": plant_name,
-      "評価": level,
+      "評価": score_to_level(score),
       "スコア": round(score, 1),
-      "理由": f"分析したテキスト: {len(texts)}件, 重み付きスコア: {score:.1f}"
+      "理由": f"分析したテキスト: {text_count}件, 重み付きスコア: {score:.1f}",
+      "辞書バージョン": lexicon_version or get_lexicon().version,
   }
 
-def assess_all_plants(plant_data: Dict) -> List[Dict]:
-  """すべての植物の育成難易度を評価する"""
-  results = []
+def assess_plant_growability(plant_data: Dict, plant_name: str, verbose: bool = True,
+                             lexicon: Optional[Lexicon] = None) -> Dict:
+  """単一の植物の育成難易度を評価する"""
+  lexicon = lexicon or get_lexicon()
 
-  print(f"🔄 {len(plant_data)}件の植物を評価中...")
+  if plant_name not in plant_data:
+    return {
+        "植物名": plant_name,
+        "評価": "データなし",
+        "スコア": 0,
+        "理由": "植物データが見つかりません",
+        "辞書バージョン": lexicon.version,
+    }
 
-  for i, plant_name in enumerate(plant_data.keys()):
-    print(f"\n評価中 ({i+1}/{len(plant_data)}): {plant_name}")
-    result = assess_plant_growability(plant_data, plant_name)
-    results.append(result)
+  # テキストデータを収集し、照合用の文字列にする（デバッグ表示とスコア計算で共用）
+  texts = collect_texts(plant_data[plant_name])
+  text = prepare_text(texts)
 
-    # 最初の3件だけ詳細を表示
-    if i >= 2:
-      print("\n  (以降の詳細表示を省略...)")
-      break
+  # デバッグ用: テキストの内容を確認
+  if verbose and logger.isEnabledFor(logging.DEBUG):
+    logger.debug("\n🔍 %s の分析:", plant_name)
+    logger.debug("  テキスト数: %d", len(texts))
+    if text:
+      logger.debug("  テキスト例: %s...", text[:100])
 
-  # 残りの植物を評価（詳細表示なし）
-  for plant_name in list(plant_data.keys())[3:]:
-    result = assess_plant_growability(plant_data, plant_name)
-    results.append(result)
+  # スコア計算
+  score = score_grow_ease(text, verbose=verbose, lexicon=lexicon)
+  return make_assessment(plant_name, score, len(texts), lexicon.version)
+
+def _init_worker(lexicon: Lexicon):
+  """ワーカープロセスで親と同じキーワード辞書を使う（途中でファイルが変わっても混ざらない）"""
+  set_lexicon(lexicon)
+
+def _assess_chunk(chunk: List[tuple]) -> Tuple[List[Dict], Dict]:
+  """ワーカープロセスで (植物名, データ) のまとまりを評価する
+
+  計測値は親プロセスで集計できるよう、評価結果と一緒に返す。
+  """
+  registry.drain()  # fork時に親から引き継いだ値や前のチャンクの値は捨てる
+  plant_data = dict(chunk)
+  results = [assess_plant_growability(plant_data, plant_name, verbose=False)
+             for plant_name, _ in chunk]
+  return results, registry.drain()
+
+def _collect_chunk(results: List[Dict], chunk_result: Tuple[List[Dict], Dict]):
+  chunk_results, metrics = chunk_result
+  results.extend(chunk_results)
+  registry.merge(metrics)
+
+def assess_all_plants(plant_data: Dict, verbose: bool = True,
+                      workers: int = 1, chunk_size: int = 64,
+                      lexicon: Optional[Lexicon] = None) -> List[Dict]:
+  """すべての植物の育成難易度を評価する（verbose=Falseで途中経過を表示しない）
+
+  workers>1 の場合は植物をchunk_size件ずつに分けてプロセスプールで並列評価する。
+  チャンクの結果は元の順番で結合してからソートするため、
+  出力は workers の値によらず逐次評価と同一になる。
+  全件を開始時点のキーワード辞書（または lexicon）で評価する。
+  """
+  results = []
+  lexicon = lexicon or get_lexicon()
+
+  if verbose:
+    print(f"🔄 {len(plant_data)}件の植物を評価中..." +
+          (f" ({workers}プロセス)" if workers > 1 else ""))
+
+  if workers > 1:
+    items = list(plant_data.items())
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(lexicon,)) as executor:
+      for chunk_result in executor.map(_assess_chunk, chunks):
+        _collect_chunk(results, chunk_result)
+  else:
+    for i, plant_name in enumerate(plant_data):
+      # 最初の3件だけ詳細を表示
+      detail = verbose and i < 3
+      if detail:
+        logger.debug("\n評価中 (%d/%d): %s", i + 1, len(plant_data), plant_name)
+      elif verbose and i == 3:
+        logger.debug("\n  (以降の詳細表示を省略...)")
+      results.append(assess_plant_growability(plant_data, plant_name, verbose=detail,
+                                              lexicon=lexicon))
 
   # スコア順でソート
   results.sort(key=lambda x: x["スコア"], reverse=True)
 
   return results
 
+def assess_plant_records(records: Iterable[Tuple[str, List[str]]],
+                         workers: int = 1, chunk_size: int = 64,
+                         lexicon: Optional[Lexicon] = None) -> List[Dict]:
+  """(植物名, テキスト一覧) の列を1件ずつ評価する
+
+  植物データ全体を辞書に読み込まずに評価するため、iter_plant_records と
+  組み合わせるとメモリ使用量はコーパスの大きさに依存しない
+  （保持するのは小さな評価結果だけ）。
+  """
+  results = []
+  lexicon = lexicon or get_lexicon()
+
+  if workers > 1:
+    # 処理中のチャンク数を制限し、読み込みが評価より先に進みすぎないようにする
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(lexicon,)) as executor:
+      for chunk in _iter_chunks(records, chunk_size):
+        pending.append(executor.submit(_assess_chunk, chunk))
+        if len(pending) >= workers * 2:
+          _collect_chunk(results, pending.popleft().result())
+      while pending:
+        _collect_chunk(results, pending.popleft().result())
+  else:
+    for plant_name, texts in records:
+      results.append(assess_plant_growability({plant_name: texts}, plant_name, verbose=False,
+                                              lexicon=lexicon))
+
+  # スコア順でソート
+  results.sort(key=lambda x: x["スコア"], reverse=True)
+  return results
+
+def _iter_chunks(records: Iterable[Tuple[str, List[str]]], chunk_size: int):
+  chunk = []
+  for record in records:
+    chunk.append(record)
+    if len(chunk) >= chunk_size:
+      yield chunk
+      chunk = []
+  if chunk:
+    yield chunk
+
+def reassess_changed_plants(index: ScoreIndex, records: Iterable[Tuple[str, List[str]]],
+                            changes: Dict, order: Dict[str, int],
+                            lexicon: Optional[Lexicon] = None) -> Tuple[List[Dict], List[str], int]:
+  """クロールの変更一覧（新規・変更・削除）に該当する植物だけを再評価し、索引に反映する
+
+  order は現在の植物名 → 収集順。変更一覧に無くても索引に無い植物は新規として評価し、
+  order に無い植物（削除・重複になった植物）は索引から消す。
+  records は (植物名, テキスト一覧) の列で、対象外の植物が含まれていても評価しない。
+  (再評価した結果, 削除した植物名, 最初に順位が変わった位置) を返す。
+  索引が現在のキーワード辞書で作られたものである場合だけ正しい結果になる。
+  """
+  lexicon = lexicon or get_lexicon()
+  targets = set(changes.get("new", [])) | set(changes.get("changed", []))
+
+  results = [assess_plant_growability({plant_name: texts}, plant_name, verbose=False,
+                                      lexicon=lexicon)
+             for plant_name, texts in records
+             if plant_name in order and (plant_name in targets or plant_name not in index)]
+  removed = [plant_name for plant_name in index.entries if plant_name not in order]
+  first_rank = index.update(results, removed, order)
+
+  print(f"🔄 差分評価: 再評価 {len(results)}件, 削除 {len(removed)}件")
+  return results, removed, first_rank
+
 def get_keyword_weights_summary():
   """キーワード重みの設定を表示"""
+  lexicon = get_lexicon()
   print("\nキーワード重み設定:")
   print("=" * 50)
+  print(f"辞書: {lexicon.path} (バージョン {lexicon.version})")
 
-  print("【育てやすさキーワード】")
-  print("  高重要度 (重み: 3.0): 育てやすい, 初心者, 簡単, 手間がかからない等")
-  print("  中重要度 (重み: 2.0): 丈夫, 強い, 耐寒性, 病気に強い等")
-  print("  低重要度 (重み: 1.0): おすすめ, 人気, プランター, 室内等")
-
-  print("\n【育てにくさキーワード】")
-  print("  高重要度 (重み: -3.0): 難しい, 繊細, 専門知識, 経験者向け等")
-  print("  中重要度 (重み: -2.0): 管理が必要, 病気に弱い, 注意が必要等")
-  print("  低重要度 (重み: -1.0): 剪定, 支柱, アブラムシ, 害虫対策等")
+  for section, title in (("easy", "育てやすさキーワード"), ("hard", "育てにくさキーワード")):
+    print(f"\n【{title}】")
+    for weight, keywords in lexicon.tiers(section):
+      print(f"  重み {weight:+.1f} ({len(keywords)}語): {', '.join(keywords[:4])}等")
 
   print("\nスコア範囲: 0〜10点 (10点が最も育てやすい)")
 
@@ -254,6 +348,59 @@ def save_assessment_results(results: List[Dict], output_file: str):
   except Exception as e:
     print(f"❌ 結果保存エラー: {e}")
 
+def report_header(lexicon_version: str) -> str:
+  """詳細レポートの見出し"""
+  return ("植物育成難易度評価レポート (重み付きキーワード版)\n"
+          f"キーワード辞書: バージョン {lexicon_version}\n" + "=" * 60 + "\n\n")
+
+def report_block(result: Dict) -> str:
+  """詳細レポートの植物1件分"""
+  return (f"植物名: {result['植物名']}\n"
+          f"評価: {result['評価']}\n"
+          f"スコア: {result['スコア']}点\n"
+          f"理由: {result['理由']}\n" + "-" * 30 + "\n")
+
+def assessment_outputs(output_file: str, report_file: str, lexicon_version: str) -> List[RankedOutput]:
+  """評価結果のJSON（save_assessment_results と同じ形式）と詳細レポート"""
+  return [RankedOutput(output_file, "[\n", json_block, ",\n", "\n]", empty="[]"),
+          RankedOutput(report_file, report_header(lexicon_version), report_block)]
+
+def write_assessment_outputs(results: List[Dict], outputs: List[RankedOutput],
+                             order: Dict[str, int], lexicon_version: str) -> ScoreIndex:
+  """全件の評価結果を書き出し、次回の差分評価に使う索引を返す"""
+  index = ScoreIndex.from_results(results, order, lexicon_version)
+  by_name = {result["植物名"]: result for result in results}
+  ranked = [by_name[plant_name] for plant_name in index.names()]
+  for output in outputs:
+    index.layouts[output.path] = output.write(ranked)
+    print(f"✅ 評価結果を保存しました: {output.path}")
+  return index
+
+def patch_assessment_outputs(index: ScoreIndex, outputs: List[RankedOutput], old_names: List[str],
+                             results: List[Dict], first_rank: int):
+  """再評価した植物の分だけ出力ファイルを書き換える（first_rank 位より前はそのまま）"""
+  changed = {result["植物名"]: result for result in results}
+  new_names = index.names()
+  for output in outputs:
+    index.layouts[output.path] = output.patch(index.layouts[output.path], old_names, new_names,
+                                              changed, first_rank)
+    print(f"✅ 評価結果を更新しました: {output.path} ({first_rank + 1}位以降)"
+          if first_rank < len(new_names) else f"✅ 評価結果に変更はありません: {output.path}")
+
+def load_score_index(index_file: str, outputs: List[RankedOutput],
+                     lexicon_version: str) -> Optional[ScoreIndex]:
+  """前回の評価の索引を読み込む（差分評価に使えない場合は None）"""
+  index = ScoreIndex.load(index_file)
+  if index is None:
+    return None
+  if index.lexicon_version != lexicon_version:
+    print("\n⚠️ 前回の評価は別のキーワード辞書で行われているため全件を再評価します")
+    return None
+  if not all(output.matches(index.layouts.get(output.path)) for output in outputs):
+    print("\n⚠️ 評価結果のファイルが前回の評価の後に書き換えられているため全件を再評価します")
+    return None
+  return index
+
 def print_assessment_summary(results: List[Dict]):
   """評価結果のサマリーを表示"""
   print(f"\n{'='*60}")
@@ -298,6 +445,11 @@ def print_assessment_summary(results: List[Dict]):
 
 def main():
   """メイン処理"""
+  parser = argparse.ArgumentParser(description="植物の育成難易度を評価する（入力ファイルは対話的に指定）")
+  parser.add_argument("--changes", default=DEFAULT_CHANGES_PATH,
+                      help="差分評価に使うクロールの変更一覧（web_scraping.py / crawl_worker.py collect の --changes）")
+  args = parser.parse_args()
+  configure_logging()  # 環境変数 PLANT_LOG_LEVEL=DEBUG で評価の詳細を表示
   print("🌱 植物育成難易度評価システム (重み付きキーワード版)")
   print("=" * 60)
 
@@ -305,46 +457,111 @@ def main():
   get_keyword_weights_summary()
 
   # JSONファイル名を指定
-  json_file_path = input("\nJSONファイルのパスを入力してください: ").strip()
+  json_file_path = input("\nJSONファイル（またはデータベース .db）のパスを入力してください: ").strip()
 
   if not json_file_path:
-    json_file_path = "vegetable_data_structured.json"  # デフォルト値
+    # デフォルト値（web_scraping.py が保存したデータベースがあればそれを使う）
+    json_file_path = DEFAULT_DB_PATH if os.path.exists(DEFAULT_DB_PATH) else "vegetable_data_structured.json"
     print(f"デフォルトファイルを使用します: {json_file_path}")
 
-  # データ読み込み
-  plant_data = load_plant_data(json_file_path)
-  if not plant_data:
-    return
-
-  print(f"読み込んだ植物数: {len(plant_data)}件")
-
-  # デバッグ: データ内容を確認
-  debug_plant_data(plant_data)
+  # JSONL形式・データベースは全体を読み込まず1件ずつ評価する
+  use_store = json_file_path.endswith(".db")
+  streaming = json_file_path.endswith(".jsonl") or use_store
+  if streaming:
+    if not os.path.exists(json_file_path):
+      print(f"❌ ファイルが見つかりません: {json_file_path}")
+      return
+    print(f"1件ずつ読み込んで評価します: {json_file_path}")
+    plant_data = None
+    store = PlantStore(json_file_path) if use_store else None
+    revision = store.revision() if store else None
+  else:
+    # データ読み込み
+    plant_data = load_plant_data(json_file_path)
+    if not plant_data:
+      return
 
-  # 評価実行
-  print("\n評価を実行中...")
-  results = assess_all_plants(plant_data)
+    print(f"読み込んだ植物数: {len(plant_data)}件")
 
-  # 結果表示
-  print_assessment_summary(results)
+    # デバッグ: データ内容を確認
+    debug_plant_data(plant_data)
 
-  # 結果保存
   output_file = "plant_growability_assessment_weighted.json"
-  save_assessment_results(results, output_file)
-
-  # 詳細結果をテキストファイルに保存
-  with open("plant_growability_report_weighted.txt", "w", encoding="utf-8") as f:
-    f.write("植物育成難易度評価レポート (重み付きキーワード版)\n")
-    f.write("=" * 60 + "\n\n")
-
-    for result in results:
-      f.write(f"植物名: {result['植物名']}\n")
-      f.write(f"評価: {result['評価']}\n")
-      f.write(f"スコア: {result['スコア']}点\n")
-      f.write(f"理由: {result['理由']}\n")
-      f.write("-" * 30 + "\n")
-
-  print("詳細レポートを保存しました: plant_growability_report_weighted.txt")
+  report_file = "plant_growability_report_weighted.txt"
+  changes_file = args.changes
+  lexicon = get_lexicon()
+  outputs = assessment_outputs(output_file, report_file, lexicon.version)
+  index_file = index_path_for(output_file)
+
+  # 前回の評価の索引とクロールの変更一覧があれば差分だけ再評価し、
+  # 出力ファイルも順位が変わった位置から後ろだけを書き換える
+  index = None
+  if os.path.exists(changes_file):
+    index = load_score_index(index_file, outputs, lexicon.version)
+  elif args.changes != DEFAULT_CHANGES_PATH:
+    print(f"⚠️ 変更一覧が見つからないため全件を評価します: {changes_file}")
+  if index is not None:
+    answer = input(f"\n{changes_file} の差分のみ再評価しますか？ (y/N): ").strip().lower()
+    if answer != "y":
+      index = None
+
+  if index is not None:
+    start = time.perf_counter()
+    with open(changes_file, 'r', encoding='utf-8') as f:
+      changes = json.load(f)
+    targets = set(changes.get("new", [])) | set(changes.get("changed", []))
+    if use_store:
+      # 再評価対象の植物の本文だけを読み込む
+      order = store.plant_order()
+      records = store.iter_plant_records(
+          {name for name in order if name in targets or name not in index})
+    elif streaming:
+      order, records = {}, []
+      for plant_name, texts in iter_plant_records(json_file_path):
+        order.setdefault(plant_name, len(order))
+        if plant_name in targets or plant_name not in index:
+          records.append((plant_name, texts))
+    else:
+      order = {plant_name: position for position, plant_name in enumerate(plant_data)}
+      records = plant_data.items()
+
+    old_names = index.names()
+    results, removed, first_rank = reassess_changed_plants(index, records, changes, order, lexicon)
+    patch_assessment_outputs(index, outputs, old_names, results, first_rank)
+    if use_store:
+      store.update_scores(results, removed, revision)
+    index.save(index_file)
+    print(f"⏱️ 差分評価: {(time.perf_counter() - start) * 1000:.1f}ms")
+    print_assessment_summary(index.summary_results())
+  else:
+    # 評価実行
+    print("\n評価を実行中...")
+    if streaming:
+      order = {}
+      def tap(records):
+        # 評価しながら収集順を記録する（同点の並び順に使う）
+        for plant_name, texts in records:
+          order.setdefault(plant_name, len(order))
+          yield plant_name, texts
+      records = store.iter_plant_records() if use_store else iter_plant_records(json_file_path)
+      results = assess_plant_records(tap(records), workers=os.cpu_count() or 1, lexicon=lexicon)
+    else:
+      order = {plant_name: position for position, plant_name in enumerate(plant_data)}
+      results = assess_all_plants(plant_data, workers=os.cpu_count() or 1, lexicon=lexicon)
+
+    # 結果表示
+    print_assessment_summary(results)
+
+    # 結果保存（評価結果・詳細レポートと、次回の差分評価に使う索引）
+    index = write_assessment_outputs(results, outputs, order, lexicon.version)
+    index.save(index_file)
+    if use_store:
+      store.save_scores(results, revision)
+
+  if use_store:
+    store.close()
+    print(f"✅ 評価結果をデータベースに保存しました: {json_file_path}")
+  print_stage_summary()
 
 if __name__ == "__main__":
   main()
@@ -1,22 +1,233 @@
-from flask import Flask, render_template, request
-from Growability_Assessment import assess_all_plants, load_plant_data
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+from flask import Flask, Response, g, render_template, request
+from Growability_Assessment import assess_plant_records
+from instrumentation import registry
+from lexicon import get_lexicon, reload_if_changed
+from plant_records import iter_plant_records
+from plant_index import PlantIndex, load_categories
+from plant_store import DEFAULT_DB_PATH, PlantStore
 
 app = Flask(__name__)
 
-# 既に保存されているJSONファイルのパス
-JSON_PATH = "all_plants_data.json"
+# 植物データベース（get_urls.py / web_scraping.py が保存）。無ければ下のファイルを使う
+DB_PATH = DEFAULT_DB_PATH
+# 既に保存されている植物データのパス（JSONLが無ければ従来のJSON）
+JSON_PATH = "all_plants_data.jsonl" if os.path.exists("all_plants_data.jsonl") else "all_plants_data.json"
+# カテゴリ情報を持つURL一覧
+URLS_CSV_PATH = "all_plants_urls.csv"
+
+# 評価を並列実行するプロセス数
+ASSESS_WORKERS = os.cpu_count() or 1
+
+# この大きさ未満のレスポンスは圧縮しない
+GZIP_MIN_SIZE = 1024
+
+# 評価結果のキャッシュ（データファイルの更新日時・サイズかキーワード辞書のバージョンが変わったら作り直す）
+# (キー, インデックス) の組を1回の代入で差し替えるので、読み出しにロックは不要
+_cache = {"entry": (None, None), "building": None}
+_cache_lock = threading.Lock()
+# スレッドごとのデータベース接続（更新回数の確認用）
+_local = threading.local()
+
+def _data_file_key(path):
+    """キャッシュの有効性を判定するためのキー（更新日時とサイズ）"""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _data_key():
+    """データベースがあればその更新回数、無ければデータファイルの更新日時・サイズ"""
+    if os.path.exists(DB_PATH):
+        if getattr(_local, "store", None) is None:
+            _local.store = PlantStore(DB_PATH)
+        return ("db", _local.store.revision())
+    return _data_file_key(JSON_PATH)
+
+def _load_results(lexicon):
+    """評価結果と植物名→カテゴリを返す
+
+    データベースに現在の本文・辞書での評価結果があればそれを読み込み、
+    無ければ評価してデータベースに保存する。
+    """
+    if os.path.exists(DB_PATH):
+        with PlantStore(DB_PATH) as store:
+            revision = store.revision()
+            results = store.load_scores(lexicon.version)
+            if results is None:
+                results = assess_plant_records(store.iter_plant_records(), workers=ASSESS_WORKERS,
+                                               lexicon=lexicon)
+                store.save_scores(results, revision)
+            return results, store.categories()
+    if not os.path.exists(JSON_PATH):
+        raise FileNotFoundError(f"{JSON_PATH} を読み込めませんでした")
+    results = assess_plant_records(iter_plant_records(JSON_PATH), workers=ASSESS_WORKERS,
+                                   lexicon=lexicon)
+    return results, load_categories(URLS_CSV_PATH)
+
+def _make_index(key, lexicon):
+    """評価結果のインデックスを作る（キャッシュには入れない）"""
+    with registry.timer("index_build_seconds"):
+        results, categories = _load_results(lexicon)
+        version = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        index = PlantIndex(results, categories, version)
+    registry.inc("index_builds_total")
+    return index
+
+def _build_index(key, lexicon):
+    """評価結果のインデックスを作ってキャッシュに入れる"""
+    index = _make_index(key, lexicon)
+    _cache["entry"] = (key, index)
+    return index
+
+def _rebuild_in_background(key, lexicon):
+    """新しいキーのインデックスを別スレッドで作る（同じキーの作成は1つだけ）
+
+    作成はロックの外で行い、ロックは完成したインデックスとの差し替えの間だけ取る。
+    作成中のリクエストは前のインデックスで応答する。
+    """
+    with _cache_lock:
+        if _cache["building"] == key:
+            return
+        _cache["building"] = key
+
+    def run():
+        try:
+            index = _make_index(key, lexicon)
+            with _cache_lock:
+                if _cache["entry"][0] != key:
+                    _cache["entry"] = (key, index)
+        except Exception as e:
+            registry.inc("index_build_errors_total")
+            app.logger.warning("評価結果の作り直しに失敗しました: %s", e)
+        finally:
+            with _cache_lock:
+                if _cache["building"] == key:
+                    _cache["building"] = None
+
+    threading.Thread(target=run, daemon=True).start()
+
+def get_plant_index():
+    """キャッシュ済みの評価結果インデックスを返す
+
+    データ（データベースの本文・URL一覧、またはデータファイル）か
+    キーワード辞書が変わった時だけ再評価する。
+    既にインデックスがあれば作り直しは別スレッドで行い、完成するまでは
+    前のインデックスで応答する（リクエストを待たせない）。
+    """
+    reload_if_changed()
+    lexicon = get_lexicon()
+    key = (_data_key(), lexicon.version)
+    cached_key, cached_index = _cache["entry"]
+    if cached_key == key:
+        return cached_index
+    if cached_index is not None:
+        _rebuild_in_background(key, lexicon)
+        return cached_index
+
+    with _cache_lock:
+        # 待っている間に他のスレッドが作っていれば、それを使う
+        cached_key, cached_index = _cache["entry"]
+        if cached_key == key:
+            return cached_index
+        return _build_index(key, lexicon)
+
+def get_assessment_results():
+    """キャッシュ済みの評価結果（スコア順）を返す"""
+    return get_plant_index().results
+
+def json_response(payload, etag, status=200):
+    """ETag・gzip圧縮に対応したJSONレスポンスを返す"""
+    if etag and request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    response = Response(body, status=status, mimetype="application/json")
+    if len(body) >= GZIP_MIN_SIZE and "gzip" in request.headers.get("Accept-Encoding", ""):
+        response.set_data(gzip.compress(body))
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept-Encoding"
+    if etag:
+        response.set_etag(etag)
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """エンドポイントごとのリクエスト数・所要時間を記録する"""
+    endpoint = request.endpoint or "unknown"
+    registry.inc("http_requests_total", endpoint=endpoint, status=response.status_code)
+    if "request_start" in g:
+        registry.observe("http_request_seconds", time.perf_counter() - g.request_start,
+                         endpoint=endpoint)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus形式の計測値（取得・解析・評価などの段ごとの所要時間を含む）"""
+    return Response(registry.to_prometheus(), mimetype="text/plain; version=0.0.4")
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
     results = None
     if request.method == 'POST':
         try:
-            # JSONファイルを読み込んで評価
-            plant_data = load_plant_data(JSON_PATH)
-            results = assess_all_plants(plant_data)
+            # キャッシュ済みの評価結果を使用
+            results = get_assessment_results()
         except Exception as e:
             results = [{"植物名": "読み込みエラー", "評価": str(e), "スコア": 0}]
     return render_template('index.html', results=results)
 
+@app.route('/api/plants')
+def api_plants():
+    """評価結果の一覧（ページング・並べ替え・評価レベル/カテゴリでの絞り込み）"""
+    try:
+        index = get_plant_index()
+        params = {
+            "sort": request.args.get("sort", "score"),
+            "order": request.args.get("order", "desc"),
+            "level": request.args.get("level") or None,
+            "category": request.args.get("category") or None,
+            "page": request.args.get("page", 1, type=int),
+            "per_page": min(request.args.get("per_page", 50, type=int), 500),
+        }
+        payload = index.query(**params)
+    except ValueError as e:
+        return json_response({"error": str(e)}, None, status=400)
+    except Exception as e:
+        return json_response({"error": str(e)}, None, status=500)
+
+    payload["levels"] = index.levels
+    payload["categories"] = index.categories
+    query_key = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    etag = f"{index.version}-{hashlib.sha1(query_key.encode()).hexdigest()[:16]}"
+    return json_response(payload, etag)
+
+@app.route('/api/plants/<path:name>')
+def api_plant(name):
+    """植物名を指定して1件の評価結果を返す"""
+    try:
+        index = get_plant_index()
+    except Exception as e:
+        return json_response({"error": str(e)}, None, status=500)
+
+    result = index.get(name)
+    if result is None:
+        return json_response({"error": f"{name} は見つかりません"}, None, status=404)
+    etag = f"{index.version}-{hashlib.sha1(name.encode()).hexdigest()[:16]}"
+    return json_response(result, etag)
+
 if __name__ == '__main__':
+    # 起動時に評価を済ませておき、最初のリクエストも描画だけにする
+    if os.path.exists(DB_PATH) or os.path.exists(JSON_PATH):
+        get_plant_index()
     app.run(host="0.0.0.0", port=5000)  # サーバー外部からアクセス可能にする場合
@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import time
+from typing import Dict, List
+
+from extraction import BACKENDS, get_extractor
+
+FIXTURES_DIR = "fixtures"
+
+# 壊れたHTMLの本文（article__body の中身）。ブラウザ・html.parser・Lexbor・libxml2 で
+# 解釈が分かれる書き方で、基準は bs4（html.parser）の結果とする
+MALFORMED_CASES = [
+    ("unclosed_p", "<p>a<p>b"),
+    ("div_in_p", "<p>x<div>y</div>z</p>"),
+    ("p_in_heading", "<h2>見出し<p>本文</h2>"),
+    ("unclosed_body", "<p>水やり</p><p>日当たり"),
+]
+
+
+def malformed_pages() -> List[Dict]:
+  """MALFORMED_CASES を詳細ページとして比べられる形にする"""
+  return [{"file": f"malformed:{name}", "kind": "detail",
+           "html": f'<html><body><div class="article__body">{body}</div></body></html>'}
+          for name, body in MALFORMED_CASES]
+
+
+def load_fixtures(fixtures_dir: str = FIXTURES_DIR) -> List[Dict]:
+  """manifest.json に列挙された保存済みページ（HTML本体付き）を読み込む"""
+  with open(os.path.join(fixtures_dir, "manifest.json"), encoding="utf-8") as f:
+    pages = json.load(f)["pages"]
+  for page in pages:
+    with open(os.path.join(fixtures_dir, "html", page["file"]), encoding="utf-8") as f:
+      page["html"] = f.read()
+  return pages
+
+
+def extract(extractor, page: Dict) -> Dict:
+  if page["kind"] == "listing":
+    return extractor.extract_listing(page["html"])
+  return extractor.extract_detail(page["html"])
+
+
+def comparable(kind: str, result: Dict) -> Dict:
+  """方式間で一致すべき部分（タイトルはデバッグ表示用なので除く）"""
+  if kind == "listing":
+    return {"anchors": result["anchors"], "cards": result["cards"]}
+  return {"texts": result["texts"], "selector": result["selector"]}
+
+
+def verify(extractor, reference, pages: List[Dict]) -> List[str]:
+  """基準（bs4）と抽出結果が異なるページのファイル名を返す"""
+  return [page["file"] for page in pages
+          if comparable(page["kind"], extract(extractor, page)) !=
+          comparable(page["kind"], extract(reference, page))]
+
+
+def benchmark(extractor, pages: List[Dict], repeat: int) -> Dict[str, float]:
+  """ページ種類ごとの1ページあたりの平均処理時間（ミリ秒）"""
+  result = {}
+  for kind in ("detail", "listing"):
+    kind_pages = [page for page in pages if page["kind"] == kind]
+    if not kind_pages:
+      continue
+    start = time.perf_counter()
+    for _ in range(repeat):
+      for page in kind_pages:
+        extract(extractor, page)
+    result[kind] = (time.perf_counter() - start) * 1000 / (repeat * len(kind_pages))
+  return result
+
+
+def main():
+  parser = argparse.ArgumentParser(description="HTML抽出方式の速度比較と結果の一致確認")
+  parser.add_argument("--fixtures", default=FIXTURES_DIR, help="保存済みページのディレクトリ")
+  parser.add_argument("--repeat", type=int, default=50, help="各ページを処理する回数")
+  parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS),
+                      help="比較する抽出方式")
+  parser.add_argument("--strict", action="store_true",
+                      help="壊れたHTML（MALFORMED_CASES）での不一致も失敗にする")
+  args = parser.parse_args()
+
+  pages = load_fixtures(args.fixtures)
+  malformed = malformed_pages()
+  print(f"📄 {len(pages)} ページ（詳細 {sum(p['kind'] == 'detail' for p in pages)}件, "
+        f"一覧 {sum(p['kind'] == 'listing' for p in pages)}件）")
+
+  reference = get_extractor("bs4")
+  baseline = None
+  mismatched = False
+  for name in args.backends:
+    try:
+      extractor = get_extractor(name)
+    except ImportError as e:
+      print(f"⏭️ {name}: 利用できません ({e})")
+      continue
+
+    differences = verify(extractor, reference, pages)
+    timings = benchmark(extractor, pages, args.repeat)
+    if baseline is None:
+      baseline = timings
+    speedup = ", ".join(f"{kind} x{baseline[kind] / ms:.1f}" for kind, ms in timings.items())
+    line = ", ".join(f"{kind} {ms:.2f}ms/ページ" for kind, ms in timings.items())
+    print(f"{'✅' if not differences else '❌'} {name}: {line} （{speedup}）")
+    if differences:
+      mismatched = True
+      print(f"   bs4と結果が異なるページ: {', '.join(differences)}")
+    malformed_differences = verify(extractor, reference, malformed)
+    if malformed_differences:
+      mismatched = mismatched or args.strict
+      print(f"   ⚠️ 壊れたHTMLでbs4と結果が異なる: {', '.join(malformed_differences)}")
+
+  if mismatched:
+    raise SystemExit(1)
+
+
+if __name__ == "__main__":
+  main()
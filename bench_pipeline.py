@@ -0,0 +1,329 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import socket
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, redirect_stdout
+from typing import Dict, List, Optional
+
+from extraction import BACKENDS, get_extractor
+from fetch_engine import FetchEngine
+from fetch_policy import FetchPolicy
+from instrumentation import configure_logging
+from get_urls import ListingCrawler, plant_categories
+from readiness import ReadinessStats
+from replay_server import FIXTURES_DIR, serve
+from validator_store import ValidatorStore
+from web_scraping import extract_plant_content
+from Growability_Assessment import assess_all_plants, assess_plant_growability
+
+STAGES = ["discovery", "fetch", "extract", "assess"]
+
+# 比較時の指標と、大きいほど良いか
+COMPARED_METRICS = {
+    "pages_per_sec": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "cpu_seconds": False,
+    "peak_rss_mb": False,
+}
+
+
+class CountingFetchEngine(FetchEngine):
+  """取得件数・エラー件数・再試行回数を数えるFetchEngine"""
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.fetched = 0
+    self.errors = 0
+    self.retries = 0
+
+  async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> Dict:
+    result = await super().fetch(url, headers)
+    self.fetched += 1
+    self.retries += max(result["attempts"] - 1, 0)
+    if result["error"]:
+      self.errors += 1
+    return result
+
+
+def _cpu_seconds() -> float:
+  """このプロセスと終了済みの子プロセス（評価のプロセスプール）のCPU時間"""
+  own = resource.getrusage(resource.RUSAGE_SELF)
+  children = resource.getrusage(resource.RUSAGE_CHILDREN)
+  return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _peak_rss_mb() -> float:
+  """このプロセスの最大常駐メモリ（MB）。Linuxはキロバイト、macOSはバイト単位"""
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class StageMetrics:
+  """段ごとの件数・処理時間・CPU時間・最大メモリと、1件ごとの所要時間を集計する"""
+
+  def __init__(self):
+    self.latencies = ReadinessStats()
+    self.stages: Dict[str, Dict] = {}
+
+  @contextmanager
+  def stage(self, name: str):
+    """with ブロック内の処理を1つの段として計測する（件数は yield した辞書に入れる）"""
+    counts = {"items": 0, "errors": 0, "retries": 0}
+    wall_start, cpu_start = time.perf_counter(), _cpu_seconds()
+    yield counts
+    wall = time.perf_counter() - wall_start
+    self.stages[name] = {
+        "items": counts["items"],
+        "errors": counts["errors"],
+        "retries": counts["retries"],
+        "wall_seconds": wall,
+        "pages_per_sec": counts["items"] / wall if wall > 0 else 0.0,
+        "cpu_seconds": _cpu_seconds() - cpu_start,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+  def record(self, name: str, samples: List[float]):
+    for seconds in samples:
+      self.latencies.record(name, seconds)
+
+  def summary(self) -> Dict[str, Dict]:
+    latencies = self.latencies.summary()
+    result = {}
+    for name, stage in self.stages.items():
+      stage = dict(stage)
+      if name in latencies:
+        stage["p50_ms"] = latencies[name]["p50"] * 1000
+        stage["p95_ms"] = latencies[name]["p95"] * 1000
+      result[name] = stage
+    return result
+
+
+async def _crawl(base_url: str, workers: int, parser: str, metrics: StageMetrics,
+                 retries: int = 0) -> Dict:
+  """URL収集と詳細ページの取得を計測し、取得したHTMLを返す
+
+  再試行の待ち時間（バックオフ）が計測に混ざらないよう、既定では再試行しない（retries=0）。
+  再試行した場合はその回数を段ごとに retries として別に記録する。
+  """
+  policy = FetchPolicy(retries=retries)
+  with tempfile.TemporaryDirectory() as tmp:
+    validators = ValidatorStore(os.path.join(tmp, "listing_validators.json"))
+
+    with metrics.stage("discovery") as counts:
+      listing_stats = ReadinessStats()
+      async with CountingFetchEngine(per_host_limit=workers, stats=listing_stats,
+                                     base_url=base_url, policy=policy) as engine:
+        plants = await ListingCrawler(engine, validators, parser).crawl(plant_categories)
+      counts.update(items=engine.fetched, errors=engine.errors, retries=engine.retries)
+    metrics.record("discovery", listing_stats.samples.get("http", []))
+
+  pages = {}
+  with metrics.stage("fetch") as counts:
+    detail_stats = ReadinessStats()
+    async with CountingFetchEngine(per_host_limit=workers, stats=detail_stats,
+                                   base_url=base_url, policy=policy) as engine:
+      async for result in engine.fetch_all(plant["url"] for plant in plants):
+        if not result["error"]:
+          pages[result["url"]] = result["html"]
+    counts.update(items=engine.fetched, errors=engine.errors, retries=engine.retries)
+  metrics.record("fetch", detail_stats.samples.get("http", []))
+
+  return {"plants": plants, "pages": pages}
+
+
+def run_benchmark(base_url: str,
+                  workers: int = 8,
+                  parser: str = "auto",
+                  assess_workers: int = 1,
+                  assess_scale: int = 1,
+                  retries: int = 0) -> Dict:
+  """URL収集 → 取得 → 抽出 → 評価 の各段を計測し、段ごとの結果を返す"""
+  metrics = StageMetrics()
+  with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+    crawled = asyncio.run(_crawl(base_url, workers, parser, metrics, retries))
+
+    plant_data = {}
+    samples = []
+    with metrics.stage("extract") as counts:
+      for plant in crawled["plants"]:
+        html = crawled["pages"].get(plant["url"])
+        if html is None:
+          continue
+        start = time.perf_counter()
+        try:
+          texts = extract_plant_content(html, parser)
+        except Exception:
+          counts["errors"] += 1
+          continue
+        samples.append(time.perf_counter() - start)
+        counts["items"] += 1
+        # 評価段の負荷を増やすため、同じ内容を別名で複製できる
+        for i in range(assess_scale):
+          plant_data[plant["name"] if assess_scale == 1 else f"{plant['name']}#{i}"] = texts
+    metrics.record("extract", samples)
+
+    with metrics.stage("assess") as counts:
+      results = assess_all_plants(plant_data, verbose=False, workers=assess_workers)
+      counts["items"] = len(results)
+
+    # 1件ごとの所要時間は別途逐次に測る（段全体の時間・CPU時間には含めない）
+    samples = []
+    for plant_name in plant_data:
+      start = time.perf_counter()
+      assess_plant_growability(plant_data, plant_name, verbose=False)
+      samples.append(time.perf_counter() - start)
+    metrics.record("assess", samples)
+
+  return metrics.summary()
+
+
+def _free_port() -> int:
+  with socket.socket() as sock:
+    sock.bind(("127.0.0.1", 0))
+    return sock.getsockname()[1]
+
+
+def _wait_for_port(process: multiprocessing.Process, port: int, timeout: float = 10):
+  deadline = time.monotonic() + timeout
+  while time.monotonic() < deadline and process.is_alive():
+    try:
+      with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+        return
+    except OSError:
+      time.sleep(0.05)
+  raise RuntimeError(f"ローカルサーバーが起動しませんでした (port {port})")
+
+
+def start_replay_server(**options) -> tuple:
+  """計測対象のCPU時間・メモリに含めないよう、別プロセスでReplayServerを起動する"""
+  port = _free_port()
+  process = multiprocessing.Process(target=serve, args=(port,), kwargs=options, daemon=True)
+  process.start()
+  _wait_for_port(process, port)
+  return process, f"http://127.0.0.1:{port}"
+
+
+def print_results(run: Dict):
+  config = run["config"]
+  print(f"\n📊 ベンチマーク結果 (抽出: {config['parser']}, 同時接続: {config['workers']}, "
+        f"遅延: {config['latency']}秒, エラー率: {config['error_rate']}, "
+        f"再試行: {config.get('retries', 0)}回まで)")
+  print(f"{'段':<10}{'件数':>7}{'エラー':>7}{'再試行':>7}{'件/秒':>10}{'p50(ms)':>10}{'p95(ms)':>10}"
+        f"{'CPU(秒)':>10}{'最大RSS(MB)':>13}")
+  for name in STAGES:
+    stage = run["stages"].get(name)
+    if not stage:
+      continue
+    print(f"{name:<10}{stage['items']:>7}{stage['errors']:>7}{stage.get('retries', 0):>7}"
+          f"{stage['pages_per_sec']:>10.1f}"
+          f"{stage.get('p50_ms', 0):>10.2f}{stage.get('p95_ms', 0):>10.2f}"
+          f"{stage['cpu_seconds']:>10.2f}{stage['peak_rss_mb']:>13.1f}")
+
+
+def compare_runs(baseline: Dict, current: Dict, threshold: float = 10.0) -> List[str]:
+  """2回の計測結果を比べて表示し、threshold%を超えて悪化した指標の一覧を返す"""
+  regressions = []
+  print(f"\n🔍 比較: {baseline.get('label', 'baseline')} → {current.get('label', 'current')}"
+        f"（±{threshold:.0f}%を超える悪化を回帰とみなす）")
+  for name in STAGES:
+    before, after = baseline["stages"].get(name), current["stages"].get(name)
+    if not before or not after:
+      continue
+    for metric, higher_is_better in COMPARED_METRICS.items():
+      if metric not in before or metric not in after or not before[metric]:
+        continue
+      change = (after[metric] - before[metric]) / before[metric] * 100
+      worse = -change if higher_is_better else change
+      mark = "❌" if worse > threshold else ("✅" if -worse > threshold else "  ")
+      print(f"{mark} {name:<10}{metric:<14}{before[metric]:>10.2f} → {after[metric]:>10.2f} "
+            f"({change:+.1f}%)")
+      if worse > threshold:
+        regressions.append(f"{name}.{metric}")
+  return regressions
+
+
+def load_run(path: str) -> Dict:
+  with open(path, encoding="utf-8") as f:
+    return json.load(f)
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      description="保存済みページをローカルで配信し、収集〜評価の各段の性能を計測する")
+  parser.add_argument("--fixtures", default=FIXTURES_DIR, help="保存済みページのディレクトリ")
+  parser.add_argument("--workers", type=int, default=8, help="同時に取得するページ数")
+  parser.add_argument("--parser", default="auto", choices=["auto"] + list(BACKENDS),
+                      help="HTMLの抽出方式")
+  parser.add_argument("--assess-workers", type=int, default=1, help="評価に使うプロセス数")
+  parser.add_argument("--assess-scale", type=int, default=1,
+                      help="評価段で植物データを何倍に複製するか（評価の負荷を増やす）")
+  parser.add_argument("--latency", type=float, default=0, help="サーバーの応答遅延（秒）")
+  parser.add_argument("--jitter", type=float, default=0, help="応答遅延の揺らぎの上限（秒）")
+  parser.add_argument("--error-rate", type=float, default=0, help="503エラーを注入する割合（0〜1）")
+  parser.add_argument("--retries", type=int, default=0,
+                      help="取得失敗の再試行回数（既定0。再試行の待ち時間が計測に混ざるため）")
+  parser.add_argument("--seed", type=int, default=0, help="遅延・エラー注入の乱数シード")
+  parser.add_argument("--label", default=None, help="この計測の名前（比較時に表示）")
+  parser.add_argument("--output", default="bench_results.json", help="計測結果の保存先")
+  parser.add_argument("--baseline", default=None, help="比較対象の計測結果（JSON）")
+  parser.add_argument("--threshold", type=float, default=10.0,
+                      help="回帰とみなす悪化の割合（%%）")
+  parser.add_argument("--diff", nargs=2, metavar=("BASELINE", "CURRENT"), default=None,
+                      help="計測せずに保存済みの2つの結果を比較する")
+  args = parser.parse_args()
+  configure_logging("ERROR")  # 注入したエラーの警告で計測結果を埋もれさせない
+
+  if args.diff:
+    regressions = compare_runs(load_run(args.diff[0]), load_run(args.diff[1]), args.threshold)
+    raise SystemExit(1 if regressions else 0)
+
+  server, base_url = start_replay_server(fixtures_dir=args.fixtures, latency=args.latency,
+                                         jitter=args.jitter, error_rate=args.error_rate,
+                                         seed=args.seed)
+  try:
+    stages = run_benchmark(base_url, workers=args.workers, parser=args.parser,
+                           assess_workers=args.assess_workers, assess_scale=args.assess_scale,
+                           retries=args.retries)
+  finally:
+    server.terminate()
+    server.join()
+
+  run = {
+      "label": args.label or time.strftime("%Y-%m-%d %H:%M:%S"),
+      "config": {
+          "workers": args.workers,
+          "parser": get_extractor(args.parser).name,
+          "assess_workers": args.assess_workers,
+          "assess_scale": args.assess_scale,
+          "latency": args.latency,
+          "jitter": args.jitter,
+          "error_rate": args.error_rate,
+          "retries": args.retries,
+          "seed": args.seed,
+          "python": platform.python_version(),
+      },
+      "stages": stages,
+  }
+  print_results(run)
+
+  with open(args.output, "w", encoding="utf-8") as f:
+    json.dump(run, f, ensure_ascii=False, indent=2)
+  print(f"\n✅ 計測結果を保存しました: {args.output}")
+
+  if args.baseline:
+    regressions = compare_runs(load_run(args.baseline), run, args.threshold)
+    if regressions:
+      print(f"\n❌ 回帰: {', '.join(regressions)}")
+      raise SystemExit(1)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,142 @@
+import os
+import queue
+import threading
+from typing import Dict, Optional
+
+from readiness import ReadinessStats, wait_until_ready
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+
+# ブラウザで読み込まない（描画コストを下げる）リソース
+BLOCKED_RESOURCE_PATTERNS = [
+    "*.css", "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+]
+
+# 解決済みのChromeDriverのパスを保存するファイル
+DRIVER_PATH_CACHE = ".chromedriver_path"
+
+
+def resolve_driver_path(cache_path: str = DRIVER_PATH_CACHE) -> str:
+  """ChromeDriverのパスを返す（2回目以降はキャッシュを使いドライバー管理処理を省く）"""
+  if os.environ.get("CHROMEDRIVER_PATH"):
+    return os.environ["CHROMEDRIVER_PATH"]
+
+  if os.path.exists(cache_path):
+    with open(cache_path, "r", encoding="utf-8") as f:
+      cached = f.read().strip()
+    if cached and os.path.exists(cached):
+      return cached
+
+  from webdriver_manager.chrome import ChromeDriverManager
+  path = ChromeDriverManager().install()
+  with open(cache_path, "w", encoding="utf-8") as f:
+    f.write(path)
+  return path
+
+
+def create_driver(block_resources: bool = False):
+  """ヘッドレスChromeを起動する（画面表示なし）"""
+  # Seleniumはブラウザが必要になった時だけ読み込む
+  from selenium import webdriver
+  from selenium.webdriver.chrome.service import Service
+  from selenium.webdriver.chrome.options import Options
+
+  options = Options()
+  options.add_argument('--headless')
+  options.add_argument('--no-sandbox')
+  options.add_argument('--disable-dev-shm-usage')
+  # User-Agentを追加（重要）
+  options.add_argument(f'--user-agent={USER_AGENT}')
+  if block_resources:
+    options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.managed_default_content_settings.fonts": 2,
+    })
+
+  driver = webdriver.Chrome(service=Service(resolve_driver_path()), options=options)
+  if block_resources:
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_RESOURCE_PATTERNS})
+  return driver
+
+
+class BrowserPool:
+  """使い回すヘッドレスブラウザのプール
+
+  - 最大size個のセッションを必要になった時点で起動し、空いているものに仕事を割り当てる
+  - max_pages件処理したセッションや、エラーで落ちたセッションは破棄して作り直す
+  - 固定時間は待たず、ready_selectorの要素が現れた時点（最大ready_timeout秒）でHTMLを返す
+  """
+
+  def __init__(self, ready_selector: str = "body", ready_timeout: float = 10,
+               stats: Optional[ReadinessStats] = None, size: int = 1,
+               max_pages: int = 100, block_resources: bool = True):
+    self.ready_selector = ready_selector
+    self.ready_timeout = ready_timeout
+    self.stats = stats or ReadinessStats()
+    self.size = size
+    self.max_pages = max_pages
+    self.block_resources = block_resources
+    self.recycled = 0
+    self._idle = queue.LifoQueue()
+    self._slots = threading.Semaphore(size)
+    self._all_sessions = []
+    self._lock = threading.Lock()
+
+  def _acquire(self) -> Dict:
+    self._slots.acquire()
+    try:
+      return self._idle.get_nowait()
+    except queue.Empty:
+      try:
+        session = {"driver": create_driver(self.block_resources), "pages": 0}
+      except Exception:
+        self._slots.release()
+        raise
+      with self._lock:
+        self._all_sessions.append(session)
+      return session
+
+  def _release(self, session: Dict, discard: bool = False):
+    if discard or session["pages"] >= self.max_pages:
+      self._quit(session)
+      self.recycled += 1
+    else:
+      self._idle.put(session)
+    self._slots.release()
+
+  def _quit(self, session: Dict):
+    with self._lock:
+      if session in self._all_sessions:
+        self._all_sessions.remove(session)
+    try:
+      session["driver"].quit()
+    except Exception:
+      pass
+
+  def __call__(self, url: str) -> str:
+    """空いているセッションでページを取得する（落ちたセッションは作り直して1回だけ再試行）"""
+    for attempt in range(2):
+      session = self._acquire()
+      try:
+        session["driver"].get(url)
+        # 目的の要素が描画されるまで待機
+        elapsed, timed_out = wait_until_ready(session["driver"], self.ready_selector, self.ready_timeout)
+        html = session["driver"].page_source
+      except Exception:
+        self._release(session, discard=True)
+        if attempt == 1:
+          raise
+        continue
+      session["pages"] += 1
+      self.stats.record("browser", elapsed, timed_out)
+      self._release(session)
+      return html
+
+  def close(self):
+    with self._lock:
+      sessions = list(self._all_sessions)
+    for session in sessions:
+      self._quit(session)
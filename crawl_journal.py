@@ -0,0 +1,97 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from instrumentation import stage_timer
+
+
+class CrawlJournal:
+  """URLをキーにした追記専用のクロール記録（JSONL形式）
+
+  1ページ取得するごとに1行追記するため、途中で停止しても
+  それまでの結果は失われない。同じURLの記録が複数ある場合は最後の行が有効。
+  メモリには状態とファイル内の位置だけを持ち、本文は必要な時に読み出す。
+  """
+
+  def __init__(self, path: str):
+    self.path = path
+    self.entries: Dict[str, Dict] = {}
+    self._load()
+    self._file = open(self.path, "ab")
+    # 書き込み途中で停止して改行が無い末尾行には改行を補う
+    if self._file.seek(0, os.SEEK_END) > 0:
+      with open(self.path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+          self._file.write(b"\n")
+    self._reader = open(self.path, "rb")
+
+  def _load(self):
+    """既存の記録を読み込む（書き込み途中で壊れた末尾行は無視）"""
+    if not os.path.exists(self.path):
+      return
+    with open(self.path, "rb") as f:
+      offset = 0
+      for line in f:
+        line_offset, offset = offset, offset + len(line)
+        if not line.strip():
+          continue
+        try:
+          entry = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+          continue
+        self.entries[entry["url"]] = self._summary(entry, line_offset)
+
+  @staticmethod
+  def _summary(entry: Dict, offset: int) -> Dict:
+    """本文を除いた記録（メモリに保持する分）"""
+    return {"url": entry["url"], "name": entry["name"], "status": entry["status"],
+            "error": entry.get("error"), "offset": offset}
+
+  def is_done(self, url: str) -> bool:
+    """テキストを取得済みのURLか（失敗・空の結果は再取得対象）"""
+    entry = self.entries.get(url)
+    return entry is not None and entry["status"] == "ok"
+
+  def record(self, url: str, name: str, content: List[str], error: Optional[str] = None):
+    """1ページ分の結果を追記し、すぐにディスクへ書き出す"""
+    if error:
+      status = "error"
+    elif content:
+      status = "ok"
+    else:
+      status = "empty"
+
+    entry = {
+        "url": url,
+        "name": name,
+        "status": status,
+        "content": content,
+        "error": error,
+        "recorded_at": time.time(),
+    }
+    with stage_timer("write"):
+      offset = self._file.seek(0, os.SEEK_END)
+      self._file.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+      self._file.flush()
+      os.fsync(self._file.fileno())
+    self.entries[url] = self._summary(entry, offset)
+
+  def content(self, url: str) -> List[str]:
+    """記録済みの本文をファイルから読み出す"""
+    entry = self.entries.get(url)
+    if entry is None:
+      return []
+    self._reader.seek(entry["offset"])
+    return json.loads(self._reader.readline())["content"]
+
+  def status_counts(self) -> Dict[str, int]:
+    counts = {}
+    for entry in self.entries.values():
+      counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+    return counts
+
+  def close(self):
+    self._file.close()
+    self._reader.close()
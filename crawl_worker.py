@@ -0,0 +1,476 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import time
+from functools import partial
+from typing import Dict, List, Optional
+
+from browser import BrowserPool
+from dead_letters import DEFAULT_DEAD_LETTERS_PATH, DeadLetterList
+from dedup import changes_by_name, dedup_pages, load_detector
+from extraction import BACKENDS
+from fetch_engine import FetchEngine
+from fetch_policy import RETRYABLE, FetchPolicy
+from instrumentation import (add_logging_arguments, configure_logging, get_logger,
+                             print_stage_summary, registry, write_summary)
+from get_urls import (LISTING_READY_SELECTOR, discover_page_count, extract_listing_links,
+                      listing_url, plant_categories)
+from get_urls import needs_browser as listing_needs_browser
+from plant_store import DEFAULT_CHANGES_PATH, DEFAULT_DB_PATH, PlantStore
+from politeness import PolitenessScheduler
+from readiness import ReadinessStats
+from validator_store import content_hash
+from web_scraping import BODY_READY_SELECTOR, extract_plant_content
+from web_scraping import needs_browser as detail_needs_browser
+from work_queue import DEFAULT_MAX_ATTEMPTS, DEFAULT_VISIBILITY, WorkQueue, make_item, open_queue
+
+logger = get_logger("crawl_worker")
+
+DEFAULT_QUEUE = "crawl_queue.db"
+
+# 作業が無い時に、他のワーカーが作業を追加するか終わるのを待つ間隔（秒）
+IDLE_POLL_INTERVAL = 1.0
+
+
+def listing_item(category: Dict, page_num: int) -> Dict:
+  return make_item("listing", listing_url(category, page_num), category=category, page=page_num)
+
+
+def detail_item(plant: Dict) -> Dict:
+  return make_item("detail", plant["url"], name=plant["name"], category=plant["category"])
+
+
+def seed_queue(queue: WorkQueue, categories: List[Dict]) -> int:
+  """各カテゴリの一覧1ページ目を登録する（2ページ目以降と植物ページはワーカーが追加する）"""
+  return queue.put(listing_item(category, 1) for category in categories)
+
+
+class CrawlWorker:
+  """共有の作業キューから作業を借りて、取得・抽出・結果の報告をするワーカー
+
+  - listing（一覧ページ）: リンクを抽出し、植物ページの作業を登録する。
+    1ページ目ならページ数を調べて2ページ目以降の作業も登録する
+  - detail（植物ページ）: 本文を抽出して結果を報告する
+  作業の登録は id で冪等なので、同じ作業を2つのワーカーが処理しても（リースが
+  切れた後に処理が終わった等）作業も結果も1つにまとまる。
+  再試行できる失敗（タイムアウト・5xxなど）はキューに戻し（nack）、他のワーカーにも
+  試させる。それ以外の失敗（404・解析エラーなど）は失敗として結果を報告する。
+  借りている間は visibility の1/3ごとにリースを延ばすので、落ちたワーカーの作業だけが
+  visibility 秒後に他のワーカーに渡る。
+  キューの操作はファイル・ネットワークの同期I/Oなので、イベントループを止めないよう
+  スレッドで実行する（_queue_call）。
+  """
+
+  def __init__(self,
+               queue: WorkQueue,
+               listing_engine: FetchEngine,
+               detail_engine: FetchEngine,
+               name: Optional[str] = None,
+               concurrency: int = 8,
+               visibility: float = DEFAULT_VISIBILITY,
+               parser: str = "auto"):
+    self.queue = queue
+    self.listing_engine = listing_engine
+    self.detail_engine = detail_engine
+    self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+    self.concurrency = concurrency
+    self.visibility = visibility
+    self.parser = parser
+    self.counts = {"acked": 0, "retried": 0, "failed": 0, "stale": 0}
+    self._leases: Dict[str, Dict] = {}
+
+  async def _queue_call(self, method, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(method, *args))
+
+  def _report(self, ok: bool):
+    """ack / nack の結果を数える（False ならリースが切れて他のワーカーに渡っていた）"""
+    if not ok:
+      self.counts["stale"] += 1
+      registry.inc("queue_stale_acks_total")
+
+  async def _ack(self, lease: Dict, result: Dict):
+    ok = await self._queue_call(self.queue.ack, lease, result)
+    if ok:
+      self.counts["failed" if result.get("failure") else "acked"] += 1
+      registry.inc("queue_acks_total", kind=lease["kind"])
+    self._report(ok)
+
+  async def _fetch_failed(self, lease: Dict, result: Dict) -> bool:
+    """取得に失敗していれば、再試行できるものは nack、それ以外は失敗として ack する"""
+    if not result["error"]:
+      return False
+    logger.warning("❌ %s の取得中にエラーが発生 (%s, 作業の%d回目): %s", lease["payload"]["url"],
+                   result["failure"], lease["attempts"], result["error"])
+    if result["failure"] in RETRYABLE:
+      ok = await self._queue_call(self.queue.nack, lease, result["error"], result["failure"])
+      if ok:
+        self.counts["retried"] += 1
+        registry.inc("queue_nacks_total", kind=lease["kind"])
+      self._report(ok)
+    else:
+      await self._ack(lease, {"status": "error", "error": result["error"],
+                              "failure": result["failure"], "http_status": result["status"]})
+    return True
+
+  async def process_listing(self, lease: Dict):
+    payload = lease["payload"]
+    category, page_num = payload["category"], payload["page"]
+    result = await self.listing_engine.fetch(payload["url"])
+    if await self._fetch_failed(lease, result):
+      return
+    loop = asyncio.get_running_loop()
+    try:
+      links = await loop.run_in_executor(None, extract_listing_links, result["html"], category,
+                                         self.parser)
+    except Exception as e:
+      logger.warning("❌ %s - ページ %d の解析でエラーが発生: %s", category["name"], page_num, e)
+      await self._ack(lease, {"status": "error", "error": f"解析エラー: {e}", "failure": "parse"})
+      return
+    page_count = None
+    if page_num == 1:
+      page_count = discover_page_count(result["html"], category)
+      logger.info("🌱 %s: 全%dページ", category["name"], page_count)
+      await self._queue_call(self.queue.put,
+                             [listing_item(category, num) for num in range(2, page_count + 1)])
+    # 報告の前に子の作業を登録する（報告前に落ちても、やり直しで同じ作業になるだけ）
+    added = await self._queue_call(self.queue.put, [detail_item(plant) for plant in links])
+    logger.debug("🔄 %s - ページ %d: %d件の植物ページを登録", category["name"], page_num, added)
+    await self._ack(lease, {"status": "ok", "links": links, "page_count": page_count})
+
+  async def process_detail(self, lease: Dict):
+    payload = lease["payload"]
+    result = await self.detail_engine.fetch(payload["url"])
+    if await self._fetch_failed(lease, result):
+      return
+    loop = asyncio.get_running_loop()
+    try:
+      texts = await loop.run_in_executor(None, extract_plant_content, result["html"], self.parser)
+    except Exception as e:
+      logger.warning("❌ %s の解析中にエラーが発生: %s", payload["url"], e)
+      await self._ack(lease, {"status": "error", "error": f"解析エラー: {e}", "failure": "parse"})
+      return
+    if not texts:
+      logger.warning("❌ %s: テキストが見つかりませんでした", payload["name"])
+    await self._ack(lease, {"status": "ok" if texts else "empty", "texts": texts,
+                            "error": None if texts else "本文が見つかりません",
+                            "failure": None if texts else "empty",
+                            "html_hash": content_hash(result["html"]),
+                            "content_hash": content_hash(texts),
+                            "etag": result["etag"], "last_modified": result["last_modified"]})
+    logger.debug("✅ %s: %d 個のテキスト要素を取得", payload["name"], len(texts))
+
+  async def _process(self, lease: Dict):
+    self._leases[lease["token"]] = lease
+    try:
+      if lease["kind"] == "listing":
+        await self.process_listing(lease)
+      else:
+        await self.process_detail(lease)
+    except Exception as e:
+      logger.warning("❌ %s の処理中にエラーが発生: %s", lease["payload"]["url"], e)
+      self._report(await self._queue_call(self.queue.nack, lease, f"{type(e).__name__}: {e}",
+                                          "unknown"))
+    finally:
+      self._leases.pop(lease["token"], None)
+
+  async def _keep_alive(self):
+    """処理中の作業のリースを定期的に延ばす"""
+    while True:
+      await asyncio.sleep(self.visibility / 3)
+      for lease in list(self._leases.values()):
+        if not await self._queue_call(self.queue.extend, lease, self.visibility):
+          logger.warning("⚠️ %s のリースが切れました（他のワーカーが処理します）", lease["payload"]["url"])
+
+  async def run(self, idle_exit: bool = True) -> Dict[str, int]:
+    """作業が無くなるまで（idle_exit=False なら止めるまで）作業を借りて処理する
+
+    同時に処理する作業は concurrency 件までで、空きができるたびに次の作業を借りる。
+    """
+    keep_alive = asyncio.ensure_future(self._keep_alive())
+    running = set()
+    try:
+      while True:
+        free = self.concurrency - len(running)
+        leases = await self._queue_call(self.queue.lease, self.name, free,
+                                        self.visibility) if free else []
+        for lease in leases:
+          running.add(asyncio.ensure_future(self._process(lease)))
+        if running:
+          # 空きがあれば、処理の完了を待つ間も定期的に新しい作業を確認する
+          timeout = None if len(running) >= self.concurrency else IDLE_POLL_INTERVAL
+          _, running = await asyncio.wait(running, timeout=timeout,
+                                          return_when=asyncio.FIRST_COMPLETED)
+          continue
+        # 他のワーカーの処理中の作業から新しい作業が追加されることがあるので、全て終わるまで待つ
+        if idle_exit and await self._queue_call(self.queue.unfinished) == 0:
+          break
+        await asyncio.sleep(IDLE_POLL_INTERVAL)
+    finally:
+      keep_alive.cancel()
+      for task in running:
+        task.cancel()
+    return self.counts
+
+
+async def run_worker(queue: WorkQueue,
+                     name: Optional[str] = None,
+                     concurrency: int = 8,
+                     visibility: float = DEFAULT_VISIBILITY,
+                     request_interval: float = 0.5,
+                     browsers: int = 1,
+                     base_url: Optional[str] = None,
+                     use_browser: bool = True,
+                     parser: str = "auto",
+                     policy: Optional[FetchPolicy] = None,
+                     idle_exit: bool = True) -> Dict[str, int]:
+  """1つのワーカーを動かす（流量制限・サーキットブレーカーはワーカーごと）"""
+  policy = policy or FetchPolicy()
+  stats = ReadinessStats()
+  listing_browser = BrowserPool(LISTING_READY_SELECTOR, stats=stats, size=browsers) if use_browser else None
+  detail_browser = BrowserPool(BODY_READY_SELECTOR, stats=stats, size=browsers) if use_browser else None
+  scheduler = PolitenessScheduler(request_interval)
+  try:
+    async with FetchEngine(per_host_limit=concurrency, scheduler=scheduler, stats=stats,
+                           base_url=base_url, browser_fetch=listing_browser,
+                           needs_browser=listing_needs_browser, policy=policy) as listing_engine, \
+        FetchEngine(per_host_limit=concurrency, scheduler=scheduler, stats=stats,
+                    base_url=base_url, browser_fetch=detail_browser,
+                    needs_browser=partial(detail_needs_browser, parser=parser),
+                    policy=policy) as detail_engine:
+      worker = CrawlWorker(queue, listing_engine, detail_engine, name=name,
+                           concurrency=concurrency, visibility=visibility, parser=parser)
+      counts = await worker.run(idle_exit)
+      stats.print_summary()
+      return counts
+  finally:
+    for browser_fetch in (listing_browser, detail_browser):
+      if browser_fetch:
+        browser_fetch.close()
+
+
+def collect_results(queue: WorkQueue, store: PlantStore, categories: List[Dict],
+                    dead_letters: DeadLetterList) -> Dict:
+  """キューの結果をデータベースに書き込み、変更一覧を返す（何度実行しても同じ結果になる）
+
+  - 一覧ページの結果はカテゴリ順・ページ順に結合して URL 一覧にする。
+    一覧ページに1つでも失敗があれば、一覧から消えたURLを無効にしない
+  - 一覧から消えたURLのうち本文を取得済みだったものは、変更一覧の removed に入れる
+  - 植物ページの結果は URL 一覧の順に、重複の判定をしてから本文を書き込む。
+    失敗したページは、以前に取得できている内容を上書きしない
+  - 失敗した作業・dead になった作業は dead_letters に記録する
+  """
+  order = {category["type"]: i for i, category in enumerate(categories)}
+  listing_pages = []
+  failed_listings = 0
+  for item in queue.iter_items("done", "listing"):
+    payload, result = item["payload"], item["result"]
+    if result["status"] != "ok":
+      failed_listings += 1
+      dead_letters.add(payload["url"], "listing", result["failure"], result["error"],
+                       status=result.get("http_status"), category=payload["category"]["type"],
+                       page=payload["page"])
+      continue
+    dead_letters.resolve(payload["url"])
+    listing_pages.append((order.get(payload["category"]["type"], len(order)), payload["page"],
+                          result["links"]))
+  for item in queue.iter_items("dead", "listing"):
+    failed_listings += 1
+    payload = item["payload"]
+    dead_letters.add(payload["url"], "listing", item["failure"] or "unknown", item["error"],
+                     attempts=item["attempts"], category=payload["category"]["type"],
+                     page=payload["page"])
+
+  plant_data = []
+  seen_urls = set()
+  for _, _, links in sorted(listing_pages, key=lambda page: page[:2]):
+    for plant in links:
+      if plant["url"] not in seen_urls:
+        seen_urls.add(plant["url"])
+        plant_data.append(plant)
+  # 一覧から消えたページは評価結果を消せるよう、無効にする前の表示名で記録する
+  previous_pages = store.list_urls()
+  previous_names = {plant["url"]: plant["name"] for plant in previous_pages}
+  previous_names.update(store.display_names())
+  url_counts = store.upsert_urls(plant_data, replace=not failed_listings)
+  active_urls = store.active_urls()
+  removed_urls = [plant["url"] for plant in previous_pages
+                  if plant["url"] not in active_urls and store.snapshot(plant["url"]) is not None]
+
+  details = {item["payload"]["url"]: item for item in queue.iter_items("done", "detail")}
+  changes = {"new": [], "changed": [], "unchanged": [], "removed": removed_urls, "failed": []}
+  pages = []
+  plant_pages = store.list_urls()
+  # 変更一覧はURLで記録し、重複の判定を書き込んだ後に評価と同じ表示名にする
+  fallback_names = {plant["url"]: plant["name"] for plant in plant_pages}
+  fallback_names.update((url, previous_names[url]) for url in removed_urls)
+  for plant in plant_pages:
+    item = details.get(plant["url"])
+    if item is None:
+      continue
+    url, result, name = plant["url"], item["result"], plant["name"]
+    snapshot = store.snapshot(url)
+    if result["status"] == "error":
+      changes["failed"].append(url)
+      dead_letters.add(url, "detail", result["failure"], result["error"],
+                       status=result.get("http_status"), name=name)
+      if snapshot is None:
+        pages.append({"url": url, "status": "error", "error": result["error"], "texts": []})
+      continue
+    if result["status"] == "ok":
+      dead_letters.resolve(url)
+    else:
+      dead_letters.add(url, "detail", "empty", result["error"], name=name)
+    if snapshot is None:
+      changes["new"].append(url)
+    elif snapshot["content_hash"] == result["content_hash"]:
+      changes["unchanged"].append(url)
+    else:
+      changes["changed"].append(url)
+    pages.append({"url": url, "status": result["status"], "error": result["error"],
+                  "texts": result["texts"], "html_hash": result["html_hash"],
+                  "content_hash": result["content_hash"]})
+  for item in queue.iter_items("dead", "detail"):
+    payload = item["payload"]
+    changes["failed"].append(payload["url"])
+    fallback_names.setdefault(payload["url"], payload["name"])
+    dead_letters.add(payload["url"], "detail", item["failure"] or "unknown", item["error"],
+                     attempts=item["attempts"], name=payload["name"])
+
+  detector = load_detector(store)
+  counts = store.write_pages(dedup_pages(pages, detector))
+  changes = changes_by_name(changes, store.display_names(), fallback_names)
+  return {"urls": len(plant_data), "new_urls": url_counts["new"],
+          "removed_urls": url_counts["removed"], "failed_listings": failed_listings,
+          "pages": counts, "changes": changes,
+          "duplicates": dict(detector.counts)}
+
+
+def print_counts(queue: WorkQueue):
+  counts = queue.counts()
+  print(f"📋 作業キュー ({queue.name}): 待ち {counts['pending']}件, 処理中 {counts['leased']}件, "
+        f"完了 {counts['done']}件, 失敗 {counts['dead']}件")
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      description="共有の作業キューを使い、複数のプロセス・マシンで分担してクロールする")
+  parser.add_argument("--queue", default=DEFAULT_QUEUE,
+                      help="作業キュー（crawl_queue.db / sqlite:///path / file:///dir / "
+                           "redis://host:6379/0 / memory://）")
+  parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                      help="1つの作業を借りられる回数（超えたら失敗として止める）")
+  add_logging_arguments(parser)
+  subparsers = parser.add_subparsers(dest="command", required=True)
+
+  seed = subparsers.add_parser("seed", help="一覧ページの作業を登録する")
+  seed.add_argument("--reset", action="store_true", help="キューの作業と結果を全て消してから登録する")
+
+  work = subparsers.add_parser("work", help="作業が無くなるまで取得・抽出する（何台でも同時に動かせる）")
+  work.add_argument("--name", default=None, help="ワーカー名（既定: ホスト名:プロセスID）")
+  work.add_argument("--concurrency", type=int, default=8, help="同時に処理する作業の数")
+  work.add_argument("--visibility", type=float, default=DEFAULT_VISIBILITY,
+                    help="リースの有効期間（秒）。延長されないまま過ぎると他のワーカーに渡る")
+  work.add_argument("--interval", type=float, default=0.5,
+                    help="同一ホストへのリクエスト間隔（秒、ワーカーごと）")
+  work.add_argument("--browsers", type=int, default=1,
+                    help="JavaScriptが必要なページに使うブラウザのセッション数")
+  work.add_argument("--base-url", default=None,
+                    help="取得先を差し替えるベースURL（例: http://localhost:8000）")
+  work.add_argument("--no-browser", action="store_true",
+                    help="JavaScriptが必要なページでもブラウザを使わない")
+  work.add_argument("--parser", default="auto", choices=["auto"] + list(BACKENDS),
+                    help="HTMLの抽出方式（auto は基準の bs4。速い方式は壊れたHTMLで結果が異なることがある）")
+  work.add_argument("--rate", type=float, default=None,
+                    help="同一ホストへの1秒あたりのリクエスト数の上限（ワーカーごと）")
+  work.add_argument("--burst", type=int, default=1, help="--rate の上限を超えて連続で送れる数")
+  work.add_argument("--retries", type=int, default=3,
+                    help="タイムアウト・429・5xxなどのワーカー内での再試行回数")
+  work.add_argument("--forever", action="store_true",
+                    help="作業が無くなっても終了せず、新しい作業を待ち続ける")
+
+  collect = subparsers.add_parser("collect", help="結果をデータベースに書き込む")
+  collect.add_argument("--db", default=DEFAULT_DB_PATH, help="URL一覧・本文を保存するデータベース")
+  collect.add_argument("--changes", default=DEFAULT_CHANGES_PATH,
+                       help="変更一覧（新規・変更・失敗）の出力先")
+  collect.add_argument("--dead-letters", default=DEFAULT_DEAD_LETTERS_PATH,
+                       help="取得・解析に失敗したページの一覧")
+
+  subparsers.add_parser("status", help="作業の状態ごとの件数を表示する")
+  subparsers.add_parser("requeue", help="失敗した作業を待ちに戻す")
+
+  args = parser.parse_args()
+  configure_logging(args.log_level)
+  queue = open_queue(args.queue, args.max_attempts)
+  try:
+    if args.command == "seed":
+      if args.reset:
+        queue.clear()
+      added = seed_queue(queue, plant_categories)
+      print(f"✅ 一覧ページの作業を {added}件 登録しました → {args.queue}")
+      recovered = queue.recover()
+      if recovered:
+        print(f"🔁 登録の途中で止まっていた作業 {recovered}件を待ちに戻しました")
+    elif args.command == "work":
+      start = time.perf_counter()
+      counts = asyncio.run(run_worker(
+          queue,
+          name=args.name,
+          concurrency=args.concurrency,
+          visibility=args.visibility,
+          request_interval=args.interval,
+          browsers=args.browsers,
+          base_url=args.base_url,
+          use_browser=not args.no_browser,
+          parser=args.parser,
+          policy=FetchPolicy(rate=args.rate, burst=args.burst, retries=args.retries),
+          idle_exit=not args.forever))
+      elapsed = time.perf_counter() - start
+      print(f"\n✅ 完了 {counts['acked']}件, 失敗 {counts['failed']}件, キューに戻した {counts['retried']}件, "
+            f"リース切れ {counts['stale']}件 ({elapsed:.1f}秒)")
+      print_counts(queue)
+      print_stage_summary()
+      if args.metrics:
+        write_summary(args.metrics, {"script": "crawl_worker", "counts": counts,
+                                     "elapsed_seconds": elapsed})
+    elif args.command == "collect":
+      if queue.unfinished():
+        print("⚠️ まだ終わっていない作業があります（終わった分だけを書き込みます）")
+      store = PlantStore(args.db)
+      dead_letters = DeadLetterList(args.dead_letters)
+      try:
+        summary = collect_results(queue, store, plant_categories, dead_letters)
+      finally:
+        dead_letters.save()
+        store.close()
+      changes = summary["changes"]
+      with open(args.changes, "w", encoding="utf-8") as f:
+        json.dump(changes, f, ensure_ascii=False, indent=2)
+      print(f"💾 {args.db}: URL {summary['urls']}件（新規 {summary['new_urls']}件, "
+            f"無効化 {summary['removed_urls']}件）, 本文を更新 {summary['pages']['written']}件, "
+            f"変更なし {summary['pages']['unchanged']}件, 重複 {summary['pages']['duplicates']}件")
+      print(f"変更状況: 変更なし {len(changes['unchanged'])}件, 変更 {len(changes['changed'])}件, "
+            f"新規 {len(changes['new'])}件, 削除 {len(changes['removed'])}件, "
+            f"失敗 {len(changes['failed'])}件")
+      if summary["failed_listings"]:
+        print(f"⚠️ 取得できなかった一覧ページが {summary['failed_listings']}件 あるため、"
+              f"一覧から消えたURLは無効にしていません")
+      if len(dead_letters):
+        print(f"⚠️ 取得・解析できなかったページ: {len(dead_letters)}件 ({dead_letters.kind_counts()})"
+              f" → {args.dead_letters}")
+    elif args.command == "status":
+      print_counts(queue)
+    elif args.command == "requeue":
+      print(f"🔁 失敗した作業 {queue.requeue_dead()}件を待ちに戻しました")
+      recovered = queue.recover()
+      if recovered:
+        print(f"🔁 登録の途中で止まっていた作業 {recovered}件を待ちに戻しました")
+      print_counts(queue)
+  finally:
+    queue.close()
+
+
+if __name__ == "__main__":
+  main()
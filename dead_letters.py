@@ -0,0 +1,74 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+# 既定の保存先（get_urls.py・web_scraping.py・pipeline.py で共有し、stage で区別する）
+DEFAULT_DEAD_LETTERS_PATH = "dead_letters.json"
+
+
+class DeadLetterList:
+  """再試行しても取得・解析できなかったページの一覧（URLをキーにしたJSON）
+
+  失敗の種類（fetch_policy の timeout / throttled / parse / empty など）・HTTPステータス・
+  試行回数を残し、--replay-dead-letters でこの一覧のページだけを取得し直す。
+  取得し直して成功したページは resolve() で一覧から外す。
+  path=None ならファイルに保存しない（メモリ上だけの一覧）。
+  """
+
+  def __init__(self, path: Optional[str] = DEFAULT_DEAD_LETTERS_PATH):
+    self.path = path
+    self.entries: Dict[str, Dict] = {}
+    if path and os.path.exists(path):
+      with open(path, "r", encoding="utf-8") as f:
+        self.entries = json.load(f)
+
+  def __contains__(self, url: str) -> bool:
+    return url in self.entries
+
+  def __len__(self) -> int:
+    return len(self.entries)
+
+  def add(self, url: str, stage: str, kind: str, error: Optional[str] = None,
+          status: Optional[int] = None, attempts: int = 1, **info):
+    """失敗を記録する（同じURLの前回の記録は置き換え、失敗した回数だけ引き継ぐ）
+
+    stage は listing（一覧ページ）/ detail（植物ページ）。info には再取得に必要な
+    情報（一覧ページならカテゴリの type とページ番号、植物ページなら植物名）を渡す。
+    """
+    previous = self.entries.get(url, {})
+    self.entries[url] = {
+        "url": url,
+        "stage": stage,
+        "kind": kind,
+        "error": error,
+        "status": status,
+        "attempts": attempts,
+        "failures": previous.get("failures", 0) + 1,
+        "first_failed_at": previous.get("first_failed_at", time.time()),
+        "failed_at": time.time(),
+        **info,
+    }
+
+  def resolve(self, url: str):
+    """取得できたページを一覧から外す"""
+    self.entries.pop(url, None)
+
+  def list(self, stage: Optional[str] = None) -> List[Dict]:
+    """記録（stage を指定するとその段の分だけ）"""
+    return [entry for entry in self.entries.values() if stage is None or entry["stage"] == stage]
+
+  def kind_counts(self, stage: Optional[str] = None) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for entry in self.list(stage):
+      counts[entry["kind"]] = counts.get(entry["kind"], 0) + 1
+    return counts
+
+  def save(self):
+    """一時ファイルに書いてから置き換える（書き込み途中の破損を防ぐ）"""
+    if not self.path:
+      return
+    tmp_path = self.path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+      json.dump(self.entries, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, self.path)
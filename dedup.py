@@ -0,0 +1,212 @@
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, unquote, urlsplit, urlunsplit
+
+from instrumentation import get_logger, registry
+from validator_store import content_hash
+
+try:
+  import numpy as np
+except ImportError:  # numpy が無ければ完全一致の重複だけを検出する
+  np = None
+
+logger = get_logger("dedup")
+
+# MinHash の署名の長さと、LSHのバンド数（バンドあたり NUM_PERM // LSH_BANDS 行）
+NUM_PERM = 64
+LSH_BANDS = 16
+# 本文を何文字ずつの重なり（シングル）に分けるか（日本語は単語の区切りが無いため文字単位）
+SHINGLE_SIZE = 4
+# この推定Jaccard類似度以上なら同じ植物のページとみなす
+NEAR_DUPLICATE_THRESHOLD = 0.9
+
+# ハッシュ (a * x + b) mod p の係数。32ビットのハッシュ値に対して uint64 で桁あふれしない範囲
+_PRIME = 4294967311
+if np is not None:
+  _rng = np.random.RandomState(20240611)  # 実行ごとに署名が変わらないよう固定
+  _PERM_A = _rng.randint(1, 2 ** 31, NUM_PERM).astype(np.uint64)
+  _PERM_B = _rng.randint(0, 2 ** 32 - 1, NUM_PERM).astype(np.uint64)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def canonicalize_url(url: str) -> str:
+  """表記の揺れを除いたURL（同じページを指すURLを同じ文字列にする）
+
+  - スキームは https、ホスト名は小文字
+  - クエリ文字列・フラグメントは除く（個別ページの内容は変わらない）
+  - 連続するスラッシュは1つにまとめ、末尾はスラッシュで揃える（/p123 → /p123/）
+  - パーセントエンコードは大文字小文字などの揺れを揃える
+  """
+  parts = urlsplit(url.strip())
+  path = re.sub(r"/{2,}", "/", quote(unquote(parts.path), safe="/-._~")) or "/"
+  if not path.endswith("/") and "." not in path.rsplit("/", 1)[-1]:
+    path += "/"
+  return urlunsplit(("https", parts.netloc.lower(), path, "", ""))
+
+
+def url_id(url: str) -> str:
+  """URLの末尾の部分（p12345 や植物名のスラッグ）"""
+  return urlsplit(url).path.rstrip("/").rsplit("/", 1)[-1]
+
+
+def display_names(pages: Iterable[Dict]) -> Dict[str, str]:
+  """URL → 表示名
+
+  別のURLの植物に同じ名前があっても上書きし合わないよう、
+  2件目以降の名前には URL の末尾を付けて区別する（例: トマト (p12345)）。
+  """
+  names: Dict[str, str] = {}
+  owners: Dict[str, str] = {}
+  for page in pages:
+    url = page["url"]
+    if url in names:
+      continue
+    name = page["name"]
+    if owners.get(name, url) != url:
+      name = f"{name} ({url_id(url)})"
+    owners.setdefault(name, url)
+    names[url] = name
+  return names
+
+
+def changes_by_name(changes: Dict[str, List[str]], names: Dict[str, str],
+                    fallback: Dict[str, str]) -> Dict[str, List[str]]:
+  """URLで記録した変更一覧（new / changed / ...）を表示名の一覧にする
+
+  names は評価と同じ表示名（PlantStore.display_names()、重複ページを除いて付けたもの）。
+  重複ページ・一覧から消えたページなど names に無いURLは fallback の名前にする。
+  """
+  return {kind: [names.get(url) or fallback.get(url, url) for url in urls]
+          for kind, urls in changes.items()}
+
+
+def shingle_hashes(texts: List[str]):
+  """本文を SHINGLE_SIZE 文字ずつの重なりに分け、それぞれのCRC32を返す（重複なし）"""
+  text = _WHITESPACE.sub("", "".join(texts))
+  if len(text) < SHINGLE_SIZE:
+    hashes = {zlib.crc32(text.encode("utf-8"))} if text else set()
+  else:
+    hashes = {zlib.crc32(text[i:i + SHINGLE_SIZE].encode("utf-8"))
+              for i in range(len(text) - SHINGLE_SIZE + 1)}
+  return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+
+def minhash(texts: List[str]):
+  """本文のMinHash署名（NUM_PERM 個の最小ハッシュ値）。本文が空なら None"""
+  if np is None:
+    return None
+  hashes = shingle_hashes(texts)
+  if not len(hashes):
+    return None
+  return ((np.outer(hashes, _PERM_A) + _PERM_B) % _PRIME).min(axis=0)
+
+
+def estimated_similarity(a, b) -> float:
+  """2つの署名から推定したJaccard類似度"""
+  return float((a == b).mean())
+
+
+class DuplicateDetector:
+  """本文の完全一致（ハッシュ）と近似重複（MinHash + LSH）で同じ植物のページを見つける
+
+  先に登録されたページを代表とし、後から来た重複ページは代表のURLを返す。
+  LSHのバンドが1つでも一致した候補だけ類似度を計算するので、
+  1件の判定にかかる時間は登録済みの件数にほとんど依存しない。
+  """
+
+  def __init__(self, threshold: float = NEAR_DUPLICATE_THRESHOLD, bands: int = LSH_BANDS):
+    self.threshold = threshold
+    self.bands = bands
+    self.rows = NUM_PERM // bands
+    self.by_hash: Dict[str, str] = {}
+    self.hashes: Dict[str, str] = {}
+    self.signatures: Dict[str, object] = {}
+    self.buckets: Dict[Tuple[int, bytes], List[str]] = {}
+    self.counts = {"exact": 0, "near": 0}
+
+  def _band_keys(self, signature):
+    return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)]
+
+  def register(self, url: str, texts_hash: str, signature=None):
+    """重複でないページ（代表）として登録する（登録済みのURLなら前の内容と入れ替える）"""
+    self.unregister(url)
+    self.by_hash.setdefault(texts_hash, url)
+    self.hashes[url] = texts_hash
+    if signature is not None:
+      self.signatures[url] = signature
+      for key in self._band_keys(signature):
+        self.buckets.setdefault(key, []).append(url)
+
+  def unregister(self, url: str):
+    """代表ページの登録を取り消す"""
+    texts_hash = self.hashes.pop(url, None)
+    if texts_hash is not None and self.by_hash.get(texts_hash) == url:
+      del self.by_hash[texts_hash]
+    signature = self.signatures.pop(url, None)
+    if signature is not None:
+      for key in self._band_keys(signature):
+        self.buckets[key].remove(url)
+
+  def find(self, texts_hash: str, signature=None, url: Optional[str] = None) -> Optional[Dict]:
+    """登録済みのページの重複なら {"duplicate_of", "kind", "similarity"} を返す
+
+    url を渡すと、そのページ自身（本文が変わった代表ページ）は候補から除く。
+    """
+    if self.by_hash.get(texts_hash, url) != url:
+      return {"duplicate_of": self.by_hash[texts_hash], "kind": "exact", "similarity": 1.0}
+    if signature is None:
+      return None
+    best_url, best = None, 0.0
+    checked = set()
+    for key in self._band_keys(signature):
+      for candidate in self.buckets.get(key, ()):
+        if candidate != url and candidate not in checked:
+          checked.add(candidate)
+          similarity = estimated_similarity(signature, self.signatures[candidate])
+          if similarity > best:
+            best_url, best = candidate, similarity
+    if best_url is not None and best >= self.threshold:
+      return {"duplicate_of": best_url, "kind": "near", "similarity": best}
+    return None
+
+  def check(self, url: str, texts: List[str], signature=None) -> Optional[Dict]:
+    """ページを判定し、重複でなければ代表として登録する（本文が空のページは対象外）"""
+    if not texts:
+      return None
+    texts_hash = content_hash(texts)
+    if signature is None:
+      signature = minhash(texts)
+    duplicate = self.find(texts_hash, signature, url)
+    if duplicate is None:
+      self.register(url, texts_hash, signature)
+      return None
+    self.counts[duplicate["kind"]] += 1
+    registry.inc("duplicates_total", kind=duplicate["kind"])
+    logger.debug("♻️ %s は %s の重複です (%s, 類似度 %.2f)", url, duplicate["duplicate_of"],
+                 duplicate["kind"], duplicate["similarity"])
+    return duplicate
+
+
+def load_detector(store, threshold: float = NEAR_DUPLICATE_THRESHOLD) -> DuplicateDetector:
+  """データベースに保存済みの代表ページを登録した DuplicateDetector を作る"""
+  detector = DuplicateDetector(threshold)
+  for url, texts_hash, signature in store.iter_signatures():
+    if signature is not None and np is not None:
+      signature = np.frombuffer(signature, dtype=np.uint64)
+    detector.register(url, texts_hash, signature)
+  return detector
+
+
+def dedup_pages(pages: Iterable[Dict], detector: DuplicateDetector) -> Iterable[Dict]:
+  """ページの列に MinHash 署名と重複の判定（"signature", "duplicate"）を付けて返す
+
+  PlantStore.write_pages の前段として使う。本文を取得できたページだけが対象。
+  """
+  for page in pages:
+    if page.get("status") == "ok" and page.get("texts"):
+      page["signature"] = minhash(page["texts"])
+      page["duplicate"] = detector.check(page["url"], page["texts"], page["signature"])
+    yield page
@@ -0,0 +1,357 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from instrumentation import stage_timer
+
+# 詳細ページの本文（article__body が無い場合は代替セレクターを順に試す）
+BODY_SELECTOR = ("div", "article__body")
+ALTERNATIVE_BODY_SELECTORS = [
+    ("div", "single__section__body"),
+    ("div", "entry-content"),
+    ("div", "post-content"),
+    ("div", "content"),
+    ("article", None),
+    ("main", None),
+]
+
+# 一覧ページのカード（見つからない場合は代替セレクターを順に試す）
+CARD_SELECTOR = ("a", "library-list__item")
+CARD_TITLE_SELECTOR = ("span", "library-list__item__title")
+ALTERNATIVE_CARD_SELECTORS = [
+    ("a", "card"),
+    ("a", "item"),
+    ("div", "card"),
+    ("article", None),
+    ("div", "item"),
+    ("a", "library-item"),
+    ("div", "library-list"),
+    ("a", "plant-card"),
+]
+
+# 本文として取り出す要素
+TEXT_TAGS = ["h2", "h3", "p"]
+
+
+def _selector_label(tag: str, class_name: Optional[str]) -> str:
+  return f"{tag}.{class_name}" if class_name else tag
+
+
+class Extractor:
+  """抽出方式の共通部分（解析と抽出の所要時間を段ごとに記録する）
+
+  各方式は _parse（HTML → 文書）と _detail / _listing（文書 → 結果）を実装する。
+  """
+
+  name = ""
+
+  def _parse(self, html: str):
+    raise NotImplementedError
+
+  def _detail(self, doc) -> Dict:
+    raise NotImplementedError
+
+  def _listing(self, doc) -> Dict:
+    raise NotImplementedError
+
+  def extract_detail(self, html: str) -> Dict:
+    """詳細ページから {"title", "texts", "selector"} を返す（本文が無ければ selector は None）"""
+    with stage_timer("parse"):
+      doc = self._parse(html)
+    with stage_timer("extract"):
+      return self._detail(doc)
+
+  def extract_listing(self, html: str) -> Dict:
+    """一覧ページから {"title", "anchors": [(href, テキスト)], "cards": [(href, 植物名)]} を返す"""
+    with stage_timer("parse"):
+      doc = self._parse(html)
+    with stage_timer("extract"):
+      return self._listing(doc)
+
+
+class Bs4Extractor(Extractor):
+  """BeautifulSoup（html.parser）による抽出。従来の処理そのもので、他の方式の基準になる"""
+
+  name = "bs4"
+
+  def __init__(self):
+    from bs4 import BeautifulSoup
+    self._soup = BeautifulSoup
+
+  def _parse(self, html: str, parse_only=None):
+    return self._soup(html, "html.parser", parse_only=parse_only)
+
+  @staticmethod
+  def _find_all(soup, tag: str, class_name: Optional[str]):
+    return soup.find_all(tag, class_=class_name) if class_name else soup.find_all(tag)
+
+  @staticmethod
+  def _title(soup) -> Optional[str]:
+    return soup.title.string if soup.title else None
+
+  def _body_sections(self, soup) -> Tuple[List, Optional[str]]:
+    body = self._find_all(soup, *BODY_SELECTOR)
+    if body:
+      return body, _selector_label(*BODY_SELECTOR)
+    for tag, class_name in ALTERNATIVE_BODY_SELECTORS:
+      elements = self._find_all(soup, tag, class_name)
+      if any(elem.find("p") for elem in elements):
+        return elements, _selector_label(tag, class_name)
+    return [], None
+
+  def _detail(self, soup) -> Dict:
+    sections, selector = self._body_sections(soup)
+    texts = []
+    for section in sections:
+      for elem in section.find_all(TEXT_TAGS):
+        text = elem.get_text().strip()
+        if text:
+          texts.append(text)
+    return {"title": self._title(soup), "texts": texts, "selector": selector}
+
+  def _cards(self, soup) -> List:
+    cards = self._find_all(soup, *CARD_SELECTOR)
+    if cards:
+      return cards
+    for tag, class_name in ALTERNATIVE_CARD_SELECTORS:
+      elements = self._find_all(soup, tag, class_name)
+      if elements and elements[0].get('href'):
+        return elements
+    return []
+
+  def _listing(self, soup) -> Dict:
+    anchors = []
+    for a in soup.find_all("a"):
+      href = a.get('href')
+      if href:
+        anchors.append((href, a.get_text(strip=True)))
+
+    cards = []
+    for card in self._cards(soup):
+      name_tag = card.find(*CARD_TITLE_SELECTOR)
+      cards.append((card.get("href"), name_tag.get_text(strip=True) if name_tag else None))
+    return {"title": self._title(soup), "anchors": anchors, "cards": cards}
+
+
+class TargetedBs4Extractor(Bs4Extractor):
+  """BeautifulSoupで必要な部分木（article__body・aタグ）だけを解析する
+
+  目的の要素が無いページだけ従来どおり全体を解析し直す。
+  """
+
+  name = "bs4-targeted"
+
+  def __init__(self):
+    super().__init__()
+    from bs4 import SoupStrainer
+    # 解析中のclass属性は分割前の文字列なので、クラス名単位で照合する
+    body_class = re.compile(rf"(^|\s){re.escape(BODY_SELECTOR[1])}(\s|$)")
+    self._body_strainer = SoupStrainer(BODY_SELECTOR[0], class_=body_class)
+    self._anchor_strainer = SoupStrainer("a")
+
+  def extract_detail(self, html: str) -> Dict:
+    with stage_timer("parse"):
+      soup = self._parse(html, self._body_strainer)
+    if not soup.find(*BODY_SELECTOR):
+      return super().extract_detail(html)
+    with stage_timer("extract"):
+      result = self._detail(soup)
+    result["title"] = None  # 部分解析ではタイトルを読まない
+    return result
+
+  def extract_listing(self, html: str) -> Dict:
+    with stage_timer("parse"):
+      soup = self._parse(html, self._anchor_strainer)
+    if not soup.find(*CARD_SELECTOR):
+      return super().extract_listing(html)
+    with stage_timer("extract"):
+      result = self._listing(soup)
+    result["title"] = None
+    return result
+
+
+class LxmlExtractor(Extractor):
+  """lxml（C実装のパーサー）と事前コンパイルしたXPathによる抽出"""
+
+  name = "lxml"
+
+  def __init__(self):
+    from lxml import etree, html as lxml_html
+    self._etree = etree
+    self._lxml_html = lxml_html
+    self._body = self._compile(*BODY_SELECTOR)
+    self._alternative_bodies = [(self._compile(tag, class_name), _selector_label(tag, class_name))
+                                for tag, class_name in ALTERNATIVE_BODY_SELECTORS]
+    self._cards = self._compile(*CARD_SELECTOR)
+    self._alternative_cards = [self._compile(tag, class_name)
+                               for tag, class_name in ALTERNATIVE_CARD_SELECTORS]
+    self._card_title = self._compile(*CARD_TITLE_SELECTOR, relative=True)
+    self._text_elems = etree.XPath(
+        ".//*[" + " or ".join(f"self::{tag}" for tag in TEXT_TAGS) + "]")
+    self._has_p = etree.XPath("boolean(.//p)")
+    self._anchors = etree.XPath("//a[@href]")
+    self._title = etree.XPath("string(//title[1])")
+    # BeautifulSoupのget_textと同じく、コメント・script・styleの文字列は含めない
+    self._strings = etree.XPath(".//text()[not(ancestor::script) and not(ancestor::style)]")
+
+  def _compile(self, tag: str, class_name: Optional[str], relative: bool = False):
+    prefix = ".//" if relative else "//"
+    if class_name:
+      return self._etree.XPath(
+          f"{prefix}{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]")
+    return self._etree.XPath(f"{prefix}{tag}")
+
+  def _parse(self, html: str):
+    try:
+      return self._lxml_html.document_fromstring(html)
+    except (self._etree.ParserError, ValueError):
+      return None
+
+  def _text(self, elem, strip: bool = False) -> str:
+    if strip:
+      return "".join(s.strip() for s in self._strings(elem))
+    return "".join(self._strings(elem))
+
+  def _detail(self, root) -> Dict:
+    if root is None:
+      return {"title": None, "texts": [], "selector": None}
+
+    sections, selector = self._body(root), _selector_label(*BODY_SELECTOR)
+    if not sections:
+      sections, selector = [], None
+      for xpath, label in self._alternative_bodies:
+        elements = xpath(root)
+        if any(self._has_p(elem) for elem in elements):
+          sections, selector = elements, label
+          break
+
+    texts = []
+    for section in sections:
+      for elem in self._text_elems(section):
+        text = self._text(elem).strip()
+        if text:
+          texts.append(text)
+    return {"title": self._title(root) or None, "texts": texts, "selector": selector}
+
+  def _listing(self, root) -> Dict:
+    if root is None:
+      return {"title": None, "anchors": [], "cards": []}
+
+    anchors = [(a.get("href"), self._text(a, strip=True)) for a in self._anchors(root)]
+
+    cards = self._cards(root)
+    if not cards:
+      for xpath in self._alternative_cards:
+        elements = xpath(root)
+        if elements and elements[0].get("href"):
+          cards = elements
+          break
+
+    card_links = []
+    for card in cards:
+      name_tags = self._card_title(card)
+      card_links.append((card.get("href"),
+                         self._text(name_tags[0], strip=True) if name_tags else None))
+    return {"title": self._title(root) or None, "anchors": anchors, "cards": card_links}
+
+
+class SelectolaxExtractor(Extractor):
+  """selectolax（Lexbor）とCSSセレクターによる抽出"""
+
+  name = "selectolax"
+
+  def __init__(self):
+    from selectolax.lexbor import LexborHTMLParser
+    self._parser = LexborHTMLParser
+    self._body = self._css(*BODY_SELECTOR)
+    self._alternative_bodies = [(self._css(tag, class_name), _selector_label(tag, class_name))
+                                for tag, class_name in ALTERNATIVE_BODY_SELECTORS]
+    self._card = self._css(*CARD_SELECTOR)
+    self._alternative_cards = [self._css(tag, class_name)
+                               for tag, class_name in ALTERNATIVE_CARD_SELECTORS]
+    self._card_title = self._css(*CARD_TITLE_SELECTOR)
+    self._text_elems = ", ".join(TEXT_TAGS)
+
+  @staticmethod
+  def _css(tag: str, class_name: Optional[str]) -> str:
+    return f"{tag}.{class_name}" if class_name else tag
+
+  @staticmethod
+  def _title(tree) -> Optional[str]:
+    node = tree.css_first("title")
+    return node.text() if node else None
+
+  def _parse(self, html: str):
+    return self._parser(html)
+
+  def _detail(self, tree) -> Dict:
+    sections, selector = tree.css(self._body), self._body
+    if not sections:
+      sections, selector = [], None
+      for css, label in self._alternative_bodies:
+        elements = tree.css(css)
+        if any(elem.css_first("p") for elem in elements):
+          sections, selector = elements, label
+          break
+
+    texts = []
+    for section in sections:
+      for elem in section.css(self._text_elems):
+        text = elem.text(deep=True, separator="", strip=False).strip()
+        if text:
+          texts.append(text)
+    return {"title": self._title(tree), "texts": texts, "selector": selector}
+
+  def _listing(self, tree) -> Dict:
+    anchors = [(a.attributes["href"], a.text(deep=True, separator="", strip=True))
+               for a in tree.css("a[href]") if a.attributes["href"]]
+
+    cards = tree.css(self._card)
+    if not cards:
+      for css in self._alternative_cards:
+        elements = tree.css(css)
+        if elements and elements[0].attributes.get("href"):
+          cards = elements
+          break
+
+    card_links = []
+    for card in cards:
+      name_tag = card.css_first(self._card_title)
+      card_links.append((card.attributes.get("href"),
+                         name_tag.text(deep=True, separator="", strip=True) if name_tag else None))
+    return {"title": self._title(tree), "anchors": anchors, "cards": card_links}
+
+
+BACKENDS = {
+    "bs4": Bs4Extractor,
+    "bs4-targeted": TargetedBs4Extractor,
+    "lxml": LxmlExtractor,
+    "selectolax": SelectolaxExtractor,
+}
+
+# "auto" の場合に使う方式。基準の bs4（html.parser）だけにし、速い方式は --parser で明示した時だけ使う
+# （閉じタグの無い p など壊れたHTMLでは方式ごとに段落の区切りが変わり、評価が変わるため。
+#  違いは bench_extraction.py の MALFORMED_CASES で確認できる）
+AUTO_ORDER = ["bs4"]
+
+_extractors: Dict[str, object] = {}
+
+
+def get_extractor(name: str = "auto"):
+  """抽出方式のインスタンスを返す（方式ごとに1つだけ作って使い回す）"""
+  if name in _extractors:
+    return _extractors[name]
+
+  if name == "auto":
+    for candidate in AUTO_ORDER:
+      try:
+        extractor = get_extractor(candidate)
+      except ImportError:
+        continue
+      _extractors["auto"] = extractor
+      return extractor
+    raise ImportError("利用できるHTML解析ライブラリがありません")
+
+  if name not in BACKENDS:
+    raise ValueError(f"不明な抽出方式です: {name}（{', '.join(BACKENDS)}）")
+  _extractors[name] = BACKENDS[name]()
+  return _extractors[name]
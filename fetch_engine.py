@@ -0,0 +1,187 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from browser import USER_AGENT
+from fetch_policy import FetchPolicy, classify_exception, classify_status, parse_retry_after
+from instrumentation import get_logger, registry
+from politeness import PolitenessScheduler
+from readiness import ReadinessStats
+
+logger = get_logger("fetch_engine")
+
+SITE_BASE_URL = "https://lovegreen.net"
+
+
+def rewrite_base_url(url: str, base_url: Optional[str]) -> str:
+  """本番サイトのURLをローカルの代替サーバー向けに書き換える"""
+  if base_url and url.startswith(SITE_BASE_URL):
+    return base_url.rstrip('/') + url[len(SITE_BASE_URL):]
+  return url
+
+
+class FetchEngine:
+  """asyncioベースのHTTP取得エンジン
+
+  - 接続プールを共有する1つのHTTPクライアントで全ページを取得
+  - ホストごとに同時接続数を制限し、リクエスト間隔はschedulerで制御
+  - ページごとの取得時間（time-to-ready）をstatsに記録
+  - JavaScriptが必要なページだけブラウザ（browser_fetch）で再取得
+  - 流量制限・再試行・サーキットブレーカーは policy（FetchPolicy）に従い、
+    最終的に失敗したページは結果の failure に失敗の種類を入れて返す
+  """
+
+  def __init__(self,
+               per_host_limit: int = 4,
+               total_limit: int = 32,
+               request_interval: float = 0,
+               scheduler: Optional[PolitenessScheduler] = None,
+               stats: Optional[ReadinessStats] = None,
+               timeout: float = 30,
+               base_url: Optional[str] = None,
+               browser_fetch: Optional[Callable[[str], str]] = None,
+               needs_browser: Optional[Callable[[str], bool]] = None,
+               policy: Optional[FetchPolicy] = None):
+    self.per_host_limit = per_host_limit
+    self.total_limit = total_limit
+    # リクエスト間隔の制御（描画待ちとは別）
+    self.scheduler = scheduler or PolitenessScheduler(request_interval)
+    self.stats = stats or ReadinessStats()
+    self.timeout = timeout
+    self.base_url = base_url
+    self.browser_fetch = browser_fetch
+    self.needs_browser = needs_browser
+    self.policy = policy or FetchPolicy()
+    self.session: Optional[aiohttp.ClientSession] = None
+    self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+    # ブラウザ取得はスレッドで実行する（同時数はブラウザプールのセッション数まで）
+    self._browser_executor = ThreadPoolExecutor(max_workers=getattr(browser_fetch, "size", 1))
+
+  async def __aenter__(self):
+    connector = aiohttp.TCPConnector(
+        limit=self.total_limit, limit_per_host=self.per_host_limit)
+    self.session = aiohttp.ClientSession(
+        connector=connector,
+        headers={"User-Agent": USER_AGENT},
+        timeout=aiohttp.ClientTimeout(total=self.timeout))
+    return self
+
+  async def __aexit__(self, exc_type, exc, tb):
+    await self.session.close()
+    self._browser_executor.shutdown(wait=True)
+
+  def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc
+    if host not in self._host_semaphores:
+      self._host_semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+    return self._host_semaphores[host]
+
+  async def _fetch_once(self, target_url: str, headers: Optional[Dict[str, str]],
+                        result: Dict) -> Optional[float]:
+    """1回だけ取得を試みて result を更新し、Retry-After で指定された秒数を返す"""
+    result.update(status=None, html="", error=None, failure=None)
+    retry_after = None
+    async with self._host_semaphore(target_url):
+      if not await self.policy.acquire(target_url):
+        result["failure"] = "circuit_open"
+        result["error"] = "サイトの不調のため送信を止めています"
+        return None
+      await self.scheduler.wait(target_url)
+      start = time.perf_counter()
+      try:
+        async with self.session.get(target_url, headers=headers) as response:
+          result["status"] = response.status
+          result["etag"] = response.headers.get("ETag")
+          result["last_modified"] = response.headers.get("Last-Modified")
+          if response.status == 304:
+            result["not_modified"] = True
+            registry.inc("fetch_requests_total", status=304, via="http")
+          else:
+            html = await response.text(errors="replace")
+            elapsed = time.perf_counter() - start
+            self.stats.record("http", elapsed)
+            registry.observe("stage_seconds", elapsed, stage="fetch")
+            registry.inc("fetch_requests_total", status=response.status, via="http")
+            registry.inc("fetch_bytes_total", len(html))
+            result["failure"] = classify_status(response.status)
+            if result["failure"]:
+              result["error"] = f"HTTP {response.status} {response.reason or ''}".rstrip()
+              retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            else:
+              result["html"] = html
+      except Exception as e:
+        result["failure"] = classify_exception(e)
+        result["error"] = str(e) or type(e).__name__
+    self.policy.record(target_url, result["failure"], retry_after)
+    return retry_after
+
+  async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> Dict:
+    """1ページを取得し、結果を辞書で返す
+
+    headersに条件付きリクエストのヘッダーを渡した場合、
+    304 Not Modified なら not_modified=True でHTMLは空になる。
+    再試行できる失敗（タイムアウト・429・5xxなど）は policy に従って再試行し、
+    それでも失敗した場合は error にメッセージ、failure に失敗の種類が入る。
+    """
+    target_url = rewrite_base_url(url, self.base_url)
+    result = {"url": url, "status": None, "html": "", "via": "http", "error": None,
+              "failure": None, "attempts": 0,
+              "not_modified": False, "etag": None, "last_modified": None}
+
+    while True:
+      result["attempts"] += 1
+      retry_after = await self._fetch_once(target_url, headers, result)
+      failure = result["failure"]
+      if failure is None:
+        break
+      if not self.policy.should_retry(failure, result["attempts"]):
+        registry.inc("fetch_errors_total", kind=failure)
+        return result
+      delay = self.policy.retry_delay(target_url, result["attempts"], retry_after)
+      registry.inc("fetch_retries_total", kind=failure)
+      logger.debug("🔁 %s: %s のため %.1f秒後に再試行します (%d回目)",
+                   url, failure, delay, result["attempts"])
+      await asyncio.sleep(delay)
+
+    if result["not_modified"]:
+      return result
+
+    # 静的HTMLに目的の要素が無い場合のみブラウザで取得し直す
+    if self.browser_fetch and self.needs_browser and self.needs_browser(result["html"]):
+      if not await self.policy.acquire(target_url):
+        result.update(html="", failure="circuit_open", error="サイトの不調のため送信を止めています")
+        registry.inc("fetch_errors_total", kind="circuit_open")
+        return result
+      try:
+        await self.scheduler.wait(target_url)
+        loop = asyncio.get_running_loop()
+        result["html"] = await loop.run_in_executor(
+            self._browser_executor, self.browser_fetch, target_url)
+        result["via"] = "browser"
+        registry.inc("fetch_requests_total", status=200, via="browser")
+      except Exception as e:
+        result["error"] = f"ブラウザ取得エラー: {e}"
+        result["failure"] = "browser"
+        registry.inc("fetch_errors_total", kind="browser")
+      self.policy.record(target_url, result["failure"])
+
+    return result
+
+  async def fetch_all(self, urls: Iterable[str],
+                      headers_for: Optional[Callable[[str], Dict[str, str]]] = None):
+    """全URLを並行取得し、完了した順に結果を返す非同期ジェネレーター
+
+    headers_forを渡すとURLごとの追加ヘッダー（条件付きリクエスト等）を付ける。
+    """
+    tasks = [asyncio.ensure_future(self.fetch(url, headers_for(url) if headers_for else None))
+             for url in urls]
+    try:
+      for future in asyncio.as_completed(tasks):
+        yield await future
+    finally:
+      for task in tasks:
+        task.cancel()
@@ -0,0 +1,251 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from instrumentation import get_logger, registry
+
+logger = get_logger("fetch_policy")
+
+# 失敗の種類
+# - timeout: タイムアウト（408を含む） / connection: 接続の失敗・切断
+# - throttled: 429 Too Many Requests / server: 5xx / not_found: 404・410 / client: その他の4xx
+# - circuit_open: サーキットブレーカーが開いていて送らなかった
+# - browser: ブラウザでの取得の失敗 / parse: HTMLの解析の失敗 / empty: 本文が見つからない
+# - unknown: 上記以外の例外
+RETRYABLE = {"timeout", "connection", "throttled", "server", "circuit_open"}
+
+# サーキットブレーカーの失敗に数える種類（サイトの不調を示すもの）
+SITE_FAILURES = {"timeout", "connection", "throttled", "server"}
+
+# 試しのリクエストの結果を待つ間、状態を確認する間隔（秒）
+PROBE_POLL_INTERVAL = 0.1
+
+
+def classify_status(status: int) -> Optional[str]:
+  """HTTPステータスを失敗の種類にする（成功・304なら None）"""
+  if status < 400:
+    return None
+  if status == 429:
+    return "throttled"
+  if status == 408:
+    return "timeout"
+  if status >= 500:
+    return "server"
+  if status in (404, 410):
+    return "not_found"
+  return "client"
+
+
+def classify_exception(error: BaseException) -> str:
+  """取得中の例外を失敗の種類にする"""
+  if isinstance(error, aiohttp.ClientResponseError):
+    return classify_status(error.status) or "client"
+  if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+    return "timeout"
+  if isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, ConnectionError)):
+    return "connection"
+  return "unknown"
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+  """Retry-After ヘッダー（秒数またはHTTP日付）を待つ秒数にする"""
+  if not value:
+    return None
+  value = value.strip()
+  if value.isdigit():
+    return float(value)
+  try:
+    return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+  except (TypeError, ValueError):
+    return None
+
+
+class TokenBucket:
+  """1ホスト分のトークンバケット
+
+  rate 件/秒でトークンが貯まり（最大 burst 個）、1リクエストで1個使う。
+  トークンが無ければ次のトークンが貯まるまで待つ（先に予約した順）。
+  pause() で一定時間そのホストへの送信を止める（429 の Retry-After など）。
+  """
+
+  def __init__(self, rate: Optional[float], burst: int = 1):
+    self.rate = rate
+    self.burst = max(1, burst)
+    self.tokens = float(self.burst)
+    self.updated = time.monotonic()
+    self.paused_until = 0.0
+
+  def reserve(self, now: float) -> float:
+    """トークンを1個予約し、待つべき秒数を返す（呼び出し側でロックする）"""
+    delay = max(0.0, self.paused_until - now)
+    if self.rate:
+      self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+      self.updated = now
+      self.tokens -= 1
+      if self.tokens < 0:
+        delay = max(delay, -self.tokens / self.rate)
+    return delay
+
+  def pause(self, now: float, seconds: float):
+    self.paused_until = max(self.paused_until, now + seconds)
+
+
+class CircuitBreaker:
+  """1ホスト分のサーキットブレーカー
+
+  サイトの不調を示す失敗（SITE_FAILURES）が failure_threshold 回続くと開き（open）、
+  cooldown 秒の間はリクエストを送らない。その後は1件だけ試し（half_open）、
+  成功すれば閉じ（closed）、失敗すればもう一度 cooldown 秒開く。
+  試しのリクエストの結果が出るまで、他のリクエストは送らずに待つ。
+  """
+
+  def __init__(self, host: str, failure_threshold: int = 5, cooldown: float = 30):
+    self.host = host
+    self.failure_threshold = failure_threshold
+    self.cooldown = cooldown
+    self.state = "closed"
+    self.failures = 0
+    self.opened_at = 0.0
+    self.probing = False
+    self.probe_started = 0.0
+
+  def allow(self, now: float) -> Optional[bool]:
+    """リクエストを送ってよいか（呼び出し側でロックする）
+
+    True: 送ってよい / False: 開いているので送らない / None: 試しのリクエストの結果待ち
+    """
+    if self.state == "closed":
+      return True
+    if self.state == "open":
+      if now - self.opened_at < self.cooldown:
+        return False
+      self._transition("half_open")
+    # 試しのリクエストが cooldown 秒たっても終わらなければ（中断など）次を試す
+    if not self.probing or now - self.probe_started >= self.cooldown:
+      self.probing = True
+      self.probe_started = now
+      return True
+    return None
+
+  def remaining(self, now: float) -> float:
+    """開いている残りの秒数"""
+    if self.state != "open":
+      return 0.0
+    return max(0.0, self.cooldown - (now - self.opened_at))
+
+  def record(self, now: float, failure: Optional[str]):
+    if self.state == "open":
+      # 開く前に送ったリクエストの結果なので、状態を変えない
+      return
+    if failure not in SITE_FAILURES:
+      # 成功、またはサイトの不調によらない失敗（404・解析エラーなど）
+      self.failures = 0
+      self.probing = False
+      if self.state != "closed":
+        self._transition("closed")
+      return
+    self.failures += 1
+    if self.state == "half_open" or self.failures >= self.failure_threshold:
+      self.probing = False
+      self.opened_at = now
+      if self.state != "open":
+        self._transition("open")
+
+  def _transition(self, state: str):
+    self.state = state
+    registry.inc("circuit_transitions_total", host=self.host, state=state)
+    if state == "open":
+      logger.warning("🚧 %s への取得を %.0f秒 止めます（失敗が %d回 続いたため）",
+                     self.host, self.cooldown, self.failures)
+    elif state == "closed":
+      logger.info("✅ %s への取得を再開しました", self.host)
+
+
+class FetchPolicy:
+  """全取得に共通の方針（ホストごとの流量制限・再試行・サーキットブレーカー）
+
+  - rate: ホストごとの1秒あたりのリクエスト数の上限（None なら制限なし）、burst: 連続で送れる数
+  - retries: 再試行できる失敗（RETRYABLE）の再試行回数
+  - 再試行までの待ち時間は 0〜min(max_backoff, backoff * 2^試行回数) の一様乱数（full jitter）。
+    Retry-After があればそれ以上待ち、429 ならそのホスト全体を止める
+  - failure_threshold / cooldown: サーキットブレーカーの設定
+  FetchEngine 同士で共有すれば、一覧ページと詳細ページで同じ制限になる。
+  """
+
+  def __init__(self,
+               rate: Optional[float] = None,
+               burst: int = 1,
+               retries: int = 3,
+               backoff: float = 0.5,
+               max_backoff: float = 30,
+               failure_threshold: int = 5,
+               cooldown: float = 30):
+    self.rate = rate
+    self.burst = burst
+    self.retries = retries
+    self.backoff = backoff
+    self.max_backoff = max_backoff
+    self.failure_threshold = failure_threshold
+    self.cooldown = cooldown
+    self.random = random.Random()
+    self._buckets: Dict[str, TokenBucket] = {}
+    self._breakers: Dict[str, CircuitBreaker] = {}
+    self._lock = threading.Lock()
+
+  def _host_state(self, url: str):
+    host = urlsplit(url).netloc
+    if host not in self._buckets:
+      self._buckets[host] = TokenBucket(self.rate, self.burst)
+      self._breakers[host] = CircuitBreaker(host, self.failure_threshold, self.cooldown)
+    return self._buckets[host], self._breakers[host]
+
+  async def acquire(self, url: str) -> bool:
+    """送信の前に呼ぶ。流量制限の分だけ待ち、サーキットブレーカーが開いていれば False"""
+    while True:
+      with self._lock:
+        now = time.monotonic()
+        bucket, breaker = self._host_state(url)
+        allowed = breaker.allow(now)
+        if allowed:
+          delay = bucket.reserve(now)
+          break
+      if allowed is False:
+        return False
+      await asyncio.sleep(PROBE_POLL_INTERVAL)
+    if delay > 0:
+      await asyncio.sleep(delay)
+    return True
+
+  def record(self, url: str, failure: Optional[str] = None, retry_after: Optional[float] = None):
+    """1回の試行の結果（成功なら failure=None）をサーキットブレーカーに伝える"""
+    with self._lock:
+      now = time.monotonic()
+      bucket, breaker = self._host_state(url)
+      breaker.record(now, failure)
+      if failure == "throttled":
+        bucket.pause(now, retry_after if retry_after is not None else self.backoff)
+
+  def should_retry(self, failure: Optional[str], attempt: int) -> bool:
+    """attempt 回目（1から）の試行が failure で失敗した時に再試行するか"""
+    return failure in RETRYABLE and attempt <= self.retries
+
+  def retry_delay(self, url: str, attempt: int, retry_after: Optional[float] = None) -> float:
+    """attempt 回目の試行の後、再試行まで待つ秒数"""
+    delay = self.random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+    with self._lock:
+      _, breaker = self._host_state(url)
+      delay = max(delay, breaker.remaining(time.monotonic()))
+    if retry_after is not None:
+      delay = max(delay, retry_after)
+    return delay
+
+  def states(self) -> Dict[str, str]:
+    """ホスト → サーキットブレーカーの状態"""
+    with self._lock:
+      return {host: breaker.state for host, breaker in self._breakers.items()}
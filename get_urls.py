@@ -1,351 +1,426 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
-import time
+from typing import Dict, List, Optional
+import argparse
+import asyncio
 import csv
-
-# --- Seleniumのオプション設定 ---
-options = Options()
-options.add_argument('--headless')
-options.add_argument('--no-sandbox')
-options.add_argument('--disable-dev-shm-usage')
-options.add_argument(
-    '--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-
-driver = webdriver.Chrome(service=Service(
-    ChromeDriverManager().install()), options=options)
-
-# 全ページの植物データを格納するリスト
-all_plant_data = []
+import logging
+import re
+
+from browser import BrowserPool
+from dead_letters import DEFAULT_DEAD_LETTERS_PATH, DeadLetterList
+from dedup import canonicalize_url
+from extraction import BACKENDS, get_extractor
+from fetch_engine import FetchEngine
+from fetch_policy import FetchPolicy
+from instrumentation import (add_logging_arguments, configure_logging, get_logger,
+                             print_stage_summary, write_summary)
+from link_rules import get_link_rules, rule_hit_table
+from plant_store import DEFAULT_DB_PATH, PlantStore
+from politeness import PolitenessScheduler
+from readiness import ReadinessStats
+from validator_store import ValidatorStore, content_hash
+
+logger = get_logger("get_urls")
 
 # --- 植物カテゴリの設定 ---
+# ページ数は1ページ目のページネーションから自動で取得する
 plant_categories = [
     {
         "name": "野菜",
         "type": "vegetables",
         "url_base": "https://lovegreen.net/library/type/vegetables/",
-        "max_pages": 14
     },
     {
         "name": "果樹",
         "type": "fruit-tree",
         "url_base": "https://lovegreen.net/library/type/fruit-tree/",
-        "max_pages": 5
     },
     {
         "name": "花",
         "type": "flower",
         "url_base": "https://lovegreen.net/library/type/flower/",
-        "max_pages": 62
     }
 ]
 
-# --- 各カテゴリの処理 ---
-for category in plant_categories:
-  print(f"\n{'='*80}")
-  print(f"🌱 {category['name']}の処理を開始")
-  print(f"{'='*80}")
+# 一覧ページの描画完了とみなす要素
+LISTING_READY_SELECTOR = "a.library-list__item"
+
+
+def listing_url(category: Dict, page_num: int) -> str:
+  """LOVEGREEN 一覧ページのURLを返す"""
+  if page_num == 1:
+    if category['type'] in ('vegetables', 'fruit-tree'):
+      return f"{category['url_base']}page/1"
+    return category['url_base']  # flower
+  return f"{category['url_base']}page/{page_num}/"
+
+
+def discover_page_count(html: str, category: Dict) -> int:
+  """1ページ目のページネーションのリンクから総ページ数を求める"""
+  pattern = re.compile(rf"/type/{re.escape(category['type'])}/page/(\d+)")
+  page_numbers = [int(num) for num in pattern.findall(html)]
+  return max(page_numbers, default=1)
+
+
+def listing_link_url(href: str, category: Dict) -> str:
+  """一覧ページのリンクを完全なURLにする"""
+  if href.startswith('/'):
+    return "https://lovegreen.net" + href
+  if not href.startswith('http'):
+    return f"https://lovegreen.net/library/{category['type']}/" + href
+  return href
+
+
+def extract_listing_links(html: str, category: Dict, parser: str = "auto") -> List[Dict]:
+  """一覧ページのHTMLから個別植物ページの (name, url, category) を抽出する
+
+  カテゴリに関連するリンクと一覧カードを1つの列にまとめ、
+  カテゴリの規則（link_rules.py）で1件につき1回の照合で振り分ける。
+  """
+  listing = get_extractor(parser).extract_listing(html)
+  cards = listing["cards"]
+
+  # カテゴリに関連するリンクを探す
+  category_links = [(href, text) for href, text in listing["anchors"] if category['type'] in href]
+
+  # デバッグ情報を表示（--log-level DEBUG の時だけ）
+  debug = logger.isEnabledFor(logging.DEBUG)
+  if debug:
+    logger.debug("ページタイトル: %s / HTML全体のサイズ: %d 文字 / 一覧カード: %d 個 / "
+                 "hrefを持つaタグ数: %d / %sを含むリンク数: %d",
+                 listing['title'] or 'なし', len(html), len(cards), len(listing['anchors']),
+                 category['type'], len(category_links))
+    for i, (href, text) in enumerate(category_links[:5]):
+      logger.debug("%d. %s... - %s", i + 1, text[:30], href)
+
+  # カテゴリリンク → 一覧カードの順に、個別植物ページで除外規則に当てはまらないものを採用
+  # （末尾のスラッシュ・クエリ文字列などの揺れを除いたURLで重複を除く）
+  candidates = [(listing_link_url(href, category), text, href)
+                for href, text in category_links + cards if href and text]
+  page_plant_data = []
+  page_urls = set()
+  for full_url, text in get_link_rules(category).select(candidates):
+    url = canonicalize_url(full_url)
+    if url not in page_urls:
+      page_plant_data.append({"name": text, "url": url, "category": category['name']})
+      page_urls.add(url)
+      if debug:
+        logger.debug("✓ %s - %s", text, url)
+
+  return page_plant_data
+
+
+def needs_browser(html: str) -> bool:
+  """一覧カードが静的HTMLに含まれず、JavaScriptでの描画が必要そうか判定する"""
+  return "library-list__item" not in html
+
+
+class ListingCrawler:
+  """一覧ページをカテゴリ・ページをまたいで並行取得する
+
+  再試行しても取得・解析できなかった一覧ページは dead_letters に記録する。
+  """
+
+  def __init__(self, engine: FetchEngine, validators: ValidatorStore, parser: str = "auto",
+               dead_letters: Optional[DeadLetterList] = None):
+    self.engine = engine
+    self.validators = validators
+    self.parser = parser
+    self.dead_letters = dead_letters
+    self.unchanged_pages = 0
+    self.failed_urls = set()
+
+  def _failed(self, url: str, category: Dict, page_num: int, kind: str, error: str,
+              result: Optional[Dict] = None):
+    self.failed_urls.add(url)
+    if self.dead_letters is not None:
+      self.dead_letters.add(url, "listing", kind, error,
+                            status=result["status"] if result else None,
+                            attempts=result["attempts"] if result else 1,
+                            category=category["type"], page=page_num)
+
+  async def fetch_listing(self, category: Dict, page_num: int) -> Dict:
+    """一覧ページを1つ取得し、HTMLと抽出したリンクを返す"""
+    url = listing_url(category, page_num)
+    logger.debug("🔄 %s - ページ %d を取得: %s", category['name'], page_num, url)
+    # 304 の時に使う前回のリンク（1ページ目はページ数も）が無ければ条件付きにしない
+    cached = self.validators.get(url, "links") is not None and (
+        page_num > 1 or self.validators.get(url, "page_count") is not None)
+    headers = self.validators.conditional_headers(url) if cached else None
+    result = await self.engine.fetch(url, headers)
+
+    if result["error"]:
+      logger.warning("❌ %s - ページ %d でエラーが発生 (%s, %d回試行): %s", category['name'], page_num,
+                     result['failure'], result['attempts'], result['error'])
+      self._failed(url, category, page_num, result["failure"], result["error"], result)
+      return {"html": "", "links": []}
+
+    self.validators.update(url, etag=result["etag"], last_modified=result["last_modified"])
+
+    # 変更が無ければ前回抽出したリンクを再利用する
+    html_hash = None if result["not_modified"] else content_hash(result["html"])
+    cached_links = self.validators.get(url, "links")
+    if cached_links is not None and (result["not_modified"] or
+                                     html_hash == self.validators.get(url, "html_hash")):
+      self.unchanged_pages += 1
+      self._resolved(url)
+      return {"html": result["html"], "links": cached_links,
+              "page_count": self.validators.get(url, "page_count")}
 
-  # --- 各カテゴリのページループ処理 ---
-  for page_num in range(1, category['max_pages'] + 1):
-    print(f"\n{'='*60}")
-    print(f"🔄 {category['name']} - ページ {page_num}/{category['max_pages']} を処理中")
+    try:
+      links = extract_listing_links(result["html"], category, self.parser)
+    except Exception as e:
+      logger.warning("❌ %s - ページ %d の解析でエラーが発生: %s", category['name'], page_num, e)
+      self._failed(url, category, page_num, "parse", f"解析エラー: {e}", result)
+      return {"html": "", "links": []}
+
+    self.validators.update(url, html_hash=html_hash, links=links)
+    self._resolved(url)
+    return {"html": result["html"], "links": links}
+
+  def _resolved(self, url: str):
+    if self.dead_letters is not None:
+      self.dead_letters.resolve(url)
+
+  async def crawl_category(self, category: Dict) -> List[List[Dict]]:
+    """1カテゴリの全一覧ページを取得し、ページ順のリンク一覧を返す"""
+    first = await self.fetch_listing(category, 1)
+
+    page_count = first.get("page_count")
+    if page_count is None:
+      page_count = discover_page_count(first["html"], category)
+      if first["html"]:
+        self.validators.update(listing_url(category, 1), page_count=page_count)
+    logger.info("🌱 %s: 全%dページ", category['name'], page_count)
+
+    rest = await asyncio.gather(*(
+        self.fetch_listing(category, page_num) for page_num in range(2, page_count + 1)))
+    return [first["links"]] + [page["links"] for page in rest]
+
+  async def crawl(self, categories: List[Dict]) -> List[Dict]:
+    """全カテゴリを並行取得し、カテゴリ順・ページ順で重複を除いて結合する"""
+    category_pages = await asyncio.gather(*(
+        self.crawl_category(category) for category in categories))
+    if self.dead_letters is not None:
+      # 今回取得し直さなかった一覧ページ（ページ数が減った等）の記録は残さない
+      types = {category["type"] for category in categories}
+      for entry in self.dead_letters.list("listing"):
+        if entry.get("category") in types and entry["url"] not in self.failed_urls:
+          self.dead_letters.resolve(entry["url"])
+    return self._merge(categories, category_pages)
+
+  async def replay(self, categories: List[Dict]) -> List[Dict]:
+    """失敗一覧（dead_letters）にある一覧ページだけを取得し直し、見つかったリンクを返す
+
+    1ページ目が失敗していたカテゴリはページ数が分からないので、カテゴリ全体を取得する。
+    """
+    entries = [entry for entry in self.dead_letters.list("listing")
+               if entry.get("category") in {category["type"] for category in categories}]
+    whole = {entry["category"] for entry in entries if entry["page"] == 1}
+    replay_categories = [category for category in categories
+                         if category["type"] in {entry["category"] for entry in entries}]
+
+    async def replay_category(category: Dict) -> List[List[Dict]]:
+      if category["type"] in whole:
+        return await self.crawl_category(category)
+      pages = sorted(entry["page"] for entry in entries if entry["category"] == category["type"])
+      results = await asyncio.gather(*(self.fetch_listing(category, page) for page in pages))
+      return [page["links"] for page in results]
+
+    category_pages = await asyncio.gather(*(
+        replay_category(category) for category in replay_categories))
+    return self._merge(replay_categories, category_pages)
+
+  def _merge(self, categories: List[Dict], category_pages: List[List[List[Dict]]]) -> List[Dict]:
+    all_plant_data = []
+    seen_urls = set()
+    for category, pages in zip(categories, category_pages):
+      for page_num, page_plant_data in enumerate(pages, start=1):
+        new_count = 0
+        for plant in page_plant_data:
+          if plant['url'] not in seen_urls:
+            all_plant_data.append(plant)
+            seen_urls.add(plant['url'])
+            new_count += 1
+        logger.debug("%s - ページ %d: %d件の新しい植物を追加 (累計: %d件)",
+                     category['name'], page_num, new_count, len(all_plant_data))
+    return all_plant_data
+
+
+async def discover_plant_urls(categories: List[Dict],
+                              validators: ValidatorStore,
+                              workers: int = 4,
+                              request_interval: float = 1.0,
+                              jitter: float = 0,
+                              ready_timeout: float = 10,
+                              browsers: int = 1,
+                              base_url: Optional[str] = None,
+                              use_browser: bool = True,
+                              parser: str = "auto",
+                              policy: Optional[FetchPolicy] = None,
+                              dead_letters: Optional[DeadLetterList] = None,
+                              replay: bool = False) -> List[Dict]:
+  """全カテゴリの一覧ページから植物URLを収集する
+
+  replay=True なら dead_letters にある一覧ページだけを取得し直す。
+  """
+  stats = ReadinessStats()
+  browser_fetch = (BrowserPool(LISTING_READY_SELECTOR, ready_timeout, stats, size=browsers)
+                   if use_browser else None)
+  try:
+    async with FetchEngine(per_host_limit=workers,
+                           scheduler=PolitenessScheduler(request_interval, jitter),
+                           stats=stats,
+                           base_url=base_url,
+                           browser_fetch=browser_fetch,
+                           needs_browser=needs_browser,
+                           policy=policy) as engine:
+      crawler = ListingCrawler(engine, validators, parser, dead_letters)
+      plant_data = await (crawler.replay(categories) if replay else crawler.crawl(categories))
+      print(f"\n変更のない一覧ページ: {crawler.unchanged_pages}件")
+      stats.print_summary()
+      return plant_data
+  finally:
+    if browser_fetch:
+      browser_fetch.close()
+
+
+def export_urls_csv(plant_data: List[Dict], csv_path: str):
+  """URL一覧を従来のCSV形式でも書き出す"""
+  with open(csv_path, "w", newline="", encoding="utf-8") as f:
+    writer = csv.DictWriter(f, fieldnames=["name", "url", "category"])
+    writer.writeheader()
+    writer.writerows(plant_data)
 
-    # --- LOVEGREEN 一覧ページ ---
-    if page_num == 1:
-      if category['type'] == 'vegetables':
-        url = f"{category['url_base']}page/1"
-      elif category['type'] == 'fruit-tree':
-        url = f"{category['url_base']}page/1"
-      else:  # flower
-        url = category['url_base']
-    else:
-      url = f"{category['url_base']}page/{page_num}/"
 
-    print(f"URL: {url}")
+def main():
+  parser = argparse.ArgumentParser(description="LOVEGREENの一覧ページから植物URLを収集")
+  parser.add_argument("--db", default=DEFAULT_DB_PATH, help="URL一覧を保存するデータベース")
+  parser.add_argument("--output", default=None, help="CSVにも書き出す場合の出力先（例: all_plants_urls.csv）")
+  parser.add_argument("--workers", type=int, default=4, help="同時に取得する一覧ページ数")
+  parser.add_argument("--interval", type=float, default=1.0,
+                      help="同一ホストへのリクエスト間隔（秒）")
+  parser.add_argument("--jitter", type=float, default=0,
+                      help="リクエスト間隔に加えるランダムな揺らぎの上限（秒）")
+  parser.add_argument("--ready-timeout", type=float, default=10,
+                      help="ブラウザで一覧カードの描画を待つ最大秒数")
+  parser.add_argument("--browsers", type=int, default=1,
+                      help="JavaScriptが必要なページに使うブラウザのセッション数")
+  parser.add_argument("--base-url", default=None,
+                      help="取得先を差し替えるベースURL（例: http://localhost:8000）")
+  parser.add_argument("--no-browser", action="store_true",
+                      help="JavaScriptが必要なページでもブラウザを使わない")
+  parser.add_argument("--validators", default="listing_validators.json",
+                      help="一覧ページのETag/Last-Modified・抽出結果の保存先")
+  parser.add_argument("--parser", default="auto", choices=["auto"] + list(BACKENDS),
+                      help="HTMLの抽出方式（auto は基準の bs4。速い方式は壊れたHTMLで結果が異なることがある）")
+  parser.add_argument("--rate", type=float, default=None,
+                      help="同一ホストへの1秒あたりのリクエスト数の上限（トークンバケット）")
+  parser.add_argument("--burst", type=int, default=1, help="--rate の上限を超えて連続で送れる数")
+  parser.add_argument("--retries", type=int, default=3,
+                      help="タイムアウト・429・5xxなどの再試行回数")
+  parser.add_argument("--dead-letters", default=DEFAULT_DEAD_LETTERS_PATH,
+                      help="取得・解析に失敗したページの一覧")
+  parser.add_argument("--replay-dead-letters", action="store_true",
+                      help="失敗したページの一覧にある一覧ページだけを取得し直す")
+  add_logging_arguments(parser)
+  args = parser.parse_args()
+  configure_logging(args.log_level)
+
+  validators = ValidatorStore(args.validators)
+  dead_letters = DeadLetterList(args.dead_letters)
+  if args.replay_dead_letters and not dead_letters.list("listing"):
+    print(f"✅ {args.dead_letters} に取得し直す一覧ページはありません")
+    return
+  try:
+    plant_data = asyncio.run(discover_plant_urls(
+        plant_categories,
+        validators,
+        workers=args.workers,
+        request_interval=args.interval,
+        jitter=args.jitter,
+        ready_timeout=args.ready_timeout,
+        browsers=args.browsers,
+        base_url=args.base_url,
+        use_browser=not args.no_browser,
+        parser=args.parser,
+        policy=FetchPolicy(rate=args.rate, burst=args.burst, retries=args.retries),
+        dead_letters=dead_letters,
+        replay=args.replay_dead_letters))
+  finally:
+    validators.save()
+    dead_letters.save()
+
+  # --- データベースに保存（一覧から消えたURLは無効にする） ---
+  # 取得できなかった一覧ページがある場合や再取得の場合は一覧の一部なので、無効にせず追加だけする
+  failed_listings = dead_letters.list("listing")
+  if failed_listings:
+    print(f"\n⚠️ 一覧ページ {len(failed_listings)}件を取得できませんでした "
+          f"({dead_letters.kind_counts('listing')})。{args.dead_letters} に記録しました")
+    print("   python get_urls.py --replay-dead-letters で取得し直せます")
+  counts = None
+  if plant_data:
+    with PlantStore(args.db) as store:
+      counts = store.upsert_urls(plant_data,
+                                 replace=not failed_listings and not args.replay_dead_letters)
 
-    try:
-      driver.get(url)
-
-      # JavaScriptの読み込みを待つ
-      time.sleep(8)  # 待機時間を調整
-
-      # ページ内容を取得
-      html = driver.page_source
-      soup = BeautifulSoup(html, "html.parser")
-
-      # デバッグ情報を表示
-      print("=== デバッグ情報 ===")
-      print(f"ページタイトル: {soup.title.string if soup.title else 'なし'}")
-      print(f"HTML全体のサイズ: {len(html)} 文字")
-
-      # 元のセレクターを確認
-      cards = soup.find_all("a", class_="library-list__item")
-      print(f"library-list__item クラス: {len(cards)} 個")
-
-      if len(cards) == 0:
-        print("\n=== 代替セレクターを試しています ===")
-
-        # 他の可能性のあるセレクターを試す
-        alternative_selectors = [
-            ("a", "card"),
-            ("a", "item"),
-            ("div", "card"),
-            ("article", None),
-            ("div", "item"),
-            ("a", "library-item"),
-            ("div", "library-list"),
-            ("a", "plant-card"),
-        ]
-
-        for tag, class_name in alternative_selectors:
-          if class_name:
-            elements = soup.find_all(tag, class_=class_name)
-            print(f"{tag}.{class_name}: {len(elements)} 個")
-          else:
-            elements = soup.find_all(tag)
-            print(f"{tag}: {len(elements)} 個")
-
-          if elements and len(elements) > 0:
-            # 最初の要素を詳しく確認
-            first_elem = elements[0]
-            print(f"  最初の要素: {first_elem.name}")
-            print(f"  クラス: {first_elem.get('class', [])}")
-            print(f"  href: {first_elem.get('href', 'なし')}")
-
-            # テキスト内容を確認
-            text = first_elem.get_text(strip=True)
-            if text:
-              print(f"  テキスト: {text[:50]}...")
-
-            # このセレクターでリンクを抽出してみる
-            if first_elem.get('href'):
-              cards = elements
-              break
-
-      # 全てのaタグを確認
-      print(f"\n=== 全てのaタグを確認 ===")
-      all_a_tags = soup.find_all("a")
-      print(f"ページ内の全aタグ数: {len(all_a_tags)}")
-
-      # hrefを持つaタグを確認
-      a_with_href = [a for a in all_a_tags if a.get('href')]
-      print(f"hrefを持つaタグ数: {len(a_with_href)}")
-
-      # カテゴリに関連するリンクを探す
-      category_links = []
-      for a in a_with_href:
-        href = a.get('href')
-        if href and category['type'] in href:
-          category_links.append(a)
-
-      print(f"{category['type']}を含むリンク数: {len(category_links)}")
-
-      # 最初の5個のカテゴリリンクを表示
-      print(f"\n=== {category['type']}リンクの最初の5個 ===")
-      for i, link in enumerate(category_links[:5]):
-        href = link.get('href')
-        text = link.get_text(strip=True)
-        print(f"{i+1}. {text[:30]}... - {href}")
-
-      # このページの植物データを抽出
-      page_plant_data = []
-
-      # カテゴリリンクから植物データを抽出
-      for link in category_links:
-        href = link.get("href")
-        text = link.get_text(strip=True)
-
-        # 個別の植物ページのリンクかどうかを判定
-        if href and text and len(text) > 0:
-          # 完全なURLにする
-          if href.startswith('/'):
-            full_url = "https://lovegreen.net" + href
-          elif not href.startswith('http'):
-            full_url = f"https://lovegreen.net/library/{category['type']}/" + href
-          else:
-            full_url = href
-
-          # 除外するURLパターンを修正（より具体的に）
-          exclude_patterns = [
-              f'/type/{category["type"]}/',      # 一覧ページ自体（より具体的に）
-              f'/type/{category["type"]}?',      # 一覧ページのパラメータ付き
-              f'/type/{category["type"]}#',      # 一覧ページのアンカー付き
-              '/page/',                          # ページネーション
-              '/category/',                      # カテゴリページ
-              'syllabary=',                      # 五十音順検索ページ
-              f'?s&type={category["type"]}',     # 検索ページ
-              '/search/',                        # 検索ページ
-              '/tag/',                           # タグページ
-              '/author/',                        # 作者ページ
-              '/registration/',                  # 登録ページ
-          ]
-
-          # 除外パターンをチェック
-          should_exclude = False
-          for pattern in exclude_patterns:
-            if pattern in full_url:
-              should_exclude = True
-              break
-
-          # 五十音（1文字）のテキストも除外
-          if len(text) == 1 and text in 'あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん':
-            should_exclude = True
-
-          # 個別植物ページの判定を追加
-          # 個別植物ページのURLパターン: /library/カテゴリ/p数字/ または /library/カテゴリ/植物名/
-          is_individual_page = False
-
-          # pXXXXX形式のページID
-          if '/p' in href and href.split('/p')[-1].rstrip('/').isdigit():
-            is_individual_page = True
-
-          # 植物名形式のURL（/library/カテゴリ/植物名/）
-          url_parts = href.strip('/').split('/')
-          if (len(url_parts) >= 3 and
-              url_parts[0] == 'library' and
-              url_parts[1] == category['type'] and
-              len(url_parts[2]) > 1 and  # 植物名は1文字以上
-                  not url_parts[2].startswith('p')):  # pXXXX形式でない
-            is_individual_page = True
-
-          # 個別植物ページで除外パターンに該当しないもののみを追加
-          if is_individual_page and not should_exclude:
-            page_plant_data.append(
-                {"name": text, "url": full_url, "category": category['name']})
-            print(f"✓ {text} - {full_url}")
-
-      # 元のセレクターも試す
-      if len(cards) > 0:
-        print(f"\n=== 元のセレクターでの抽出 ===")
-        for card in cards:
-          link = card.get("href")
-          name_tag = card.find("span", class_="library-list__item__title")
-          name = name_tag.get_text(strip=True) if name_tag else None
-
-          if name and link:
-            full_url = link if link.startswith(
-                "http") else "https://lovegreen.net" + link
-
-            # 同じ除外ロジックを適用
-            exclude_patterns = [
-                f'/type/{category["type"]}/',
-                f'/type/{category["type"]}?',
-                f'/type/{category["type"]}#',
-                '/page/',
-                '/category/',
-                'syllabary=',
-                f'?s&type={category["type"]}',
-                '/search/',
-                '/tag/',
-                '/author/',
-                '/registration/',
-            ]
-
-            should_exclude = False
-            for pattern in exclude_patterns:
-              if pattern in full_url:
-                should_exclude = True
-                break
-
-            # 五十音（1文字）のテキストも除外
-            if len(name) == 1 and name in 'あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん':
-              should_exclude = True
-
-            # 個別植物ページの判定
-            is_individual_page = False
-
-            if '/p' in link and link.split('/p')[-1].rstrip('/').isdigit():
-              is_individual_page = True
-
-            url_parts = link.strip('/').split('/')
-            if (len(url_parts) >= 3 and
-                url_parts[0] == 'library' and
-                url_parts[1] == category['type'] and
-                len(url_parts[2]) > 1 and
-                    not url_parts[2].startswith('p')):
-              is_individual_page = True
-
-            # 重複チェック & 除外チェック
-            if (is_individual_page and not should_exclude and
-                    not any(plant['url'] == full_url for plant in page_plant_data)):
-              page_plant_data.append(
-                  {"name": name, "url": full_url, "category": category['name']})
-              print(f"✓ {name} - {full_url}")
-            
-
-      # このページのデータを全体リストに追加（重複除去）
-      new_count = 0
-      existing_urls = {plant['url'] for plant in all_plant_data}
-
-      for plant in page_plant_data:
-        if plant['url'] not in existing_urls:
-          all_plant_data.append(plant)
-          new_count += 1
+  print(f"\n{'='*80}")
+  print("全カテゴリの処理が完了しました")
+  print(f"{'='*80}")
 
+  # カテゴリ別の統計情報を表示
+  print("\nカテゴリ別統計:")
+  category_stats = {}
+  for plant in plant_data:
+    category = plant['category']
+    category_stats[category] = category_stats.get(category, 0) + 1
+
+  for category, count in category_stats.items():
+    print(f"  {category}: {count}件")
+
+  # リンク分類の規則ごとの一致件数（一覧ページを解析した分のみ）
+  hit_rows = rule_hit_table(plant_categories)
+  if hit_rows:
+    print("\nリンク分類の規則別件数:")
+    for category in plant_categories:
+      hits = [f"{row['rule']} {row['hits']}" for row in hit_rows if row["category"] == category["type"]]
+      if hits:
+        print(f"  {category['name']}: {', '.join(hits)}")
+
+  # 前回からの増減
+  if counts:
+    print(f"\n前回との差分: 新規 {counts['new']}件, 削除 {counts['removed']}件")
+
+  if plant_data:
+    print(f"\n✅ 完了：{len(plant_data)} 件の植物データを {args.db} に保存しました")
+    if args.output:
+      export_urls_csv(plant_data, args.output)
+      print(f"✅ CSVにも書き出しました: {args.output}")
+
+    # 各カテゴリの最初の3件を表示
+    print("\n各カテゴリの最初の3件:")
+    for category_name in [category['name'] for category in plant_categories]:
+      category_plants = [p for p in plant_data if p['category'] == category_name]
+      if category_plants:
+        print(f"\n  【{category_name}】")
+        for i, plant in enumerate(category_plants[:3]):
+          print(f"    {i+1}. {plant['name']} - {plant['url']}")
+        if len(category_plants) > 3:
+          print(f"    ... 他 {len(category_plants) - 3} 件")
+
+    # 最後の5件を表示
+    print(f"\n 最後の5件:")
+    for i, plant in enumerate(plant_data[-5:]):
       print(
-          f"\n{category['name']} - ページ {page_num}: {new_count}件の新しい植物を追加 (累計: {len(all_plant_data)}件)")
+          f"  {len(plant_data)-4+i}. [{plant['category']}] {plant['name']} - {plant['url']}")
+
+  else:
+    print("\n❌ 植物データが見つかりませんでした")
+
+  print(f"\n処理完了！合計 {len(plant_data)} 件の植物データを取得しました")
+  print_stage_summary()
+  if args.metrics:
+    write_summary(args.metrics, {"script": "get_urls", "plants": len(plant_data)})
 
-    except Exception as e:
-      print(f"❌ {category['name']} - ページ {page_num} でエラーが発生: {e}")
-      continue
-
-# ドライバーを終了
-driver.quit()
-
-print(f"\n{'='*80}")
-print("全カテゴリの処理が完了しました")
-print(f"{'='*80}")
-
-# 重複を除去（最終チェック）
-unique_plants = []
-seen_urls = set()
-for plant in all_plant_data:
-  if plant['url'] not in seen_urls:
-    unique_plants.append(plant)
-    seen_urls.add(plant['url'])
-
-plant_data = unique_plants
-
-# カテゴリ別の統計情報を表示
-print("\nカテゴリ別統計:")
-category_stats = {}
-for plant in plant_data:
-  category = plant['category']
-  category_stats[category] = category_stats.get(category, 0) + 1
-
-for category, count in category_stats.items():
-  print(f"  {category}: {count}件")
-
-# --- 統合CSVに保存 ---
-if plant_data:
-  with open("all_plants_urls.csv", "w", newline="", encoding="utf-8") as f:
-    writer = csv.DictWriter(f, fieldnames=["name", "url", "category"])
-    writer.writeheader()
-    writer.writerows(plant_data)
 
-  print(f"\n✅ 完了：{len(plant_data)} 件の植物データを all_plants_urls.csv に保存しました")
-
-  # 各カテゴリの最初の3件を表示
-  print("\n各カテゴリの最初の3件:")
-  for category_name in ["野菜", "果樹", "花"]:
-    category_plants = [p for p in plant_data if p['category'] == category_name]
-    if category_plants:
-      print(f"\n  【{category_name}】")
-      for i, plant in enumerate(category_plants[:3]):
-        print(f"    {i+1}. {plant['name']} - {plant['url']}")
-      if len(category_plants) > 3:
-        print(f"    ... 他 {len(category_plants) - 3} 件")
-
-  # 最後の5件を表示
-  print(f"\n 最後の5件:")
-  for i, plant in enumerate(plant_data[-5:]):
-    print(
-        f"  {len(plant_data)-4+i}. [{plant['category']}] {plant['name']} - {plant['url']}")
-
-else:
-  print("\n❌ 植物データが見つかりませんでした")
-
-print(f"\n処理完了！合計 {len(plant_data)} 件の植物データを取得しました")
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,267 @@
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 計測対象の段
+STAGES = ["fetch", "parse", "extract", "score", "write"]
+
+# 所要時間のヒストグラムの区切り（秒）
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Prometheus形式で出力する際の名前の接頭辞
+METRIC_PREFIX = "plant_"
+
+# PLANT_METRICS=0 で計測そのものを無効にする
+METRICS_ENABLED = os.environ.get("PLANT_METRICS", "1") != "0"
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> _LabelKey:
+  return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Histogram:
+  """区切りごとの件数・合計・最大値を持つヒストグラム"""
+
+  def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+    self.buckets = tuple(buckets)
+    self.counts = [0] * (len(self.buckets) + 1)  # 最後は +Inf
+    self.count = 0
+    self.sum = 0.0
+    self.max = 0.0
+
+  def observe(self, value: float):
+    self.counts[bisect.bisect_left(self.buckets, value)] += 1
+    self.count += 1
+    self.sum += value
+    if value > self.max:
+      self.max = value
+
+  def merge(self, other: "Histogram"):
+    for i, count in enumerate(other.counts):
+      self.counts[i] += count
+    self.count += other.count
+    self.sum += other.sum
+    self.max = max(self.max, other.max)
+
+  def quantile(self, q: float) -> float:
+    """区切りから推定した分位点（その値を含む区切りの上限。+Inf の区切りなら最大値）"""
+    if not self.count:
+      return 0.0
+    rank = q * self.count
+    seen = 0
+    for i, count in enumerate(self.counts):
+      seen += count
+      if seen >= rank and count:
+        return self.buckets[i] if i < len(self.buckets) else self.max
+    return self.max
+
+
+class MetricsRegistry:
+  """カウンターとヒストグラムをラベル付きで保持する（スレッドセーフ）
+
+  プロセスプールの子プロセスでは drain() で取り出した内容を親に返し、
+  親で merge() すると全体の集計になる。
+  """
+
+  def __init__(self, enabled: bool = True):
+    self.enabled = enabled
+    self.counters: Dict[str, Dict[_LabelKey, float]] = {}
+    self.histograms: Dict[str, Dict[_LabelKey, Histogram]] = {}
+    self.started = time.time()
+    self._lock = threading.Lock()
+
+  def inc(self, name: str, value: float = 1, **labels):
+    if not self.enabled:
+      return
+    key = _label_key(labels)
+    with self._lock:
+      series = self.counters.setdefault(name, {})
+      series[key] = series.get(key, 0) + value
+
+  def observe(self, name: str, value: float, **labels):
+    if not self.enabled:
+      return
+    self._observe(name, _label_key(labels), value)
+
+  def _observe(self, name: str, key: _LabelKey, value: float):
+    with self._lock:
+      series = self.histograms.setdefault(name, {})
+      if key not in series:
+        series[key] = Histogram()
+      series[key].observe(value)
+
+  def timer(self, name: str, **labels) -> "_Timer":
+    """with ブロックの所要時間をヒストグラムに記録する"""
+    return _Timer(self, name, _label_key(labels))
+
+  def drain(self) -> Dict:
+    """現在の内容を取り出して空にする（子プロセスから親へ渡す用）"""
+    with self._lock:
+      data = {"counters": self.counters, "histograms": self.histograms}
+      self.counters, self.histograms = {}, {}
+    return data
+
+  def merge(self, data: Dict):
+    with self._lock:
+      for name, series in data["counters"].items():
+        target = self.counters.setdefault(name, {})
+        for key, value in series.items():
+          target[key] = target.get(key, 0) + value
+      for name, series in data["histograms"].items():
+        target = self.histograms.setdefault(name, {})
+        for key, histogram in series.items():
+          if key not in target:
+            target[key] = Histogram(histogram.buckets)
+          target[key].merge(histogram)
+
+  def reset(self):
+    self.drain()
+    self.started = time.time()
+
+  def to_prometheus(self) -> str:
+    """Prometheusのテキスト形式で出力する"""
+    def format_labels(key: _LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+      pairs = list(key) + ([extra] if extra else [])
+      if not pairs:
+        return ""
+      escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                 for _, value in pairs)
+      return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    lines = []
+    with self._lock:
+      for name in sorted(self.counters):
+        metric = METRIC_PREFIX + name
+        lines.append(f"# TYPE {metric} counter")
+        for key, value in sorted(self.counters[name].items()):
+          lines.append(f"{metric}{format_labels(key)} {value:g}")
+      for name in sorted(self.histograms):
+        metric = METRIC_PREFIX + name
+        lines.append(f"# TYPE {metric} histogram")
+        for key, histogram in sorted(self.histograms[name].items()):
+          cumulative = 0
+          for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f"{metric}_bucket{format_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+          lines.append(f"{metric}_bucket{format_labels(key, ('le', '+Inf'))} {histogram.count}")
+          lines.append(f"{metric}_sum{format_labels(key)} {histogram.sum:g}")
+          lines.append(f"{metric}_count{format_labels(key)} {histogram.count}")
+    return "\n".join(lines) + "\n"
+
+  def summary(self) -> Dict:
+    """JSONで保存できる形の集計（ヒストグラムは件数・合計・平均・p50・p95・最大）"""
+    def label_text(key: _LabelKey) -> str:
+      return ",".join(f"{name}={value}" for name, value in key) or "total"
+
+    with self._lock:
+      counters = {name: {label_text(key): value for key, value in sorted(series.items())}
+                  for name, series in sorted(self.counters.items())}
+      histograms = {
+          name: {label_text(key): {
+              "count": h.count,
+              "sum": h.sum,
+              "mean": h.sum / h.count if h.count else 0.0,
+              "p50": h.quantile(0.50),
+              "p95": h.quantile(0.95),
+              "max": h.max,
+          } for key, h in sorted(series.items())}
+          for name, series in sorted(self.histograms.items())}
+    return {"started": self.started, "elapsed": time.time() - self.started,
+            "counters": counters, "histograms": histograms}
+
+
+class _Timer:
+  """所要時間を計るコンテキストマネージャー（ホットループで使うため軽量に実装）"""
+
+  __slots__ = ("registry", "name", "key", "start")
+
+  def __init__(self, registry: MetricsRegistry, name: str, key: _LabelKey):
+    self.registry = registry
+    self.name = name
+    self.key = key
+
+  def __enter__(self):
+    self.start = time.perf_counter()
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    if self.registry.enabled:
+      self.registry._observe(self.name, self.key, time.perf_counter() - self.start)
+    return False
+
+
+# 全モジュールで共有する既定のレジストリ
+registry = MetricsRegistry(enabled=METRICS_ENABLED)
+
+_stage_keys = {stage: _label_key({"stage": stage}) for stage in STAGES}
+
+
+def stage_timer(stage: str) -> _Timer:
+  """段（fetch/parse/extract/score/write）の1件分の所要時間を記録する（件数はヒストグラムの count）"""
+  return _Timer(registry, "stage_seconds", _stage_keys.get(stage) or _label_key({"stage": stage}))
+
+
+def stage_table() -> List[Dict]:
+  """段ごとの件数・合計時間・平均・p50・p95（秒）"""
+  series = registry.summary()["histograms"].get("stage_seconds", {})
+  rows = []
+  for stage in STAGES:
+    stats = series.get(f"stage={stage}")
+    if stats:
+      rows.append(dict(stats, stage=stage))
+  return rows
+
+
+def print_stage_summary():
+  for row in stage_table():
+    print(f"⏱️ {row['stage']}: {row['count']}件, 合計 {row['sum']:.2f}秒, "
+          f"平均 {row['mean'] * 1000:.2f}ms, p50 ≦{row['p50'] * 1000:g}ms, "
+          f"p95 ≦{row['p95'] * 1000:g}ms")
+
+
+def write_summary(path: str, extra: Optional[Dict] = None):
+  """実行全体の計測結果をJSONで保存する"""
+  summary = registry.summary()
+  summary["stages"] = stage_table()
+  if extra:
+    summary.update(extra)
+  with open(path, "w", encoding="utf-8") as f:
+    json.dump(summary, f, ensure_ascii=False, indent=2)
+  print(f"📊 計測結果を保存しました: {path}")
+
+
+def get_logger(name: str) -> logging.Logger:
+  return logging.getLogger(f"plant.{name}")
+
+
+def configure_logging(level: Optional[str] = None):
+  """ログの出力レベルを設定する（既定は環境変数 PLANT_LOG_LEVEL、無ければ INFO）
+
+  無効なレベルのログは書式化されないため、ホットループ内の debug 出力は
+  レベルを下げない限りほとんどコストがかからない。
+  """
+  level = (level or os.environ.get("PLANT_LOG_LEVEL") or "INFO").upper()
+  logger = logging.getLogger("plant")
+  logger.setLevel(level)
+  if not logger.handlers:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+  logger.propagate = False
+
+
+def add_logging_arguments(parser):
+  """--log-level・--metrics を argparse に追加する"""
+  parser.add_argument("--log-level", default=None,
+                      choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                      help="ログの出力レベル（DEBUGで1件ごとの詳細を表示）")
+  parser.add_argument("--metrics", default=None,
+                      help="段ごとの計測結果（JSON）の保存先")
@@ -0,0 +1,78 @@
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+
+class KeywordMatcher:
+  """Aho-Corasick法による複数キーワードの一括マッチャー
+
+  キーワード辞書を一度だけオートマトンにコンパイルし、
+  テキストを1回走査するだけで全キーワードの出現位置を返す。
+  """
+
+  def __init__(self, weighted_keywords: Iterable[Tuple[str, float]]):
+    self.keywords: List[str] = []
+    self.weights: List[float] = []
+    # 状態ごとの遷移表・失敗リンク・出力（キーワード番号のリスト）
+    self._goto: List[Dict[str, int]] = [{}]
+    self._fail: List[int] = [0]
+    self._out: List[List[int]] = [[]]
+
+    for keyword, weight in weighted_keywords:
+      if not keyword:
+        continue
+      self._add(keyword, len(self.keywords))
+      self.keywords.append(keyword)
+      self.weights.append(weight)
+
+    self._build_failure_links()
+
+  def _add(self, keyword: str, index: int):
+    """トライ木にキーワードを追加する"""
+    state = 0
+    for ch in keyword:
+      next_state = self._goto[state].get(ch)
+      if next_state is None:
+        next_state = len(self._goto)
+        self._goto[state][ch] = next_state
+        self._goto.append({})
+        self._fail.append(0)
+        self._out.append([])
+      state = next_state
+    self._out[state].append(index)
+
+  def _build_failure_links(self):
+    """幅優先探索で失敗リンクを張り、出力を伝播させる"""
+    queue = deque(self._goto[0].values())
+    while queue:
+      state = queue.popleft()
+      for ch, next_state in self._goto[state].items():
+        queue.append(next_state)
+        fallback = self._fail[state]
+        while fallback and ch not in self._goto[fallback]:
+          fallback = self._fail[fallback]
+        target = self._goto[fallback].get(ch, 0)
+        self._fail[next_state] = target if target != next_state else 0
+        self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+  def iter_matches(self, text: str):
+    """(開始位置, キーワード番号) を出現順に返す"""
+    goto = self._goto
+    fail = self._fail
+    out = self._out
+    keywords = self.keywords
+    state = 0
+    for pos, ch in enumerate(text):
+      while state and ch not in goto[state]:
+        state = fail[state]
+      state = goto[state].get(ch, 0)
+      for index in out[state]:
+        yield pos - len(keywords[index]) + 1, index
+
+  def find_all(self, text: str) -> List[Tuple[int, str, float]]:
+    """全ての出現を (開始位置, キーワード, 重み) のリストで返す"""
+    return [(start, self.keywords[index], self.weights[index])
+            for start, index in self.iter_matches(text)]
+
+  def matched_indices(self, text: str) -> List[int]:
+    """出現したキーワード番号を登録順（重複なし）で返す"""
+    return sorted({index for _, index in self.iter_matches(text)})
@@ -0,0 +1,245 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from Growability_Assessment import (clamp_score, collect_texts, get_keyword_matcher,
+                                    make_assessment, print_assessment_summary,
+                                    save_assessment_results)
+from keyword_matcher import KeywordMatcher
+from lexicon import get_lexicon
+from plant_records import iter_plant_records
+from plant_store import DEFAULT_DB_PATH, PlantStore
+from text_normalization import normalize_text, prepare_text
+
+# 行列の保存形式のバージョン（形式・本文の正規化を変えたら上げる）
+MATRIX_FORMAT = 2
+
+
+def normalize_weights(weights: Dict[str, float]) -> Dict[str, float]:
+  """キーワード → 重み の辞書のキーを辞書ファイルと同じく normalize_text() で正規化する
+
+  正規化すると同じになるキーワード（ﾌﾟﾗﾝﾀｰ と プランター など）は重複として ValueError にする。
+  """
+  normalized: Dict[str, float] = {}
+  for original, weight in weights.items():
+    keyword = normalize_text(original)
+    if not keyword:
+      raise ValueError("空のキーワードがあります")
+    if keyword in normalized:
+      raise ValueError(f"キーワードが重複しています: {original}")
+    normalized[keyword] = weight
+  return normalized
+
+
+def matrix_path_for(corpus_path: str) -> str:
+  """植物データの隣に置く行列ファイルのパス（all_plants_data.jsonl → all_plants_data.keywords.npz）"""
+  root, _ = os.path.splitext(corpus_path)
+  return f"{root}.keywords.npz"
+
+
+def corpus_key(corpus_path: str) -> str:
+  """植物データの識別子（変わったら行列を作り直す）
+
+  データベースは本文の更新回数、ファイルは更新日時・サイズから作る。
+  """
+  if corpus_path.endswith(".db"):
+    with PlantStore(corpus_path) as store:
+      return f"db-{store.revision()}"
+  stat = os.stat(corpus_path)
+  return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def iter_corpus_records(corpus_path: str) -> Iterable[Tuple[str, List[str]]]:
+  """植物データ（.db / .jsonl / .json）を (植物名, テキスト一覧) の順に返す"""
+  if corpus_path.endswith(".db"):
+    with PlantStore(corpus_path) as store:
+      yield from store.iter_plant_records()
+  else:
+    yield from iter_plant_records(corpus_path)
+
+
+def keywords_signature(keywords: List[str]) -> str:
+  """列（キーワード）の並びの識別子。重みだけの変更では変わらない"""
+  return hashlib.sha1("\n".join(keywords).encode("utf-8")).hexdigest()[:16]
+
+
+class KeywordMatrix:
+  """植物 × キーワードの出現回数を持つ疎行列
+
+  本文の走査は build() の1回だけで、以降はどんな重みでも
+  出現の有無（0/1）の行列と重みベクトルの積でスコアを求める。
+  score_grow_ease と同じく、同じキーワードが何回出ても1回分として数える。
+  """
+
+  def __init__(self, names: List[str], keywords: List[str], counts: sparse.csr_matrix,
+               text_counts: np.ndarray, source: Optional[str] = None):
+    self.names = names
+    self.keywords = keywords
+    self.counts = counts
+    self.text_counts = text_counts
+    self.source = source
+    self.signature = keywords_signature(keywords)
+    self._columns = {keyword: i for i, keyword in enumerate(keywords)}
+    # 出現の有無だけの行列（列番号は昇順に並べ、逐次計算と同じ順で合計する）
+    self.presence = counts.copy()
+    self.presence.data[:] = 1.0
+    self.presence.sort_indices()
+
+  @classmethod
+  def build(cls, records: Iterable[Tuple[str, object]],
+            matcher: Optional[KeywordMatcher] = None,
+            source: Optional[str] = None) -> "KeywordMatrix":
+    """(植物名, データ) の列を1回だけ走査して行列を作る"""
+    matcher = matcher or get_keyword_matcher()
+    names, text_counts = [], []
+    indptr, indices, data = [0], [], []
+    for name, plant_info in records:
+      texts = collect_texts(plant_info)
+      counts: Dict[int, int] = {}
+      for _, index in matcher.iter_matches(prepare_text(texts)):
+        counts[index] = counts.get(index, 0) + 1
+      for index in sorted(counts):
+        indices.append(index)
+        data.append(counts[index])
+      indptr.append(len(indices))
+      names.append(name)
+      text_counts.append(len(texts))
+
+    matrix = sparse.csr_matrix(
+        (np.array(data, dtype=np.float64), np.array(indices, dtype=np.int32),
+         np.array(indptr, dtype=np.int64)),
+        shape=(len(names), len(matcher.keywords)))
+    return cls(names, list(matcher.keywords), matrix, np.array(text_counts, dtype=np.int32), source)
+
+  def save(self, path: str):
+    """行列を .npz で保存する（一時ファイルに書いてから置き換える）"""
+    tmp_path = path + ".tmp.npz"
+    np.savez_compressed(
+        tmp_path,
+        format=np.array(MATRIX_FORMAT),
+        data=self.counts.data, indices=self.counts.indices, indptr=self.counts.indptr,
+        shape=np.array(self.counts.shape),
+        names=np.array(self.names, dtype=str),
+        keywords=np.array(self.keywords, dtype=str),
+        text_counts=self.text_counts,
+        source=np.array(self.source or ""))
+    os.replace(tmp_path, path)
+
+  @classmethod
+  def load(cls, path: str) -> "KeywordMatrix":
+    with np.load(path, allow_pickle=False) as f:
+      if int(f["format"]) != MATRIX_FORMAT:
+        raise ValueError(f"行列ファイルの形式が異なります: {path}")
+      counts = sparse.csr_matrix((f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"]))
+      return cls([str(name) for name in f["names"]], [str(kw) for kw in f["keywords"]],
+                 counts, f["text_counts"], str(f["source"]) or None)
+
+  def weight_vector(self, weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """キーワード → 重み の辞書を列の順のベクトルにする（省略時は現在の辞書の重み）
+
+    行列に無いキーワードは本文を走査し直さないと数えられないため ValueError にする。
+    辞書に無い列の重みは0（そのキーワードを使わない）。
+    キーは列と同じく normalize_text() で正規化してから引く。
+    """
+    if weights is None:
+      matcher = get_keyword_matcher()
+      weights = dict(zip(matcher.keywords, matcher.weights))
+    else:
+      weights = normalize_weights(weights)
+    missing = [keyword for keyword in weights if keyword not in self._columns]
+    if missing:
+      raise ValueError(f"行列に無いキーワードがあります（再構築が必要）: {', '.join(missing[:5])}")
+    vector = np.zeros(len(self.keywords))
+    for keyword, weight in weights.items():
+      vector[self._columns[keyword]] = weight
+    return vector
+
+  def raw_scores(self, weights=None) -> np.ndarray:
+    """0〜10に収める前の重み付き合計（weights は辞書・ベクトル・列ごとの重みを並べた行列）"""
+    if weights is None or isinstance(weights, dict):
+      weights = self.weight_vector(weights)
+    return self.presence @ weights
+
+  def scores(self, weights=None) -> np.ndarray:
+    """score_grow_ease と同じ0〜10点のスコア"""
+    return np.clip(self.raw_scores(weights), 0, 10)
+
+  def assess(self, weights=None) -> List[Dict]:
+    """assess_all_plants と同じ形式の評価結果（スコア順）
+
+    辞書バージョンは、重みを省略した場合は現在の辞書のもの、
+    指定した場合はその重みのハッシュ（custom-...）になる。
+    """
+    if weights is None:
+      version = get_lexicon().version
+    else:
+      if isinstance(weights, dict):
+        weights = self.weight_vector(weights)
+      digest = hashlib.sha1(np.asarray(weights, dtype=np.float64).tobytes()).hexdigest()
+      version = f"custom-{digest[:8]}"
+    raw = self.raw_scores(weights)
+    results = [make_assessment(name, clamp_score(float(score)), int(text_count), version)
+               for name, score, text_count in zip(self.names, raw, self.text_counts)]
+    results.sort(key=lambda x: x["スコア"], reverse=True)
+    return results
+
+
+def get_keyword_matrix(corpus_path: str, rebuild: bool = False) -> KeywordMatrix:
+  """植物データに対応する行列を返す
+
+  保存済みの行列があり、植物データとキーワードの並びが変わっていなければそれを読み込み、
+  そうでなければ作り直して植物データの隣に保存する。
+  """
+  path = matrix_path_for(corpus_path)
+  source = corpus_key(corpus_path)
+  signature = keywords_signature(get_keyword_matcher().keywords)
+  if not rebuild and os.path.exists(path):
+    try:
+      matrix = KeywordMatrix.load(path)
+      if matrix.source == source and matrix.signature == signature:
+        return matrix
+    except (OSError, ValueError, KeyError) as e:
+      print(f"⚠️ 行列ファイルを読み込めないため作り直します: {e}")
+
+  matrix = KeywordMatrix.build(iter_corpus_records(corpus_path), source=source)
+  matrix.save(path)
+  print(f"✅ 植物 × キーワード行列を保存しました: {path} "
+        f"({matrix.counts.shape[0]}件 × {matrix.counts.shape[1]}語, 非ゼロ {matrix.counts.nnz})")
+  return matrix
+
+
+def main():
+  parser = argparse.ArgumentParser(description="植物 × キーワード行列による一括評価")
+  parser.add_argument("--input", default=DEFAULT_DB_PATH, help="植物データ（.db / .jsonl / .json）")
+  parser.add_argument("--rebuild", action="store_true", help="保存済みの行列を使わずに作り直す")
+  parser.add_argument("--weights", default=None,
+                      help="キーワード → 重み のJSONファイル（省略時は現在の辞書の重み）")
+  parser.add_argument("--output", default=None, help="評価結果の保存先（JSON）")
+  args = parser.parse_args()
+
+  start = time.perf_counter()
+  matrix = get_keyword_matrix(args.input, rebuild=args.rebuild)
+  print(f"⏱️ 行列の準備: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+  weights = None
+  if args.weights:
+    with open(args.weights, encoding="utf-8") as f:
+      weights = json.load(f)
+
+  start = time.perf_counter()
+  results = matrix.assess(weights)
+  print(f"⏱️ 全{len(results)}件の評価: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+  print_assessment_summary(results)
+  if args.output:
+    save_assessment_results(results, args.output)
+
+
+if __name__ == "__main__":
+  main()
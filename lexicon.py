@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from instrumentation import get_logger, registry
+from keyword_matcher import KeywordMatcher
+from text_normalization import NORMALIZATION_VERSION, normalize_text
+
+logger = get_logger("lexicon")
+
+# キーワード辞書のファイル（環境変数 PLANT_LEXICON で差し替え可能。相対パスはこのファイルの場所から）
+LEXICON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            os.environ.get("PLANT_LEXICON", "lexicon.json"))
+
+# ファイルの更新を確認する最短間隔（秒）
+CHECK_INTERVAL = 1.0
+
+# 辞書の区分と、その区分の重みが満たすべき符号
+SECTIONS = {"easy": 1, "hard": -1}
+
+
+class Lexicon:
+  """キーワード辞書ファイルを読み込み、マッチャーにコンパイルしたもの
+
+  一度作ったら変更しない。差し替えは新しい Lexicon を作って参照ごと入れ替える。
+  version はファイルに書かれたバージョンと内容のハッシュを組み合わせたもので、
+  バージョンを上げ忘れた編集でも評価結果のキャッシュが正しく無効になる。
+  キーワードは本文と同じく normalize_text() で正規化して登録する。
+  """
+
+  def __init__(self, sections: Dict[str, Dict[str, float]], declared_version: str,
+               content_hash: str, path: Optional[str] = None,
+               file_key: Optional[Tuple[int, int]] = None):
+    self.sections = sections
+    self.version = f"{declared_version}-{content_hash}"
+    self.path = path
+    self.file_key = file_key
+    self.loaded_at = time.time()
+    # 区分の順（easy → hard）、ファイルに書かれた順で登録する
+    self.matcher = KeywordMatcher(
+        [item for section in SECTIONS for item in sections.get(section, {}).items()])
+
+  @classmethod
+  def from_dict(cls, data: Dict, path: Optional[str] = None,
+                file_key: Optional[Tuple[int, int]] = None) -> "Lexicon":
+    """{"version", "easy": {"3.0": [キーワード, ...]}, "hard": {...}} 形式の辞書から作る
+
+    正規化すると同じになるキーワード（ﾌﾟﾗﾝﾀｰ と プランター など）は重複として扱う。
+    """
+    if "version" not in data:
+      raise ValueError("キーワード辞書に version がありません")
+
+    sections: Dict[str, Dict[str, float]] = {}
+    seen = set()
+    for section, sign in SECTIONS.items():
+      sections[section] = {}
+      for weight_text, keywords in data.get(section, {}).items():
+        weight = float(weight_text)
+        if weight * sign <= 0:
+          raise ValueError(f"{section} の重みは{'正' if sign > 0 else '負'}の値にしてください: {weight_text}")
+        for original in keywords:
+          keyword = normalize_text(original)
+          if not keyword:
+            raise ValueError(f"{section} に空のキーワードがあります")
+          if keyword in seen:
+            raise ValueError(f"キーワードが重複しています: {original}")
+          seen.add(keyword)
+          sections[section][keyword] = weight
+    if not seen:
+      raise ValueError("キーワード辞書が空です")
+
+    # 正規化の方式も含める（方式が変われば同じ辞書でも評価結果が変わりうる）
+    canonical = json.dumps([NORMALIZATION_VERSION] +
+                           [[section, list(items.items())] for section, items in sections.items()],
+                           ensure_ascii=False)
+    content_hash = hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:8]
+    return cls(sections, str(data["version"]), content_hash, path, file_key)
+
+  @property
+  def weights(self) -> Dict[str, float]:
+    """キーワード → 重み（登録順）"""
+    return dict(zip(self.matcher.keywords, self.matcher.weights))
+
+  def tiers(self, section: str) -> List[Tuple[float, List[str]]]:
+    """区分内の (重み, キーワード一覧) を重みの絶対値の大きい順に返す"""
+    grouped: Dict[float, List[str]] = {}
+    for keyword, weight in self.sections.get(section, {}).items():
+      grouped.setdefault(weight, []).append(keyword)
+    return sorted(grouped.items(), key=lambda item: -abs(item[0]))
+
+
+def _file_key(path: str) -> Tuple[int, int]:
+  stat = os.stat(path)
+  return (stat.st_mtime_ns, stat.st_size)
+
+
+def load_lexicon(path: str = LEXICON_PATH) -> Lexicon:
+  """辞書ファイルを読み込んでコンパイルする（形式が正しくなければ ValueError）"""
+  file_key = _file_key(path)
+  with open(path, encoding="utf-8") as f:
+    data = json.load(f)
+  return Lexicon.from_dict(data, path=path, file_key=file_key)
+
+
+# 現在の辞書。参照の代入だけで差し替えるので、読み出しにロックは不要
+_current: Dict[str, Optional[Lexicon]] = {"lexicon": None}
+_state = {"path": LEXICON_PATH, "checked": 0.0, "pinned": False}
+_lock = threading.Lock()
+
+
+def get_lexicon() -> Lexicon:
+  """現在の辞書を返す（初回のみファイルから読み込む）
+
+  呼び出し側は返された Lexicon を処理の間持ち続ければ、途中で差し替えられても
+  1回の評価の中で辞書が混ざることはない。
+  """
+  lexicon = _current["lexicon"]
+  if lexicon is not None:
+    return lexicon
+  with _lock:
+    if _current["lexicon"] is None:
+      _current["lexicon"] = load_lexicon(_state["path"])
+      logger.debug("📖 キーワード辞書を読み込みました: %s (%s)",
+                   _state["path"], _current["lexicon"].version)
+    return _current["lexicon"]
+
+
+def set_lexicon(lexicon: Lexicon, pin: bool = True):
+  """辞書を直接差し替える（pin=True ならファイルの更新を見に行かない）
+
+  プロセスプールの子プロセスに親と同じ辞書を使わせる時などに使う。
+  """
+  with _lock:
+    _current["lexicon"] = lexicon
+    _state["pinned"] = pin
+
+
+def use_lexicon_file(path: str):
+  """以降の読み込みに使う辞書ファイルを切り替え、すぐに読み込む"""
+  lexicon = load_lexicon(path)
+  with _lock:
+    _state["path"] = path
+    _state["pinned"] = False
+    _current["lexicon"] = lexicon
+
+
+def reload_if_changed(interval: float = CHECK_INTERVAL) -> bool:
+  """辞書ファイルが更新されていれば読み込み直して差し替える（差し替えたら True）
+
+  確認は interval 秒に1回まで。読み込み・コンパイルは現在の辞書を使ったまま行い、
+  完成してから参照を入れ替えるため、処理中のリクエストを止めない。
+  新しいファイルが壊れている場合は警告を出して現在の辞書を使い続ける。
+  """
+  now = time.monotonic()
+  if _state["pinned"] or now - _state["checked"] < interval:
+    return False
+  if not _lock.acquire(blocking=False):
+    return False  # 他のスレッドが確認中
+  try:
+    _state["checked"] = now
+    current = _current["lexicon"]
+    try:
+      if current is not None and _file_key(_state["path"]) == current.file_key:
+        return False
+      lexicon = load_lexicon(_state["path"])
+    except (OSError, ValueError) as e:
+      registry.inc("lexicon_reloads_total", result="error")
+      logger.warning("⚠️ キーワード辞書を読み込めないため現在の辞書を使い続けます: %s", e)
+      return False
+    _current["lexicon"] = lexicon
+    registry.inc("lexicon_reloads_total", result="ok")
+    changed = current is None or current.version != lexicon.version
+    if changed and current is not None:
+      logger.info("🔄 キーワード辞書を差し替えました: %s → %s", current.version, lexicon.version)
+    return changed
+  finally:
+    _lock.release()
@@ -0,0 +1,255 @@
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from instrumentation import registry
+
+# 一覧ページのリンクを振り分ける規則（上から順に評価し、最初に当てはまった規則で決まる）
+# - action: exclude（除外）/ include（個別植物ページとして採用）
+# - field: url（完全なURL）/ href（ページに書かれたままのリンク先）/
+#          text（リンクの文字列。パターンが文字列全体に一致した時だけ）
+# - pattern: 正規表現。{type} はカテゴリの type に置き換える。url / href の ^ / $ はその先頭・末尾
+# どの規則にも当てはまらないリンクは採用しない（unmatched）
+LINK_RULES: List[Dict[str, str]] = [
+    # 一覧ページ自体（末尾のスラッシュ・パラメータ・アンカー付きを含む）
+    {"name": "listing", "action": "exclude", "field": "url", "pattern": r"/type/{type}[/?#]"},
+    {"name": "pagination", "action": "exclude", "field": "url", "pattern": r"/page/"},
+    {"name": "category", "action": "exclude", "field": "url", "pattern": r"/category/"},
+    # 五十音順検索ページ
+    {"name": "syllabary", "action": "exclude", "field": "url", "pattern": r"syllabary="},
+    {"name": "search", "action": "exclude", "field": "url", "pattern": r"\?s&type={type}|/search/"},
+    {"name": "tag", "action": "exclude", "field": "url", "pattern": r"/tag/"},
+    {"name": "author", "action": "exclude", "field": "url", "pattern": r"/author/"},
+    {"name": "registration", "action": "exclude", "field": "url", "pattern": r"/registration/"},
+    # 五十音（1文字）の索引リンク
+    {"name": "kana_index", "action": "exclude", "field": "text",
+     "pattern": "[あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん]"},
+    # 個別植物ページの判定は書かれたままのリンク先で行う
+    # pXXXXX形式のページID（/library/カテゴリ/p12345/。/p の無い p12345 だけのリンクは除く）
+    {"name": "page_id", "action": "include", "field": "href", "pattern": r"/p\d+/*$"},
+    # 植物名形式のサイト内パス（/library/カテゴリ/植物名/。p で始まる名前はページIDと
+    # 区別できないので除く。https:// から始まる絶対URLのリンクは対象外）
+    {"name": "slug", "action": "include", "field": "href",
+     "pattern": r"^/*library/{type}/(?!p)[^/]{2,}(?:/|$)"},
+]
+
+# 規則の確認用の例（(カテゴリの type, リンク先, リンクの文字列, 採用するか)）
+# 規則を変えたら python link_rules.py で全て期待どおりか確認する
+RULE_CASES: List[Tuple[str, str, str, bool]] = [
+    ("vegetables", "/library/vegetables/p123/", "トマト", True),
+    ("vegetables", "https://lovegreen.net/library/vegetables/p123/", "トマト", True),
+    ("vegetables", "/library/vegetables/tomato/", "トマト", True),
+    ("vegetables", "library/vegetables/tomato", "トマト", True),
+    # 絶対URLの植物名形式・/p の無いページIDは個別植物ページとみなさない
+    ("vegetables", "https://lovegreen.net/library/vegetables/tomato/", "トマト", False),
+    ("vegetables", "p123", "トマト", False),
+    ("vegetables", "p123/", "トマト", False),
+    ("vegetables", "/library/vegetables/pumpkin/", "カボチャ", False),
+    ("vegetables", "library/vegetables/", "トマト", False),
+    ("vegetables", "/library/type/vegetables/", "野菜", False),
+    ("vegetables", "/library/type/vegetables/page/2/", "2", False),
+    ("vegetables", "/library/vegetables/p123/?syllabary=a", "あ", False),
+    ("vegetables", "/library/vegetables/p123/", "あ", False),
+    ("vegetables", "/library/vegetables/p123/tag/", "トマト", False),
+]
+
+# リンクの文字列とURLを1つの文字列にするときの区切り（どちらにも現れない文字）
+_SEPARATOR = "\x00"
+
+
+# 対象の文字列（リンクの文字列・リンク先・URLを区切りでつないだもの）の中のフィールドの順番
+_FIELDS = ("text", "href", "url")
+
+def _confine(pattern: str) -> str:
+  """url / href のパターンがフィールドの外（区切りの先）に当てはまらないようにする
+
+  . と否定の文字クラス [^...] は区切りを含まないようにし、$ はフィールドの末尾にする。
+  """
+  out = []
+  i = 0
+  class_start = None  # 文字クラスの中なら、クラスの最初の文字の位置
+  while i < len(pattern):
+    char = pattern[i]
+    if char == "\\":
+      out.append(pattern[i:i + 2])
+      i += 2
+      continue
+    if class_start is not None:
+      # クラスの最初の ] は文字として扱う
+      if char == "]" and i > class_start:
+        class_start = None
+      out.append(char)
+    elif pattern.startswith("[^", i):
+      out.append(f"[^{_SEPARATOR}")
+      class_start = i + 2
+      i += 1
+    elif char == "[":
+      out.append(char)
+      class_start = i + 1
+    elif char == ".":
+      out.append(f"[^{_SEPARATOR}]")
+    elif char == "$":
+      out.append(f"(?![^{_SEPARATOR}])")
+    else:
+      out.append(char)
+    i += 1
+  return "".join(out)
+
+
+def _rule_pattern(rule: Dict[str, str], category_type: str) -> str:
+  if rule["field"] not in _FIELDS:
+    raise ValueError(f"規則 {rule['name']} の field が不正です: {rule['field']}")
+  pattern = rule["pattern"].replace("{type}", re.escape(category_type))
+  return pattern if rule["field"] == "text" else _confine(pattern)
+
+
+def _field_start(field: str) -> str:
+  """対象の文字列の先頭からフィールドの先頭までを読み飛ばすパターン"""
+  return f"[^{_SEPARATOR}]*{_SEPARATOR}" * _FIELDS.index(field)
+
+
+def _compile_rules(rules: List[Dict[str, str]], category_type: str) -> str:
+  """規則の列を、対象の文字列（リンクの文字列 + 区切り + リンク先 + 区切り + URL）の
+  先頭から調べる1つのパターンにする
+
+  各規則は先読みにして順に選択肢として並べる。同じフィールドのどこかに現れればよい規則が
+  同じ action で続く場合は、1つの先読みの中の選択肢にまとめてフィールドの走査を1回にする
+  （その場合に数えられるのはフィールドの中で最初に見つかった規則）。
+  規則 i は名前付きグループ r{i} になる。
+  """
+  alternatives = []
+  run: List[Tuple[int, str]] = []
+  run_key = None
+
+  def flush():
+    # 名前付きグループを最短一致の繰り返しの中に置くと遅いので、まず位置だけを探し、
+    # 見つかった位置で規則を判別する
+    if run:
+      any_rule = "|".join(pattern for _, pattern in run)
+      named = "|".join(f"(?P<r{i}>{pattern})" for i, pattern in run)
+      alternatives.append(f"(?={_field_start(run_key[0])}[^{_SEPARATOR}]*?"
+                          f"(?=(?:{any_rule}))(?:{named}))")
+      run.clear()
+
+  for i, rule in enumerate(rules):
+    pattern = _rule_pattern(rule, category_type)
+    field = rule["field"]
+    if field != "text" and not pattern.startswith("^"):
+      if (field, rule["action"]) != run_key:
+        flush()
+      run.append((i, pattern))
+      run_key = (field, rule["action"])
+      continue
+    flush()
+    run_key = None
+    if field == "text":
+      alternatives.append(f"(?=(?P<r{i}>{pattern}){_SEPARATOR})")
+    else:
+      alternatives.append(f"(?={_field_start(field)}(?P<r{i}>{pattern[1:]}))")
+  flush()
+  return "|".join(alternatives)
+
+
+class LinkRules:
+  """カテゴリごとの規則を1つの正規表現にまとめたリンク分類器
+
+  規則を先読みの選択肢にコンパイルするので、1件のリンクは1回の match で
+  分類でき、当てはまった規則が lastgroup で分かる。除外の規則が採用の規則より
+  先にあれば、URLのどの位置で当てはまっても除外が優先される。
+  規則ごとの一致件数を counts に数え、計測値（link_rule_hits_total）にも記録する。
+  """
+
+  def __init__(self, category_type: str, rules: Iterable[Dict[str, str]] = LINK_RULES):
+    self.category_type = category_type
+    self.rules = list(rules)
+    self.actions = {f"r{i}": (rule["name"], rule["action"] == "include")
+                    for i, rule in enumerate(self.rules)}
+    self.pattern = re.compile(_compile_rules(self.rules, category_type), re.DOTALL)
+    self.counts: Dict[str, int] = {rule["name"]: 0 for rule in self.rules}
+    self.counts["unmatched"] = 0
+    self._lock = threading.Lock()
+
+  def classify(self, url: str, text: str = "", href: Optional[str] = None) -> Tuple[str, bool]:
+    """(当てはまった規則の名前, 採用するか) を返す（件数は数えない）
+
+    href はページに書かれたままのリンク先（省略時は url と同じ）。
+    """
+    href = url if href is None else href
+    match = self.pattern.match(f"{text}{_SEPARATOR}{href}{_SEPARATOR}{url}")
+    if match is None:
+      return "unmatched", False
+    return self.actions[match.lastgroup]
+
+  def select(self, links: Iterable[Tuple[str, str, str]]) -> List[Tuple[str, str]]:
+    """(URL, 文字列, リンク先) の列から採用するリンクの (URL, 文字列) だけを返し、
+    規則ごとの件数を数える"""
+    hits: Dict[str, int] = {}
+    selected = []
+    for url, text, href in links:
+      name, include = self.classify(url, text, href)
+      hits[name] = hits.get(name, 0) + 1
+      if include:
+        selected.append((url, text))
+    with self._lock:
+      for name, count in hits.items():
+        self.counts[name] = self.counts.get(name, 0) + count
+    for name, count in hits.items():
+      registry.inc("link_rule_hits_total", count, category=self.category_type, rule=name)
+    return selected
+
+
+# カテゴリの type → コンパイル済みの規則
+_compiled: Dict[str, LinkRules] = {}
+_compiled_lock = threading.Lock()
+
+
+def get_link_rules(category: Dict) -> LinkRules:
+  """カテゴリの規則を返す（初回のみコンパイル）
+
+  カテゴリの設定に "link_rules" があれば、共通の規則より先に評価する。
+  """
+  rules = _compiled.get(category["type"])
+  if rules is not None:
+    return rules
+  with _compiled_lock:
+    if category["type"] not in _compiled:
+      _compiled[category["type"]] = LinkRules(
+          category["type"], list(category.get("link_rules", [])) + LINK_RULES)
+    return _compiled[category["type"]]
+
+
+def rule_hit_table(categories: Optional[Iterable[Dict]] = None) -> List[Dict]:
+  """カテゴリ・規則ごとの一致件数（一致の無い規則は除く）"""
+  types = [category["type"] for category in categories] if categories else list(_compiled)
+  rows = []
+  for category_type in types:
+    rules = _compiled.get(category_type)
+    if rules is None:
+      continue
+    for name, count in rules.counts.items():
+      if count:
+        rows.append({"category": category_type, "rule": name, "hits": count})
+  return rows
+
+
+def verify_rules(cases: Iterable[Tuple[str, str, str, bool]] = RULE_CASES) -> List[str]:
+  """確認用の例のうち、期待どおりに振り分けられなかったものを返す"""
+  from get_urls import listing_link_url
+
+  errors = []
+  for category_type, href, text, expected in cases:
+    rules = LinkRules(category_type)
+    url = listing_link_url(href, {"type": category_type})
+    name, include = rules.classify(url, text, href)
+    if include != expected:
+      errors.append(f"{category_type} {href} ({text}): {'採用' if expected else '除外'}のはずが"
+                    f" {'採用' if include else '除外'} (規則: {name})")
+  return errors
+
+
+if __name__ == "__main__":
+  errors = verify_rules()
+  for error in errors:
+    print(f"❌ {error}")
+  print(f"{'❌' if errors else '✅'} 規則の確認: {len(RULE_CASES) - len(errors)}/{len(RULE_CASES)}件 期待どおり")
+  raise SystemExit(1 if errors else 0)
@@ -0,0 +1,284 @@
+import argparse
+import asyncio
+import json
+import time
+from functools import partial
+from typing import Dict, List, Optional
+
+from browser import BrowserPool
+from dead_letters import DEFAULT_DEAD_LETTERS_PATH, DeadLetterList
+from dedup import DuplicateDetector
+from extraction import BACKENDS
+from fetch_engine import FetchEngine
+from fetch_policy import FetchPolicy
+from instrumentation import (add_logging_arguments, configure_logging, get_logger,
+                             print_stage_summary, stage_timer, write_summary)
+from get_urls import (LISTING_READY_SELECTOR, ListingCrawler, discover_page_count, listing_url,
+                      plant_categories)
+from get_urls import needs_browser as listing_needs_browser
+from politeness import PolitenessScheduler
+from readiness import ReadinessStats
+from validator_store import ValidatorStore
+from web_scraping import BODY_READY_SELECTOR, extract_plant_content
+from web_scraping import needs_browser as detail_needs_browser
+from Growability_Assessment import (assess_plant_growability, print_assessment_summary,
+                                    save_assessment_results)
+
+logger = get_logger("pipeline")
+
+# キューの終端を表す印
+_DONE = object()
+
+
+class StreamingPipeline:
+  """URL収集 → 取得 → 抽出 → 重複判定 → 評価 を上限付きキューでつないだパイプライン
+
+  各段は前段の結果を1件ずつ受け取って処理するため、最初の評価結果は
+  数秒で得られ、キューが満杯なら前段が待つ（背圧）のでメモリ使用量は
+  植物数に依存しない。先に評価したページと同じ・ほぼ同じ本文のページは評価しない。
+  取得・解析できなかったページと本文が空のページは dead_letters に記録する。
+  """
+
+  def __init__(self,
+               categories: List[Dict],
+               listing_engine: FetchEngine,
+               detail_engine: FetchEngine,
+               validators: ValidatorStore,
+               fetch_workers: int = 8,
+               extract_workers: int = 2,
+               queue_size: int = 32,
+               results_path: Optional[str] = None,
+               parser: str = "auto",
+               dead_letters: Optional[DeadLetterList] = None):
+    self.categories = categories
+    self.dead_letters = dead_letters if dead_letters is not None else DeadLetterList(None)
+    self.listing_crawler = ListingCrawler(listing_engine, validators, parser, self.dead_letters)
+    self.detail_engine = detail_engine
+    self.fetch_workers = fetch_workers
+    self.extract_workers = extract_workers
+    self.url_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    self.html_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    self.text_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    self.results_path = results_path
+    self.parser = parser
+    self.results: List[Dict] = []
+    self.detector = DuplicateDetector()
+    self._seen_urls = set()
+
+  async def _emit_links(self, links: List[Dict]):
+    for plant in links:
+      if plant["url"] not in self._seen_urls:
+        self._seen_urls.add(plant["url"])
+        await self.url_queue.put(plant)
+
+  async def _discover_category(self, category: Dict):
+    """一覧ページを取得したそばから植物URLを次段へ流す"""
+    first = await self.listing_crawler.fetch_listing(category, 1)
+    await self._emit_links(first["links"])
+
+    page_count = first.get("page_count") or discover_page_count(first["html"], category)
+    if first["html"]:
+      self.listing_crawler.validators.update(listing_url(category, 1), page_count=page_count)
+
+    async def fetch_page(page_num):
+      page = await self.listing_crawler.fetch_listing(category, page_num)
+      await self._emit_links(page["links"])
+
+    await asyncio.gather(*(fetch_page(page_num) for page_num in range(2, page_count + 1)))
+
+  async def discover_stage(self):
+    await asyncio.gather(*(self._discover_category(category) for category in self.categories))
+    for _ in range(self.fetch_workers):
+      await self.url_queue.put(_DONE)
+
+  async def fetch_stage(self):
+    while True:
+      plant = await self.url_queue.get()
+      if plant is _DONE:
+        return
+      result = await self.detail_engine.fetch(plant["url"])
+      if result["error"]:
+        logger.warning("❌ %s の取得中にエラーが発生 (%s, %d回試行): %s", plant['name'],
+                       result['failure'], result['attempts'], result['error'])
+        self.dead_letters.add(plant["url"], "detail", result["failure"], result["error"],
+                              status=result["status"], attempts=result["attempts"],
+                              name=plant["name"])
+        result["html"] = ""
+      await self.html_queue.put((plant, result["html"]))
+
+  async def extract_stage(self):
+    loop = asyncio.get_running_loop()
+    while True:
+      item = await self.html_queue.get()
+      if item is _DONE:
+        return
+      plant, html = item
+      texts = []
+      if html:
+        try:
+          # 解析はCPU処理なのでイベントループを止めないよう別スレッドで実行
+          texts = await loop.run_in_executor(None, extract_plant_content, html, self.parser)
+        except Exception as e:
+          logger.warning("❌ %s の解析中にエラーが発生: %s", plant['name'], e)
+          self.dead_letters.add(plant["url"], "detail", "parse", f"解析エラー: {e}",
+                                name=plant["name"])
+        else:
+          if texts:
+            self.dead_letters.resolve(plant["url"])
+          else:
+            self.dead_letters.add(plant["url"], "detail", "empty", "本文が見つかりません",
+                                  name=plant["name"])
+      await self.text_queue.put((plant, texts))
+
+  async def score_stage(self):
+    out = open(self.results_path, "w", encoding="utf-8") if self.results_path else None
+    try:
+      while True:
+        item = await self.text_queue.get()
+        if item is _DONE:
+          return
+        plant, texts = item
+        duplicate = self.detector.check(plant["url"], texts)
+        if duplicate:
+          logger.info("♻️ %s は %s と同じ内容のため評価を省略 (%s)", plant['name'],
+                      duplicate['duplicate_of'], duplicate['kind'])
+          continue
+        result = assess_plant_growability({plant["name"]: texts}, plant["name"], verbose=False)
+        result["カテゴリ"] = plant["category"]
+        self.results.append(result)
+        logger.info("🌱 [%d] %s - %s (%s点)", len(self.results), result['植物名'],
+                    result['評価'], result['スコア'])
+        if out:
+          with stage_timer("write"):
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+      if out:
+        out.close()
+
+  async def run(self) -> List[Dict]:
+    """全段を同時に動かし、終了後にスコア順の評価結果を返す"""
+    async def close_after(tasks, queue, count):
+      await asyncio.gather(*tasks)
+      for _ in range(count):
+        await queue.put(_DONE)
+
+    fetchers = [asyncio.ensure_future(self.fetch_stage()) for _ in range(self.fetch_workers)]
+    extractors = [asyncio.ensure_future(self.extract_stage()) for _ in range(self.extract_workers)]
+    scorer = asyncio.ensure_future(self.score_stage())
+
+    await asyncio.gather(
+        self.discover_stage(),
+        close_after(fetchers, self.html_queue, self.extract_workers),
+        close_after(extractors, self.text_queue, 1),
+        scorer)
+
+    # スコア順でソート
+    self.results.sort(key=lambda x: x["スコア"], reverse=True)
+    if any(self.detector.counts.values()):
+      logger.info("♻️ 重複ページ: 完全一致 %d件, 類似 %d件（評価から除外）",
+                  self.detector.counts["exact"], self.detector.counts["near"])
+    return self.results
+
+
+async def run_pipeline(workers: int = 8,
+                       request_interval: float = 1.0,
+                       browsers: int = 1,
+                       base_url: Optional[str] = None,
+                       use_browser: bool = True,
+                       validators_path: str = "listing_validators.json",
+                       results_path: Optional[str] = None,
+                       queue_size: int = 32,
+                       parser: str = "auto",
+                       policy: Optional[FetchPolicy] = None,
+                       dead_letters_path: Optional[str] = DEFAULT_DEAD_LETTERS_PATH) -> List[Dict]:
+  """一覧ページの取得から評価までを1つのパイプラインで実行する"""
+  validators = ValidatorStore(validators_path)
+  dead_letters = DeadLetterList(dead_letters_path)
+  # 一覧ページと詳細ページは同じホストなので流量制限・サーキットブレーカーも共有する
+  policy = policy or FetchPolicy()
+  stats = ReadinessStats()
+  listing_browser = BrowserPool(LISTING_READY_SELECTOR, stats=stats, size=browsers) if use_browser else None
+  detail_browser = BrowserPool(BODY_READY_SELECTOR, stats=stats, size=browsers) if use_browser else None
+  # 一覧ページと詳細ページは同じホストなので間隔制御を共有する
+  scheduler = PolitenessScheduler(request_interval)
+  try:
+    async with FetchEngine(per_host_limit=workers, scheduler=scheduler, stats=stats,
+                           base_url=base_url, browser_fetch=listing_browser,
+                           needs_browser=listing_needs_browser, policy=policy) as listing_engine, \
+        FetchEngine(per_host_limit=workers, scheduler=scheduler, stats=stats,
+                    base_url=base_url, browser_fetch=detail_browser,
+                    needs_browser=partial(detail_needs_browser, parser=parser),
+                    policy=policy) as detail_engine:
+      pipeline = StreamingPipeline(plant_categories, listing_engine, detail_engine, validators,
+                                   fetch_workers=workers, queue_size=queue_size,
+                                   results_path=results_path, parser=parser,
+                                   dead_letters=dead_letters)
+      results = await pipeline.run()
+      stats.print_summary()
+      if len(dead_letters):
+        print(f"⚠️ 取得・解析できなかったページ: {len(dead_letters)}件 ({dead_letters.kind_counts()})"
+              f" → {dead_letters_path}")
+      return results
+  finally:
+    validators.save()
+    dead_letters.save()
+    for browser_fetch in (listing_browser, detail_browser):
+      if browser_fetch:
+        browser_fetch.close()
+
+
+def main():
+  parser = argparse.ArgumentParser(description="URL収集から育成難易度評価までを一括実行")
+  parser.add_argument("--workers", type=int, default=8, help="同時に取得するページ数")
+  parser.add_argument("--interval", type=float, default=1.0,
+                      help="同一ホストへのリクエスト間隔（秒）")
+  parser.add_argument("--browsers", type=int, default=1,
+                      help="JavaScriptが必要なページに使うブラウザのセッション数")
+  parser.add_argument("--queue-size", type=int, default=32, help="段間キューの上限")
+  parser.add_argument("--base-url", default=None,
+                      help="取得先を差し替えるベースURL（例: http://localhost:8000）")
+  parser.add_argument("--no-browser", action="store_true",
+                      help="JavaScriptが必要なページでもブラウザを使わない")
+  parser.add_argument("--stream-output", default="pipeline_results.jsonl",
+                      help="評価結果を1件ずつ追記するJSONLファイル")
+  parser.add_argument("--output", default="plant_growability_assessment_weighted.json",
+                      help="スコア順の評価結果の出力先")
+  parser.add_argument("--parser", default="auto", choices=["auto"] + list(BACKENDS),
+                      help="HTMLの抽出方式（auto は基準の bs4。速い方式は壊れたHTMLで結果が異なることがある）")
+  parser.add_argument("--rate", type=float, default=None,
+                      help="同一ホストへの1秒あたりのリクエスト数の上限（トークンバケット）")
+  parser.add_argument("--burst", type=int, default=1, help="--rate の上限を超えて連続で送れる数")
+  parser.add_argument("--retries", type=int, default=3,
+                      help="タイムアウト・429・5xxなどの再試行回数")
+  parser.add_argument("--dead-letters", default=DEFAULT_DEAD_LETTERS_PATH,
+                      help="取得・解析に失敗したページの一覧")
+  add_logging_arguments(parser)
+  args = parser.parse_args()
+  configure_logging(args.log_level)
+
+  start = time.perf_counter()
+  results = asyncio.run(run_pipeline(
+      workers=args.workers,
+      request_interval=args.interval,
+      browsers=args.browsers,
+      base_url=args.base_url,
+      use_browser=not args.no_browser,
+      results_path=args.stream_output,
+      queue_size=args.queue_size,
+      parser=args.parser,
+      policy=FetchPolicy(rate=args.rate, burst=args.burst, retries=args.retries),
+      dead_letters_path=args.dead_letters))
+  elapsed = time.perf_counter() - start
+  print(f"\n⏱️ 処理時間: {elapsed:.1f}秒")
+  print_stage_summary()
+  if args.metrics:
+    write_summary(args.metrics, {"script": "pipeline", "plants": len(results),
+                                 "elapsed_seconds": elapsed})
+
+  print_assessment_summary(results)
+  save_assessment_results(results, args.output)
+
+
+if __name__ == "__main__":
+  main()
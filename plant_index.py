@@ -0,0 +1,79 @@
+import csv
+import os
+from typing import Dict, List, Optional
+
+# 並べ替えに使えるキー
+SORT_KEYS = {
+    "score": lambda result: result["スコア"],
+    "name": lambda result: result["植物名"],
+}
+
+
+def load_categories(csv_path: str) -> Dict[str, str]:
+  """URL一覧のCSVから 植物名→カテゴリ の対応を読み込む"""
+  if not os.path.exists(csv_path):
+    return {}
+  with open(csv_path, newline='', encoding='utf-8') as f:
+    return {row['name']: row['category'] for row in csv.DictReader(f)}
+
+
+class PlantIndex:
+  """評価結果のメモリ内インデックス
+
+  植物名の辞書と、(評価レベル, カテゴリ) の組み合わせごとに並べ替え済みの
+  リストを事前に作っておき、検索・ページングをリストの走査なしで行う。
+  """
+
+  def __init__(self, results: List[Dict], categories: Dict[str, str], version: str):
+    self.version = version
+    self.results = []
+    for result in results:
+      item = dict(result)
+      item["カテゴリ"] = categories.get(result["植物名"])
+      self.results.append(item)
+
+    self.by_name = {item["植物名"]: item for item in self.results}
+    self.levels = sorted({item["評価"] for item in self.results})
+    self.categories = sorted({item["カテゴリ"] for item in self.results if item["カテゴリ"]})
+
+    # (並べ替えキー, 昇順/降順, 評価レベル or None, カテゴリ or None) → 並べ替え済みのリスト
+    # 同点の並びは元の評価結果の順を保つ
+    self._sorted: Dict[tuple, List[Dict]] = {}
+    for sort_key, key_func in SORT_KEYS.items():
+      for order in ("asc", "desc"):
+        ordered = sorted(self.results, key=key_func, reverse=(order == "desc"))
+        for item in ordered:
+          # 「指定なし」(None) と、その植物自身の値の両方に登録する
+          for level in {None, item["評価"]}:
+            for category in {None, item["カテゴリ"]}:
+              self._sorted.setdefault((sort_key, order, level, category), []).append(item)
+
+  def get(self, name: str) -> Optional[Dict]:
+    return self.by_name.get(name)
+
+  def query(self,
+            sort: str = "score",
+            order: str = "desc",
+            level: Optional[str] = None,
+            category: Optional[str] = None,
+            page: int = 1,
+            per_page: int = 50) -> Dict:
+    """条件に合う評価結果の1ページ分を返す"""
+    if sort not in SORT_KEYS:
+      raise ValueError(f"sortは {', '.join(SORT_KEYS)} のいずれかを指定してください")
+    if order not in ("asc", "desc"):
+      raise ValueError("orderは asc か desc を指定してください")
+    if page < 1 or per_page < 1:
+      raise ValueError("page・per_pageは1以上を指定してください")
+
+    items = self._sorted.get((sort, order, level, category), [])
+    total = len(items)
+    start = (page - 1) * per_page
+
+    return {
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "pages": (total + per_page - 1) // per_page,
+        "items": items[start:start + per_page],
+    }
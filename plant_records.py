@@ -0,0 +1,88 @@
+import argparse
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from instrumentation import stage_timer
+
+
+def iter_plant_records(path: str) -> Iterator[Tuple[str, List[str]]]:
+  """植物データを (植物名, テキスト一覧) の順に1件ずつ返す
+
+  JSONL形式（1行1植物）は1行ずつ読むので、メモリ使用量はファイルの大きさに
+  依存しない。従来の .json 形式はまとめて読み込んでから返す（互換用）。
+  """
+  if path.endswith(".jsonl"):
+    with open(path, "r", encoding="utf-8") as f:
+      for line in f:
+        line = line.strip()
+        if line:
+          record = json.loads(line)
+          yield record["name"], record["texts"]
+  else:
+    with open(path, "r", encoding="utf-8") as f:
+      data = json.load(f)
+    for name, texts in data.items():
+      yield name, texts
+
+
+class PlantRecordWriter:
+  """植物データを1行1植物のJSONLで書き出す（整形なし）"""
+
+  def __init__(self, path: str):
+    self.path = path
+    self.count = 0
+    # 書き込み途中のファイルを読まれないよう一時ファイルに書いてから置き換える
+    self._tmp_path = path + ".tmp"
+    self._file = open(self._tmp_path, "w", encoding="utf-8")
+
+  def write(self, name: str, texts: List[str]):
+    with stage_timer("write"):
+      self._file.write(json.dumps({"name": name, "texts": texts}, ensure_ascii=False) + "\n")
+    self.count += 1
+
+  def close(self):
+    self._file.close()
+    os.replace(self._tmp_path, self.path)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    if exc_type is None:
+      self.close()
+    else:
+      self._file.close()
+      os.remove(self._tmp_path)
+
+
+def write_plant_records(path: str, records: Iterable[Tuple[str, List[str]]]) -> int:
+  """(植物名, テキスト一覧) の列をJSONLに書き出し、件数を返す"""
+  with PlantRecordWriter(path) as writer:
+    for name, texts in records:
+      writer.write(name, texts)
+  return writer.count
+
+
+def load_plant_records(path: str) -> Dict[str, List[str]]:
+  """植物データを辞書として読み込む（小さなデータ・互換用）"""
+  return dict(iter_plant_records(path))
+
+
+def convert_json_to_jsonl(json_path: str, jsonl_path: str) -> int:
+  """従来の all_plants_data.json をJSONL形式に変換する"""
+  return write_plant_records(jsonl_path, iter_plant_records(json_path))
+
+
+def main():
+  parser = argparse.ArgumentParser(description="植物データをJSONL形式に変換")
+  parser.add_argument("input", help="従来形式のJSONファイル（例: all_plants_data.json）")
+  parser.add_argument("output", help="出力するJSONLファイル（例: all_plants_data.jsonl）")
+  args = parser.parse_args()
+
+  count = convert_json_to_jsonl(args.input, args.output)
+  print(f"✅ {count}件の植物データを {args.output} に変換しました")
+
+
+if __name__ == "__main__":
+  main()
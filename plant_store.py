@@ -0,0 +1,485 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from dedup import display_names
+from instrumentation import registry
+
+# 既定のデータベースファイル（環境変数 PLANT_DB で差し替え可能）
+DEFAULT_DB_PATH = os.environ.get("PLANT_DB", "plants.db")
+# クロールの変更一覧（web_scraping.py・crawl_worker.py が書き、Growability_Assessment.py が差分評価に使う）
+DEFAULT_CHANGES_PATH = "crawl_changes.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+  key TEXT PRIMARY KEY,
+  value
+);
+CREATE TABLE IF NOT EXISTS urls (
+  url TEXT PRIMARY KEY,
+  name TEXT NOT NULL,
+  category TEXT,
+  position INTEGER NOT NULL,
+  active INTEGER NOT NULL DEFAULT 1,
+  first_seen REAL NOT NULL,
+  last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS urls_active_position ON urls(active, position);
+CREATE INDEX IF NOT EXISTS urls_category ON urls(category, position);
+CREATE INDEX IF NOT EXISTS urls_name ON urls(name);
+CREATE TABLE IF NOT EXISTS snapshots (
+  url TEXT PRIMARY KEY,
+  status TEXT NOT NULL,
+  error TEXT,
+  html_hash TEXT,
+  content_hash TEXT,
+  paragraph_count INTEGER NOT NULL DEFAULT 0,
+  fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS paragraphs (
+  url TEXT NOT NULL,
+  position INTEGER NOT NULL,
+  text TEXT NOT NULL,
+  PRIMARY KEY (url, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS scores (
+  name TEXT PRIMARY KEY,
+  category TEXT,
+  level TEXT NOT NULL,
+  score REAL NOT NULL,
+  reason TEXT,
+  lexicon_version TEXT,
+  position INTEGER NOT NULL,
+  assessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_rank ON scores(score DESC, position);
+CREATE INDEX IF NOT EXISTS scores_level ON scores(level, score DESC, position);
+CREATE INDEX IF NOT EXISTS scores_category ON scores(category, score DESC, position);
+CREATE TABLE IF NOT EXISTS signatures (
+  url TEXT PRIMARY KEY,
+  minhash BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS duplicates (
+  url TEXT PRIMARY KEY,
+  duplicate_of TEXT NOT NULL,
+  kind TEXT NOT NULL,
+  similarity REAL NOT NULL,
+  detected_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS duplicates_of ON duplicates(duplicate_of);
+"""
+
+
+class PlantStore:
+  """URL・ページの取得状況・本文の段落・評価結果を持つSQLiteデータベース
+
+  - WALモードなので、クロール中の書き込みと app.py などの読み出しが同時にできる
+  - 書き込みはまとめて1トランザクションで行い、本文は内容が変わったページだけ書き換える
+  - URL・カテゴリ・スコアに索引があり、1件の検索・上位の取得は全件を走査しない
+  - URL一覧・本文が変わるたびに revision が増える（評価結果のキャッシュの判定に使う）
+  - 他のページと同じ内容だと判定されたページ（duplicates）は本文を持たず、評価の対象にもしない
+  """
+
+  def __init__(self, path: str = DEFAULT_DB_PATH):
+    self.path = path
+    self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    self.conn.execute("PRAGMA journal_mode=WAL")
+    self.conn.execute("PRAGMA synchronous=NORMAL")
+    self.conn.executescript(SCHEMA)
+    self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0)")
+    self._rows_cache: Tuple[Optional[int], List[Tuple[str, str, str]]] = (None, [])
+
+  def close(self):
+    self.conn.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    self.close()
+
+  @contextmanager
+  def transaction(self, table: str = "all"):
+    """書き込みを1トランザクションにまとめる（例外時はロールバック）"""
+    with registry.timer("store_write_seconds", table=table):
+      self.conn.execute("BEGIN IMMEDIATE")
+      try:
+        yield self.conn
+        self.conn.execute("COMMIT")
+      except BaseException:
+        self.conn.execute("ROLLBACK")
+        raise
+
+  def _bump_revision(self):
+    self.conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+
+  def _meta(self, key: str):
+    row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+  def revision(self) -> int:
+    """URL一覧・本文の更新回数"""
+    return int(self._meta("revision") or 0)
+
+  # --- URL ---
+
+  def upsert_urls(self, plants: List[Dict], replace: bool = True) -> Dict[str, int]:
+    """収集した (name, url, category) を収集順に登録する
+
+    replace=True なら今回含まれなかったURLを無効にする（一覧から消えたページ）。
+    replace=False（一覧の一部だけを取得した場合）は登録済みのURLの収集順を変えず、
+    新しいURLは末尾に追加する。新規・無効にした件数を返す。
+    """
+    now = time.time()
+    with self.transaction("urls") as conn:
+      before = {url for url, in conn.execute("SELECT url FROM urls WHERE active = 1")}
+      start = 0 if replace else conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM urls").fetchone()[0]
+      position_update = "excluded.position" if replace else "urls.position"
+      conn.executemany(
+          f"""INSERT INTO urls (url, name, category, position, active, first_seen, last_seen)
+             VALUES (?, ?, ?, ?, 1, ?, ?)
+             ON CONFLICT(url) DO UPDATE SET name = excluded.name, category = excluded.category,
+               position = {position_update}, active = 1, last_seen = excluded.last_seen""",
+          [(plant["url"], plant["name"], plant.get("category"), start + position, now, now)
+           for position, plant in enumerate(plants)])
+      current = {plant["url"] for plant in plants}
+      removed = before - current if replace else set()
+      conn.executemany("UPDATE urls SET active = 0 WHERE url = ?", [(url,) for url in removed])
+      self._bump_revision()
+    return {"new": len(current - before), "removed": len(removed)}
+
+  def active_urls(self) -> set:
+    return {url for url, in self.conn.execute("SELECT url FROM urls WHERE active = 1")}
+
+  def list_urls(self, category: Optional[str] = None) -> List[Dict]:
+    """有効なURLを収集順に返す（category を指定するとそのカテゴリだけ）"""
+    if category is None:
+      rows = self.conn.execute(
+          "SELECT name, url, category FROM urls WHERE active = 1 ORDER BY position")
+    else:
+      rows = self.conn.execute(
+          "SELECT name, url, category FROM urls WHERE active = 1 AND category = ? ORDER BY position",
+          (category,))
+    return [{"name": name, "url": url, "category": category} for name, url, category in rows]
+
+  def get_url(self, url: str) -> Optional[Dict]:
+    row = self.conn.execute(
+        "SELECT name, url, category, active FROM urls WHERE url = ?", (url,)).fetchone()
+    if row is None:
+      return None
+    return {"name": row[0], "url": row[1], "category": row[2], "active": bool(row[3])}
+
+  def _plant_rows(self) -> List[Tuple[str, str, str]]:
+    """評価対象（有効・重複でない）のURLの (表示名, URL, カテゴリ) を収集順に返す
+
+    URL一覧・重複の記録が変われば revision が増えるので、同じ revision の間は使い回す。
+    """
+    revision = self.revision()
+    if self._rows_cache[0] != revision:
+      self._rows_cache = (revision, self._load_plant_rows())
+    return self._rows_cache[1]
+
+  def _load_plant_rows(self) -> List[Tuple[str, str, str]]:
+    rows = self.conn.execute(
+        """SELECT name, url, category FROM urls
+           WHERE active = 1 AND url NOT IN (SELECT url FROM duplicates)
+           ORDER BY position""").fetchall()
+    names = display_names({"name": name, "url": url} for name, url, _ in rows)
+    return [(names[url], url, category) for _, url, category in rows]
+
+  def display_names(self) -> Dict[str, str]:
+    """URL → 評価・変更一覧で使う表示名（評価対象のURLだけ）"""
+    return {url: name for name, url, _ in self._plant_rows()}
+
+  def categories(self) -> Dict[str, str]:
+    """表示名 → カテゴリ"""
+    return {name: category for name, _, category in self._plant_rows()}
+
+  # --- ページ・本文 ---
+
+  def write_pages(self, pages: Iterable[Dict]) -> Dict[str, int]:
+    """ページの取得結果をまとめて書き込む
+
+    各ページは {"url", "status", "texts", "error", "html_hash", "content_hash"}。
+    dedup.dedup_pages を通したページは "signature"（MinHash）と、重複なら
+    "duplicate" を持つ。重複ページは段落を持たず duplicates に記録する。
+    本文のハッシュが保存済みと同じページは段落を書き換えない。
+    書き込んだ件数・変更なし・重複の件数を返す。
+    """
+    counts = {"written": 0, "unchanged": 0, "duplicates": 0}
+    now = time.time()
+    changed = False
+    with self.transaction("paragraphs") as conn:
+      for page in pages:
+        duplicate = page.get("duplicate")
+        if duplicate:
+          changed |= self._mark_duplicate(page, duplicate, now)
+          counts["duplicates"] += 1
+          continue
+        if conn.execute("DELETE FROM duplicates WHERE url = ?", (page["url"],)).rowcount:
+          changed = True
+        if page.get("signature") is not None:
+          conn.execute("INSERT OR REPLACE INTO signatures (url, minhash) VALUES (?, ?)",
+                       (page["url"], page["signature"].tobytes()))
+        row = conn.execute("SELECT content_hash, status FROM snapshots WHERE url = ?",
+                           (page["url"],)).fetchone()
+        texts = page.get("texts") or []
+        if (row is not None and row[1] != "duplicate" and page.get("content_hash")
+                and row[0] == page["content_hash"]):
+          conn.execute("UPDATE snapshots SET status = ?, error = ?, html_hash = ?, fetched_at = ? "
+                       "WHERE url = ?", (page["status"], page.get("error"),
+                                         page.get("html_hash"), now, page["url"]))
+          counts["unchanged"] += 1
+          continue
+        conn.execute(
+            """INSERT OR REPLACE INTO snapshots
+               (url, status, error, html_hash, content_hash, paragraph_count, fetched_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (page["url"], page["status"], page.get("error"), page.get("html_hash"),
+             page.get("content_hash"), len(texts), now))
+        conn.execute("DELETE FROM paragraphs WHERE url = ?", (page["url"],))
+        conn.executemany("INSERT INTO paragraphs (url, position, text) VALUES (?, ?, ?)",
+                         [(page["url"], i, text) for i, text in enumerate(texts)])
+        counts["written"] += 1
+        changed = True
+      if changed:
+        self._bump_revision()
+    return counts
+
+  def _mark_duplicate(self, page: Dict, duplicate: Dict, now: float) -> bool:
+    """重複ページとして記録し、本文・署名を消す（記録が変わったら True）"""
+    row = self.conn.execute("SELECT duplicate_of FROM duplicates WHERE url = ?",
+                            (page["url"],)).fetchone()
+    self.conn.execute(
+        """INSERT OR REPLACE INTO duplicates (url, duplicate_of, kind, similarity, detected_at)
+           VALUES (?, ?, ?, ?, ?)""",
+        (page["url"], duplicate["duplicate_of"], duplicate["kind"], duplicate["similarity"], now))
+    self.conn.execute(
+        """INSERT OR REPLACE INTO snapshots
+           (url, status, error, html_hash, content_hash, paragraph_count, fetched_at)
+           VALUES (?, 'duplicate', NULL, ?, ?, 0, ?)""",
+        (page["url"], page.get("html_hash"), page.get("content_hash"), now))
+    self.conn.execute("DELETE FROM paragraphs WHERE url = ?", (page["url"],))
+    self.conn.execute("DELETE FROM signatures WHERE url = ?", (page["url"],))
+    return row is None or row[0] != duplicate["duplicate_of"]
+
+  def duplicate_urls(self) -> Dict[str, str]:
+    """重複ページのURL → 代表のURL"""
+    return dict(self.conn.execute("SELECT url, duplicate_of FROM duplicates"))
+
+  def clear_duplicates(self):
+    """重複の判定をやり直すため記録を消す（次回の取得で再判定）"""
+    with self.transaction("duplicates") as conn:
+      conn.execute("DELETE FROM duplicates")
+      conn.execute("DELETE FROM signatures")
+      self._bump_revision()
+
+  def iter_signatures(self) -> Iterator[Tuple[str, str, bytes]]:
+    """代表ページ（有効・重複でない）の (URL, 本文のハッシュ, MinHash) を収集順に返す"""
+    return iter(self.conn.execute(
+        """SELECT u.url, s.content_hash, g.minhash FROM urls u
+           JOIN snapshots s ON s.url = u.url LEFT JOIN signatures g ON g.url = u.url
+           WHERE u.active = 1 AND s.status = 'ok'
+             AND u.url NOT IN (SELECT url FROM duplicates)
+           ORDER BY u.position""").fetchall())
+
+  def paragraphs(self, url: str) -> List[str]:
+    return [text for text, in self.conn.execute(
+        "SELECT text FROM paragraphs WHERE url = ? ORDER BY position", (url,))]
+
+  def snapshot(self, url: str) -> Optional[Dict]:
+    row = self.conn.execute(
+        "SELECT status, error, html_hash, content_hash, paragraph_count, fetched_at "
+        "FROM snapshots WHERE url = ?", (url,)).fetchone()
+    if row is None:
+      return None
+    keys = ("status", "error", "html_hash", "content_hash", "paragraph_count", "fetched_at")
+    return dict(zip(keys, row))
+
+  def status_counts(self) -> Dict[str, int]:
+    return {status: count for status, count in self.conn.execute(
+        "SELECT s.status, COUNT(*) FROM snapshots s JOIN urls u ON u.url = s.url "
+        "WHERE u.active = 1 GROUP BY s.status")}
+
+  def plant_order(self) -> Dict[str, int]:
+    """評価対象の植物名 → 収集順（評価結果の同点の並び順に使う）"""
+    return {name: position for position, (name, _, _) in enumerate(self._plant_rows())}
+
+  def iter_plant_records(self, names: Optional[set] = None) -> Iterator[Tuple[str, List[str]]]:
+    """有効なURLの収集順に (植物名, テキスト一覧) を1件ずつ返す
+
+    plant_records.iter_plant_records と同じ形。重複ページは除き、別の植物に
+    同じ名前がある場合は dedup.display_names で区別した名前を使う。
+    names を指定するとその植物の本文だけを読み込む。
+    """
+    for name, url, _ in self._plant_rows():
+      if names is None or name in names:
+        yield name, self.paragraphs(url)
+
+  # --- 評価結果 ---
+
+  def _score_params(self, results: Iterable[Dict], rows: List[Tuple[str, str, str]]):
+    """scores に書き込む値（position は収集順。収集順に無い植物は後ろに並べる）"""
+    categories = {name: category for name, _, category in rows}
+    order = {name: position for position, (name, _, _) in enumerate(rows)}
+    now = time.time()
+    return [(result["植物名"], categories.get(result["植物名"]), result["評価"], result["スコア"],
+             result.get("理由"), result.get("辞書バージョン"),
+             order.get(result["植物名"], len(order) + rank), now)
+            for rank, result in enumerate(results)]
+
+  def _set_scores_revision(self, revision: Optional[int]):
+    self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('scores_revision', ?)",
+                      (self.revision() if revision is None else revision,))
+
+  def save_scores(self, results: List[Dict], revision: Optional[int] = None):
+    """スコア順の評価結果で置き換える（revision はその評価に使った本文の revision）"""
+    params = self._score_params(results, self._plant_rows())
+    with self.transaction("scores") as conn:
+      conn.execute("DELETE FROM scores")
+      conn.executemany(
+          """INSERT OR REPLACE INTO scores
+             (name, category, level, score, reason, lexicon_version, position, assessed_at)
+             VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", params)
+      self._set_scores_revision(revision)
+
+  def update_scores(self, results: List[Dict], removed: Iterable[str] = (),
+                    revision: Optional[int] = None):
+    """再評価した植物の評価結果だけを書き換え、removed の植物を消す
+
+    収集順（position）は現在のURL一覧に合わせて付け直す。順位は索引で決まるので
+    他の行は書き換えない。
+    """
+    rows = self._plant_rows()
+    params = self._score_params(results, rows)
+    stored = dict(self.conn.execute("SELECT name, position FROM scores"))
+    moved = [(position, name) for position, (name, _, _) in enumerate(rows)
+             if stored.get(name, position) != position]
+    with self.transaction("scores") as conn:
+      conn.executemany("DELETE FROM scores WHERE name = ?", [(name,) for name in removed])
+      conn.executemany(
+          """INSERT OR REPLACE INTO scores
+             (name, category, level, score, reason, lexicon_version, position, assessed_at)
+             VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", params)
+      conn.executemany("UPDATE scores SET position = ? WHERE name = ?", moved)
+      self._set_scores_revision(revision)
+
+  @staticmethod
+  def _score_row(row) -> Dict:
+    name, level, score, reason, lexicon_version = row
+    return {"植物名": name, "評価": level, "スコア": score, "理由": reason,
+            "辞書バージョン": lexicon_version}
+
+  def load_scores(self, lexicon_version: Optional[str] = None) -> Optional[List[Dict]]:
+    """保存済みの評価結果をスコア順に返す
+
+    lexicon_version を指定した場合、評価後に本文が変わっているか、
+    別の辞書で評価された結果が含まれていれば None（再評価が必要）。
+    """
+    if lexicon_version is not None:
+      scores_revision = self._meta("scores_revision")
+      if scores_revision is None or int(scores_revision) != self.revision():
+        return None
+      stale = self.conn.execute(
+          "SELECT 1 FROM scores WHERE lexicon_version IS NOT ? LIMIT 1",
+          (lexicon_version,)).fetchone()
+      if stale:
+        return None
+    return [self._score_row(row) for row in self.conn.execute(
+        "SELECT name, level, score, reason, lexicon_version FROM scores ORDER BY score DESC, position")]
+
+  def top_scores(self, limit: int = 10, level: Optional[str] = None,
+                 category: Optional[str] = None) -> List[Dict]:
+    """スコア上位を索引から取得する（評価レベル・カテゴリで絞り込み可）"""
+    conditions, params = [], []
+    if level:
+      conditions.append("level = ?")
+      params.append(level)
+    if category:
+      conditions.append("category = ?")
+      params.append(category)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return [self._score_row(row) for row in self.conn.execute(
+        f"SELECT name, level, score, reason, lexicon_version FROM scores {where} "
+        f"ORDER BY score DESC, position LIMIT ?", params + [limit])]
+
+  def get_score(self, name: str) -> Optional[Dict]:
+    row = self.conn.execute(
+        "SELECT name, level, score, reason, lexicon_version FROM scores WHERE name = ?",
+        (name,)).fetchone()
+    return self._score_row(row) if row else None
+
+  def stats(self) -> Dict:
+    def count(sql):
+      return self.conn.execute(sql).fetchone()[0]
+    return {
+        "urls": count("SELECT COUNT(*) FROM urls WHERE active = 1"),
+        "inactive_urls": count("SELECT COUNT(*) FROM urls WHERE active = 0"),
+        "snapshots": self.status_counts(),
+        "duplicates": count("SELECT COUNT(*) FROM duplicates"),
+        "paragraphs": count("SELECT COUNT(*) FROM paragraphs"),
+        "scores": count("SELECT COUNT(*) FROM scores"),
+        "revision": self.revision(),
+    }
+
+
+def import_files(store: PlantStore, urls_csv: Optional[str] = None,
+                 data_path: Optional[str] = None, scores_path: Optional[str] = None):
+  """従来のCSV・JSON(L)・評価結果JSONをデータベースに取り込む"""
+  from plant_records import iter_plant_records
+  from validator_store import content_hash
+
+  if urls_csv:
+    with open(urls_csv, newline="", encoding="utf-8") as f:
+      plants = [{"name": row["name"], "url": row["url"], "category": row.get("category")}
+                for row in csv.DictReader(f)]
+    counts = store.upsert_urls(plants)
+    print(f"✅ URL {len(plants)}件を取り込みました (新規 {counts['new']}件)")
+
+  if data_path:
+    # 植物データは植物名で持っているため、登録済みのURLに対応づける
+    url_by_name = {plant["name"]: plant["url"] for plant in store.list_urls()}
+    pages, skipped = [], 0
+    for name, texts in iter_plant_records(data_path):
+      if name not in url_by_name:
+        skipped += 1
+        continue
+      pages.append({"url": url_by_name[name], "status": "ok" if texts else "empty",
+                    "texts": texts, "content_hash": content_hash(texts)})
+    counts = store.write_pages(pages)
+    print(f"✅ 本文 {counts['written']}件を取り込みました"
+          f" (変更なし {counts['unchanged']}件, URL不明 {skipped}件)")
+
+  if scores_path:
+    with open(scores_path, encoding="utf-8") as f:
+      results = json.load(f)
+    store.save_scores(results)
+    print(f"✅ 評価結果 {len(results)}件を取り込みました")
+
+
+def main():
+  parser = argparse.ArgumentParser(description="植物データベース（SQLite）の取り込み・確認")
+  parser.add_argument("--db", default=DEFAULT_DB_PATH, help="データベースファイル")
+  parser.add_argument("--import-urls", default=None, help="取り込むURL一覧のCSV（all_plants_urls.csv）")
+  parser.add_argument("--import-data", default=None, help="取り込む植物データ（.jsonl / .json）")
+  parser.add_argument("--import-scores", default=None, help="取り込む評価結果のJSON")
+  parser.add_argument("--top", type=int, default=0, help="スコア上位を表示する件数")
+  parser.add_argument("--level", default=None, help="--top の評価レベルでの絞り込み")
+  parser.add_argument("--category", default=None, help="--top のカテゴリでの絞り込み")
+  args = parser.parse_args()
+
+  with PlantStore(args.db) as store:
+    import_files(store, args.import_urls, args.import_data, args.import_scores)
+    print(f"📊 {args.db}: {json.dumps(store.stats(), ensure_ascii=False)}")
+    if args.top:
+      for i, result in enumerate(store.top_scores(args.top, args.level, args.category)):
+        print(f"  {i + 1:2d}. {result['植物名']} - {result['評価']} ({result['スコア']}点)")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,45 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlsplit
+
+
+class PolitenessScheduler:
+  """同一ホストへのリクエスト間隔を保つスケジューラー
+
+  ページの描画待ちとは独立しており、各リクエストの直前に呼ぶと
+  前回のリクエストから interval 秒（+ 0〜jitter 秒）経つまで待つ。
+  asyncio（wait）とスレッド（wait_sync）のどちらからも使える。
+  """
+
+  def __init__(self, interval: float = 0, jitter: float = 0):
+    self.interval = interval
+    self.jitter = jitter
+    self._next_slot: Dict[str, float] = {}
+    self._lock = threading.Lock()
+
+  def _reserve(self, url: str) -> float:
+    """次のリクエスト枠を予約し、待つべき秒数を返す"""
+    host = urlsplit(url).netloc
+    with self._lock:
+      now = time.monotonic()
+      scheduled = max(now, self._next_slot.get(host, now))
+      gap = self.interval + (random.uniform(0, self.jitter) if self.jitter else 0)
+      self._next_slot[host] = scheduled + gap
+    return scheduled - now
+
+  async def wait(self, url: str):
+    if self.interval <= 0 and self.jitter <= 0:
+      return
+    delay = self._reserve(url)
+    if delay > 0:
+      await asyncio.sleep(delay)
+
+  def wait_sync(self, url: str):
+    if self.interval <= 0 and self.jitter <= 0:
+      return
+    delay = self._reserve(url)
+    if delay > 0:
+      time.sleep(delay)
@@ -0,0 +1,57 @@
+import time
+from typing import Dict, List
+
+
+class ReadinessStats:
+  """ページが使える状態になるまでの時間（time-to-ready）を記録する"""
+
+  def __init__(self):
+    self.samples: Dict[str, List[float]] = {}
+    self.timeouts: Dict[str, int] = {}
+
+  def record(self, kind: str, seconds: float, timed_out: bool = False):
+    self.samples.setdefault(kind, []).append(seconds)
+    if timed_out:
+      self.timeouts[kind] = self.timeouts.get(kind, 0) + 1
+
+  def summary(self) -> Dict[str, Dict]:
+    """種類ごとの件数・平均・p50・p95・最大・タイムアウト数"""
+    result = {}
+    for kind, samples in self.samples.items():
+      ordered = sorted(samples)
+      result[kind] = {
+          "count": len(ordered),
+          "mean": sum(ordered) / len(ordered),
+          "p50": ordered[int(0.50 * (len(ordered) - 1))],
+          "p95": ordered[int(0.95 * (len(ordered) - 1))],
+          "max": ordered[-1],
+          "timeouts": self.timeouts.get(kind, 0),
+      }
+    return result
+
+  def print_summary(self):
+    for kind, stats in self.summary().items():
+      print(f"⏱️ {kind}: {stats['count']}件, 平均 {stats['mean']:.2f}秒, "
+            f"p50 {stats['p50']:.2f}秒, p95 {stats['p95']:.2f}秒, 最大 {stats['max']:.2f}秒, "
+            f"タイムアウト {stats['timeouts']}件")
+
+
+def wait_until_ready(driver, css_selector: str, timeout: float = 10, poll: float = 0.1) -> tuple:
+  """css_selectorの要素が現れた時点で戻る（最大timeout秒）
+
+  戻り値は (待った秒数, タイムアウトしたか)。タイムアウトしても例外にはせず、
+  その時点のページで処理を続ける（従来の固定待機と同じ扱い）。
+  """
+  from selenium.common.exceptions import TimeoutException
+  from selenium.webdriver.common.by import By
+  from selenium.webdriver.support import expected_conditions
+  from selenium.webdriver.support.ui import WebDriverWait
+
+  start = time.perf_counter()
+  try:
+    WebDriverWait(driver, timeout, poll_frequency=poll).until(
+        expected_conditions.presence_of_element_located((By.CSS_SELECTOR, css_selector)))
+    timed_out = False
+  except TimeoutException:
+    timed_out = True
+  return time.perf_counter() - start, timed_out
@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import zlib
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+from fetch_engine import SITE_BASE_URL
+
+FIXTURES_DIR = "fixtures"
+
+# 記録されていないURLを同じ種類の保存済みページで代替するためのパターン
+LISTING_PATH = re.compile(r"^/library/type/(?P<type>[^/]+)(?:/page/(?P<num>\d+))?$")
+DETAIL_PATH = re.compile(r"^/library/(?P<type>[^/]+)/p\d+$")
+
+
+class ReplayServer:
+  """保存済みページ（fixtures）を本番サイトと同じパスで返すローカルHTTPサーバー
+
+  - manifest.json に記録されたURLはそのページを返す
+  - 記録に無い一覧ページ・詳細ページは、同じカテゴリの保存済みページで代替する
+    （strict=True なら404）。これで全ページ数ぶんのクロールを再現できる
+  - latency（+ 0〜jitter 秒）の遅延と、error_rate の割合で503エラーを注入する
+  """
+
+  def __init__(self,
+               fixtures_dir: str = FIXTURES_DIR,
+               latency: float = 0,
+               jitter: float = 0,
+               error_rate: float = 0,
+               seed: Optional[int] = None,
+               strict: bool = False):
+    self.latency = latency
+    self.jitter = jitter
+    self.error_rate = error_rate
+    self.strict = strict
+    self.random = random.Random(seed)
+    self.pages: Dict[str, str] = {}
+    self.listings: Dict[str, List[str]] = {}
+    self.details: List[str] = []
+    self.counts = {"recorded": 0, "substituted": 0, "not_found": 0, "errors": 0}
+
+    with open(os.path.join(fixtures_dir, "manifest.json"), encoding="utf-8") as f:
+      manifest = json.load(f)
+    for page in manifest["pages"]:
+      with open(os.path.join(fixtures_dir, "html", page["file"]), encoding="utf-8") as f:
+        html = f.read()
+      path = self._normalize(page["url"][len(SITE_BASE_URL):])
+      self.pages[path] = html
+      if page["kind"] == "listing":
+        self.listings.setdefault(page["category"], []).append(html)
+      else:
+        self.details.append(html)
+
+  @staticmethod
+  def _normalize(path: str) -> str:
+    return path.rstrip("/") or "/"
+
+  def lookup(self, path: str) -> Optional[str]:
+    """パスに対応するHTMLを返す（無ければNone）"""
+    path = self._normalize(path)
+    if path in self.pages:
+      self.counts["recorded"] += 1
+      return self.pages[path]
+    if self.strict:
+      return None
+
+    match = LISTING_PATH.match(path)
+    if match and match.group("type") in self.listings:
+      pages = self.listings[match.group("type")]
+      self.counts["substituted"] += 1
+      return pages[(int(match.group("num") or 1) - 1) % len(pages)]
+    if DETAIL_PATH.match(path) and self.details:
+      self.counts["substituted"] += 1
+      return self.details[zlib.crc32(path.encode("utf-8")) % len(self.details)]
+    return None
+
+  async def handle(self, request: web.Request) -> web.Response:
+    delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+    if delay > 0:
+      await asyncio.sleep(delay)
+
+    if self.error_rate and self.random.random() < self.error_rate:
+      self.counts["errors"] += 1
+      return web.Response(status=503, text="injected error")
+
+    html = self.lookup(request.path)
+    if html is None:
+      self.counts["not_found"] += 1
+      return web.Response(status=404, text="not recorded")
+    return web.Response(text=html, content_type="text/html")
+
+  def make_app(self) -> web.Application:
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", self.handle)
+    return app
+
+
+def serve(port: int = 8765, **options):
+  """ReplayServerを起動する（終了するまで戻らない）"""
+  server = ReplayServer(**options)
+  web.run_app(server.make_app(), host="127.0.0.1", port=port, print=None)
+
+
+def main():
+  parser = argparse.ArgumentParser(description="保存済みページを返すローカルHTTPサーバー")
+  parser.add_argument("--fixtures", default=FIXTURES_DIR, help="保存済みページのディレクトリ")
+  parser.add_argument("--port", type=int, default=8765, help="待ち受けるポート")
+  parser.add_argument("--latency", type=float, default=0, help="各レスポンスの遅延（秒）")
+  parser.add_argument("--jitter", type=float, default=0, help="遅延に加えるランダムな揺らぎの上限（秒）")
+  parser.add_argument("--error-rate", type=float, default=0, help="503エラーを返す割合（0〜1）")
+  parser.add_argument("--seed", type=int, default=None, help="遅延・エラー注入の乱数シード")
+  parser.add_argument("--strict", action="store_true", help="記録に無いURLは代替せず404を返す")
+  args = parser.parse_args()
+
+  print(f"🌐 http://127.0.0.1:{args.port} で保存済みページを配信します "
+        f"(遅延 {args.latency}秒, エラー率 {args.error_rate})")
+  print(f"   例: python get_urls.py --base-url http://127.0.0.1:{args.port} --no-browser --interval 0")
+  serve(args.port, fixtures_dir=args.fixtures, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, seed=args.seed, strict=args.strict)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,202 @@
+import bisect
+import json
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+def index_path_for(output_file: str) -> str:
+  """評価結果ファイルに対応する索引ファイルのパス（例: xxx.json → xxx.index.json）"""
+  return os.path.splitext(output_file)[0] + ".index.json"
+
+
+def json_block(result: Dict) -> str:
+  """json.dump(results, indent=2) が出力する配列要素1件と同じ文字列"""
+  return "  " + json.dumps(result, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+
+
+def _file_key(path: str) -> Tuple[int, int]:
+  stat = os.stat(path)
+  return stat.st_size, stat.st_mtime_ns
+
+
+class RankedOutput:
+  """スコア順の評価結果を「ヘッダー + 1件ずつのブロック + フッター」で書くファイル
+
+  ブロックごとのバイト数（layout）を索引に残しておくと、次回は順位が変わった
+  位置から後ろだけを書き換えられる。変わっていないブロックは古いファイルから
+  そのまま切り出すので、再変換するのは再評価した植物の分だけ。
+  """
+
+  def __init__(self, path: str, header: str, block: Callable[[Dict], str],
+               separator: str = "", footer: str = "", empty: Optional[str] = None):
+    self.path = path
+    self.header = header.encode("utf-8")
+    self.block = block
+    self.separator = separator.encode("utf-8")
+    self.footer = footer.encode("utf-8")
+    self.empty = empty.encode("utf-8") if empty is not None else self.header + self.footer
+
+  def _layout(self, blocks: List[int]) -> Dict:
+    size, mtime_ns = _file_key(self.path)
+    return {"size": size, "mtime_ns": mtime_ns, "header": len(self.header), "blocks": blocks}
+
+  def matches(self, layout: Optional[Dict]) -> bool:
+    """ファイルが前回書いた時のまま（他のプログラムに書き換えられていない）か"""
+    if not layout or not os.path.exists(self.path):
+      return False
+    size, mtime_ns = _file_key(self.path)
+    return (layout["size"], layout["mtime_ns"], layout["header"]) == (
+        size, mtime_ns, len(self.header))
+
+  def write(self, results: List[Dict]) -> Dict:
+    """全件を書き出し、layout を返す（一時ファイルに書いてから置き換える）"""
+    blocks = [self.block(result).encode("utf-8") for result in results]
+    tmp_path = self.path + ".tmp"
+    with open(tmp_path, "wb") as f:
+      f.write(self.header + self.separator.join(blocks) + self.footer if blocks else self.empty)
+    os.replace(tmp_path, self.path)
+    return self._layout([len(block) for block in blocks])
+
+  def patch(self, layout: Dict, old_names: List[str], new_names: List[str],
+            changed: Dict[str, Dict], first_rank: int) -> Dict:
+    """first_rank 位以降だけを書き換え、新しい layout を返す
+
+    old_names / new_names は変更前後の順位順の植物名、changed は書き直す植物の評価結果。
+    first_rank より前の順位は変わっていないこと（ScoreIndex.update の戻り値）が前提。
+    """
+    if not old_names or not new_names:
+      # 前後どちらかが空なら全件が changed に含まれる
+      return self.write([changed[name] for name in new_names])
+    old_lengths = layout["blocks"]
+    sep = len(self.separator)
+    # first_rank - 1 位のブロックの直後（区切りの手前）から書き換える
+    offset = layout["header"] + sum(old_lengths[:first_rank]) + max(first_rank - 1, 0) * sep
+
+    with open(self.path, "r+b") as f:
+      f.seek(offset)
+      tail = f.read()
+      old_blocks = {}
+      pos = sep if 0 < first_rank < len(old_names) else 0
+      for rank in range(first_rank, len(old_names)):
+        length = old_lengths[rank]
+        old_blocks[old_names[rank]] = tail[pos:pos + length]
+        pos += length + sep
+
+      blocks = [self.block(changed[name]).encode("utf-8") if name in changed else old_blocks[name]
+                for name in new_names[first_rank:]]
+      lead = self.separator if first_rank > 0 and blocks else b""
+      f.seek(offset)
+      f.write(lead + self.separator.join(blocks) + self.footer)
+      f.truncate()
+    return self._layout(old_lengths[:first_rank] + [len(block) for block in blocks])
+
+
+class ScoreIndex:
+  """評価結果のスコア順の索引（ファイルに保存して次回の差分評価に使う）
+
+  (−スコア, 収集順, 植物名) のソート済みリストを二分探索で更新するので、
+  k 件の植物の出入りは O(k log n) の比較で済み、全件を並べ直さない。
+  順位は全件評価（収集順の安定ソート）と同じになる。
+  各植物の評価レベルも持つので、結果の集計は出力ファイルを読まずにできる。
+  """
+
+  def __init__(self, lexicon_version: Optional[str] = None):
+    self.lexicon_version = lexicon_version
+    self.entries: Dict[str, Tuple[float, str, int]] = {}
+    self.keys: List[Tuple[float, int, str]] = []
+    self.layouts: Dict[str, Dict] = {}
+
+  @classmethod
+  def from_results(cls, results: List[Dict], order: Dict[str, int],
+                   lexicon_version: Optional[str] = None) -> "ScoreIndex":
+    """スコア順の評価結果から作る（order は植物名 → 収集順）"""
+    index = cls(lexicon_version)
+    for result in results:
+      name = result["植物名"]
+      index.entries[name] = (result["スコア"], result["評価"], order.get(name, len(order)))
+    index.keys = sorted(index._key(name) for name in index.entries)
+    return index
+
+  def _key(self, name: str) -> Tuple[float, int, str]:
+    score, _, order = self.entries[name]
+    return (-score, order, name)
+
+  def __len__(self) -> int:
+    return len(self.keys)
+
+  def __contains__(self, name: str) -> bool:
+    return name in self.entries
+
+  def names(self) -> List[str]:
+    """順位順の植物名"""
+    return [key[2] for key in self.keys]
+
+  def _remove(self, name: str) -> int:
+    rank = bisect.bisect_left(self.keys, self._key(name))
+    del self.keys[rank]
+    del self.entries[name]
+    return rank
+
+  def update(self, results: Iterable[Dict], removed: Iterable[str] = (),
+             order: Optional[Dict[str, int]] = None) -> int:
+    """再評価した結果・削除した植物・収集順の変化を反映し、最初に順位が変わった位置を返す
+
+    order（現在の植物名 → 収集順）を渡すと、収集順が変わった植物も並べ直す。
+    何も変わらなければ len(self) を返す。
+    """
+    first_rank = len(self.keys)
+    for name in removed:
+      if name in self.entries:
+        first_rank = min(first_rank, self._remove(name))
+
+    moved = []
+    if order is not None:
+      moved = [name for name, (_, _, position) in self.entries.items()
+               if order.get(name, position) != position]
+    updates = {result["植物名"]: result for result in results}
+    for name in moved:
+      if name not in updates:
+        score, level, _ = self.entries[name]
+        updates[name] = {"植物名": name, "スコア": score, "評価": level}
+
+    for name, result in updates.items():
+      if name in self.entries:
+        first_rank = min(first_rank, self._remove(name))
+      position = order.get(name, len(order)) if order is not None else len(self.keys)
+      self.entries[name] = (result["スコア"], result["評価"], position)
+      key = self._key(name)
+      rank = bisect.bisect_left(self.keys, key)
+      self.keys.insert(rank, key)
+      first_rank = min(first_rank, rank)
+    return min(first_rank, len(self.keys))
+
+  def summary_results(self) -> List[Dict]:
+    """順位順の {"植物名", "評価", "スコア"}（集計・上位表示用）"""
+    return [{"植物名": name, "評価": self.entries[name][1], "スコア": self.entries[name][0]}
+            for name in self.names()]
+
+  def save(self, path: str):
+    data = {
+        "lexicon_version": self.lexicon_version,
+        "entries": [[name, *self.entries[name]] for name in self.names()],
+        "outputs": self.layouts,
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+      f.write(json.dumps(data, ensure_ascii=False))  # dump より速い（Cの実装で一度に変換）
+    os.replace(tmp_path, path)
+
+  @classmethod
+  def load(cls, path: str) -> Optional["ScoreIndex"]:
+    """保存した索引を読み込む（無い・壊れている場合は None）"""
+    try:
+      with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+      index = cls(data["lexicon_version"])
+      for name, score, level, order in data["entries"]:
+        index.entries[name] = (score, level, order)
+        index.keys.append((-score, order, name))
+      index.layouts = data["outputs"]
+    except (OSError, ValueError, KeyError, TypeError):
+      return None
+    return index
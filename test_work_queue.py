@@ -0,0 +1,115 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from work_queue import (LEASE_EXPIRED, FileWorkQueue, MemoryRedis, RedisWorkQueue,
+                        SqliteWorkQueue, make_item)
+
+# 借りた直後に期限が切れるリース（待たずに期限切れを起こす）
+EXPIRED = -1
+
+
+class WorkQueueCases:
+  """各方式に共通の確認。setUp で self.queue を max_attempts=3 で作る"""
+
+  def put_one(self) -> str:
+    self.assertEqual(self.queue.put([make_item("detail", "https://example.com/p1/")]), 1)
+    return make_item("detail", "https://example.com/p1/")["id"]
+
+  def test_put_is_idempotent(self):
+    self.put_one()
+    self.assertEqual(self.queue.put([make_item("detail", "https://example.com/p1/")]), 0)
+    self.assertEqual(self.queue.counts()["pending"], 1)
+
+  def test_ack_after_lease_expired_is_ignored(self):
+    self.put_one()
+    first = self.queue.lease("w1", visibility=EXPIRED)[0]
+    second = self.queue.lease("w2")[0]
+    self.assertFalse(self.queue.ack(first, {"by": "w1"}))
+    self.assertTrue(self.queue.ack(second, {"by": "w2"}))
+    done = list(self.queue.iter_items("done"))
+    self.assertEqual([item["result"]["by"] for item in done], ["w2"])
+
+  def test_nack_moves_to_dead_at_max_attempts(self):
+    self.put_one()
+    for attempt in range(1, 4):
+      lease = self.queue.lease("w")[0]
+      self.assertEqual(lease["attempts"], attempt)
+      self.assertTrue(self.queue.nack(lease, "timeout", "timeout"))
+    self.assertEqual(self.queue.lease("w"), [])
+    self.assertEqual(self.queue.counts()["dead"], 1)
+
+  def test_expired_lease_moves_to_dead_at_max_attempts(self):
+    item_id = self.put_one()
+    for attempt in range(1, 4):
+      leases = self.queue.lease("w", visibility=EXPIRED)
+      self.assertEqual([(lease["id"], lease["attempts"]) for lease in leases], [(item_id, attempt)])
+    # 3回借りられて一度も完了しなかった作業は、もう配らない
+    self.assertEqual(self.queue.lease("w"), [])
+    counts = self.queue.counts()
+    self.assertEqual((counts["pending"], counts["leased"], counts["dead"]), (0, 0, 1))
+    self.assertEqual(self.queue.unfinished(), 0)
+    dead = list(self.queue.iter_items("dead"))
+    self.assertEqual([(item["id"], item["attempts"], item["failure"]) for item in dead],
+                     [(item_id, 3, LEASE_EXPIRED)])
+
+  def test_counts_reaps_expired_leases(self):
+    self.put_one()
+    for _ in range(3):
+      self.queue.lease("w", visibility=EXPIRED)
+    # 次の lease を待たずに dead になる（ワーカーの終了判定が unfinished() で止まらない）
+    self.assertEqual(self.queue.unfinished(), 0)
+    self.assertEqual(self.queue.requeue_dead(), 1)
+    self.assertEqual(self.queue.lease("w")[0]["attempts"], 1)
+
+
+class SqliteWorkQueueTest(WorkQueueCases, unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.queue = SqliteWorkQueue(os.path.join(self.directory, "queue.db"), max_attempts=3)
+
+  def tearDown(self):
+    self.queue.close()
+    shutil.rmtree(self.directory)
+
+
+class FileWorkQueueTest(WorkQueueCases, unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.queue = FileWorkQueue(self.directory, max_attempts=3)
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def test_put_leaves_no_temporary_files(self):
+    item_id = self.put_one()
+    self.assertEqual(os.listdir(os.path.join(self.directory, "items")), [f"{item_id}.json"])
+
+  def test_unreadable_item_is_dead_not_raised(self):
+    # 内容を書く前に落ちた登録（空の items/<id>.json だけが残った状態）
+    item_id = make_item("detail", "https://example.com/p2/")["id"]
+    path = os.path.join(self.directory, "items", f"{item_id}.json")
+    open(path, "w").close()
+    os.utime(path, (0, 0))
+    self.assertEqual(self.queue.recover(), 1)
+    self.put_one()
+    leases = self.queue.lease("w", count=2)
+    self.assertEqual([lease["payload"]["url"] for lease in leases], ["https://example.com/p1/"])
+    counts = self.queue.counts()
+    self.assertEqual((counts["leased"], counts["dead"]), (1, 1))
+    with open(os.path.join(self.directory, "errors", f"{item_id}.json"), encoding="utf-8") as f:
+      self.assertEqual(json.load(f)["failure"], "unreadable")
+
+
+class MemoryRedisWorkQueueTest(WorkQueueCases, unittest.TestCase):
+
+  def setUp(self):
+    self.queue = RedisWorkQueue(MemoryRedis(), max_attempts=3)
+
+
+if __name__ == "__main__":
+  unittest.main()
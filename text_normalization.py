@@ -0,0 +1,77 @@
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable
+
+# 正規化の方式のバージョン（方式を変えたら上げる。キーワード辞書のバージョンに含まれる）
+NORMALIZATION_VERSION = "nfkc-1"
+
+# 正規化済みの段落を保持する最大件数（超えたら古いものから捨てる）
+CACHE_SIZE = 200_000
+
+# 段落をつなぐ文字（正規化後のテキストは連続する空白を含まないので、キーワードが段落をまたがない）
+PARAGRAPH_SEPARATOR = " "
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+  """照合用にテキストを正規化する
+
+  - NFKC（全角英数字・半角カナ・全角スペースなどの幅を統一。ﾌﾟﾗﾝﾀｰ → プランター）
+  - 英字は小文字
+  - 空白・改行の連続は1つの空白にまとめ、前後の空白は除く
+  キーワード辞書も同じ関数で正規化するので、表記の幅の違いに関係なく一致する。
+  """
+  return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text).lower()).strip()
+
+
+class ParagraphCache:
+  """段落 → 正規化済みの段落 のキャッシュ
+
+  キーは段落の文字列そのもの（辞書の検索は文字列のハッシュで行い、ハッシュ値は
+  文字列に保持されるので2回目以降は計算しない）。定型文のように多くの植物に
+  共通する段落や、同じ植物の再評価では正規化をやり直さない。
+  """
+
+  def __init__(self, max_size: int = CACHE_SIZE):
+    self.max_size = max_size
+    self._normalized: Dict[str, str] = {}
+    self._lock = threading.Lock()
+
+  def normalize(self, paragraph: str) -> str:
+    normalized = self._normalized.get(paragraph)
+    if normalized is None:
+      normalized = normalize_text(paragraph)
+      with self._lock:
+        if len(self._normalized) >= self.max_size:
+          # 挿入順の古いものから捨てる
+          del self._normalized[next(iter(self._normalized))]
+        self._normalized[paragraph] = normalized
+    return normalized
+
+  def prepare(self, texts: Iterable[str]) -> str:
+    """段落の列を、そのままマッチャーに渡せる1つの文字列にする（空の段落は除く）"""
+    normalize = self.normalize
+    return PARAGRAPH_SEPARATOR.join(
+        normalized for normalized in (normalize(text) for text in texts) if normalized)
+
+  def __len__(self) -> int:
+    return len(self._normalized)
+
+  def clear(self):
+    with self._lock:
+      self._normalized.clear()
+
+
+# プロセス内で共有するキャッシュ（プロセスプールの子プロセスはそれぞれが持つ）
+_cache = ParagraphCache()
+
+
+def prepare_text(texts: Iterable[str]) -> str:
+  """植物のテキスト一覧を正規化して照合用の1つの文字列にする（段落ごとにキャッシュ）"""
+  return _cache.prepare(texts)
+
+
+def get_paragraph_cache() -> ParagraphCache:
+  return _cache
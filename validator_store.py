@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+
+def content_hash(value) -> str:
+  """HTML文字列や段落リストのハッシュ値（SHA-256）を返す"""
+  if not isinstance(value, str):
+    value = json.dumps(value, ensure_ascii=False)
+  return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+class ValidatorStore:
+  """URLごとのETag/Last-Modifiedとコンテンツハッシュを保存する
+
+  条件付きリクエスト（If-None-Match / If-Modified-Since）に使い、
+  変更の無いページの再取得・再解析を省く。
+  """
+
+  def __init__(self, path: str):
+    self.path = path
+    self.entries: Dict[str, Dict] = {}
+    if os.path.exists(path):
+      with open(path, "r", encoding="utf-8") as f:
+        self.entries = json.load(f)
+
+  def __contains__(self, url: str) -> bool:
+    return url in self.entries
+
+  def conditional_headers(self, url: str) -> Dict[str, str]:
+    """保存済みの検証子から条件付きリクエスト用のヘッダーを作る"""
+    entry = self.entries.get(url, {})
+    headers = {}
+    if entry.get("etag"):
+      headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+      headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+  def get(self, url: str, key: str) -> Optional[str]:
+    return self.entries.get(url, {}).get(key)
+
+  def update(self, url: str, **values):
+    """URLの検証子・ハッシュを更新する（Noneの値は既存値を残す）"""
+    entry = self.entries.setdefault(url, {})
+    for key, value in values.items():
+      if value is not None:
+        entry[key] = value
+
+  def remove(self, urls: List[str]):
+    for url in urls:
+      self.entries.pop(url, None)
+
+  def save(self):
+    """一時ファイルに書いてから置き換える（書き込み途中の破損を防ぐ）"""
+    tmp_path = self.path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+      json.dump(self.entries, f, ensure_ascii=False)
+    os.replace(tmp_path, self.path)
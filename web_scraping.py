@@ -1,166 +1,409 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
-import time
+from functools import partial
+from typing import Dict, List, Optional
+import argparse
+import asyncio
 import json
+import logging
 import csv
+import os
 
-# Seleniumのオプション設定（画面表示なし）
-options = Options()
-options.add_argument('--headless')
-options.add_argument('--no-sandbox')
-options.add_argument('--disable-dev-shm-usage')
-# User-Agentを追加（重要）
-options.add_argument(
-    '--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-
-# ドライバー起動
-driver = webdriver.Chrome(service=Service(
-    ChromeDriverManager().install()), options=options)
-
-# --- CSVから読み込み ---
-plant_pages = []
-try:
-  with open("all_plants_urls.csv", newline='', encoding='utf-8') as f:
+from browser import BrowserPool
+from crawl_journal import CrawlJournal
+from dead_letters import DEFAULT_DEAD_LETTERS_PATH, DeadLetterList
+from dedup import canonicalize_url, changes_by_name, dedup_pages, display_names, load_detector
+from extraction import BACKENDS, get_extractor
+from fetch_engine import FetchEngine
+from fetch_policy import FetchPolicy
+from instrumentation import (add_logging_arguments, configure_logging, get_logger,
+                             print_stage_summary, write_summary)
+from politeness import PolitenessScheduler
+from readiness import ReadinessStats
+from plant_records import PlantRecordWriter
+from plant_store import DEFAULT_CHANGES_PATH, DEFAULT_DB_PATH, PlantStore
+from validator_store import ValidatorStore, content_hash
+
+logger = get_logger("web_scraping")
+
+# 詳細ページの描画完了とみなす要素
+BODY_READY_SELECTOR = "div.article__body"
+
+
+def load_plant_pages(csv_path: str) -> List[Dict]:
+  """CSVから (植物名, URL) の一覧を読み込む（URLは表記の揺れを除いた形にそろえる）"""
+  plant_pages = []
+  with open(csv_path, newline='', encoding='utf-8') as f:
     reader = csv.DictReader(f)
-    for row in reader:
-      plant_pages.append(row)
-  print(f" CSVファイルから {len(plant_pages)} 件のデータを読み込みました")
-except FileNotFoundError:
-  print("❌ all_plants_urls.csv ファイルが見つかりません")
-  driver.quit()
-  exit()
-
-# スクレイピング結果を保存する辞書
-scraped_data = {}
-
-# 各植物のページを順番にスクレイピング
-for i, row in enumerate(plant_pages):
-  # CSVのカラム名を確認して適切にアクセス
-  if 'plant_name' in row and 'url' in row:
-    plant_name = row['plant_name']
-    url = row['url']
-  elif 'name' in row and 'url' in row:
-    plant_name = row['name']
-    url = row['url']
-  else:
-    # CSVのカラム名が不明な場合、最初の2つのカラムを使用
-    keys = list(row.keys())
-    if len(keys) >= 2:
-      plant_name = row[keys[0]]
-      url = row[keys[1]]
-    else:
-      print(f"❌ 行 {i+1}: CSVの形式が正しくありません")
-      continue
+    for i, row in enumerate(reader):
+      # CSVのカラム名を確認して適切にアクセス
+      if 'plant_name' in row and 'url' in row:
+        plant_name = row['plant_name']
+        url = row['url']
+      elif 'name' in row and 'url' in row:
+        plant_name = row['name']
+        url = row['url']
+      else:
+        # CSVのカラム名が不明な場合、最初の2つのカラムを使用
+        keys = list(row.keys())
+        if len(keys) >= 2:
+          plant_name = row[keys[0]]
+          url = row[keys[1]]
+        else:
+          print(f"❌ 行 {i+1}: CSVの形式が正しくありません")
+          continue
+      plant_pages.append({"name": plant_name, "url": canonicalize_url(url),
+                          "category": row.get("category")})
+  return plant_pages
+
+
+def extract_plant_content(html: str, parser: str = "auto") -> List[str]:
+  """ページのHTMLから見出し・段落のテキストを抽出する"""
+  detail = get_extractor(parser).extract_detail(html)
+
+  # デバッグ: 基本情報を確認
+  logger.debug("ページタイトル: %s / HTML全体のサイズ: %d 文字 / 本文の要素: %s",
+               detail['title'] or 'なし', len(html), detail['selector'] or 'なし')
+
+  return detail["texts"]
+
+
+def needs_browser(html: str, parser: str = "auto") -> bool:
+  """静的HTMLに本文要素が無く、JavaScriptでの描画が必要そうか判定する"""
+  return get_extractor(parser).extract_detail(html)["selector"] is None
 
-  print(f"\n{'='*50}")
-  print(f"🌱 {plant_name} のスクレイピング開始 ({i+1}/{len(plant_pages)})")
-  print(f"URL: {url}")
-  print(f"{'='*50}")
+
+async def scrape_all(plant_pages: List[Dict],
+                     journal: CrawlJournal,
+                     validators: ValidatorStore,
+                     incremental: bool = False,
+                     per_host_limit: int = 4,
+                     request_interval: float = 0,
+                     jitter: float = 0,
+                     ready_timeout: float = 10,
+                     browsers: int = 1,
+                     base_url: Optional[str] = None,
+                     use_browser: bool = True,
+                     parser: str = "auto",
+                     duplicate_urls: Optional[Dict[str, str]] = None,
+                     policy: Optional[FetchPolicy] = None,
+                     dead_letters: Optional[DeadLetterList] = None,
+                     replay: bool = False) -> Dict[str, List[str]]:
+  """植物ページを並行取得し、変更一覧（種類 → URLの一覧）を返す
+
+  取得結果は1件ごとにクロール記録へ追記する。通常は取得済みのURLをスキップし、
+  incremental=True の場合は全URLへ条件付きリクエストを送り、内容が変わった
+  ページだけを再解析・記録する。
+  duplicate_urls（前回までに他のページと同じ内容と判定されたURL）は取得しない。
+  再試行しても取得・解析できなかったページと本文が空のページは dead_letters に記録し、
+  replay=True ならその一覧のページだけを取得し直す。
+  """
+  duplicate_urls = duplicate_urls or {}
+  dead_letters = dead_letters if dead_letters is not None else DeadLetterList(None)
+  replay_urls = {entry["url"] for entry in dead_letters.list("detail")} if replay else None
+  pending_urls = []
+  seen_urls = set()
+  for page in plant_pages:
+    url = page["url"]
+    wanted = url in replay_urls if replay else (incremental or not journal.is_done(url))
+    if wanted and url not in seen_urls and url not in duplicate_urls:
+      pending_urls.append(url)
+    seen_urls.add(url)
+  names = display_names(plant_pages)
+  print(f"取得済み: {len(seen_urls) - len(pending_urls)}件 / 取得対象: {len(pending_urls)}件"
+        + (f"（重複ページ {len(duplicate_urls)}件を除く）" if duplicate_urls else ""))
+
+  def headers_for(url: str) -> Dict[str, str]:
+    """本文を取得済みのページだけ条件付きリクエストにする
+
+    304 では本文が返らないため、未取得・空・失敗のページに送ると空のページとして記録してしまう。
+    """
+    return validators.conditional_headers(url) if journal.is_done(url) else {}
+
+  changes = {"new": [], "changed": [], "unchanged": [], "removed": [], "failed": []}
+  stats = ReadinessStats()
+  browser_fetch = (BrowserPool(BODY_READY_SELECTOR, ready_timeout, stats, size=browsers)
+                   if use_browser and pending_urls else None)
 
   try:
-    # ページにアクセス
-    driver.get(url)
-
-    # JavaScript読み込みの待機
-    time.sleep(5)
-
-    # ページのHTMLを取得
-    html = driver.page_source
-    soup = BeautifulSoup(html, "html.parser")
-
-    # デバッグ: 基本情報を確認
-    print(f"ページタイトル: {soup.title.string if soup.title else 'なし'}")
-    print(f"HTML全体のサイズ: {len(html)} 文字")
-
-    # セレクターを確認
-    body = soup.find_all("div", class_="article__body")
-    print(f"article__body クラスの要素数: {len(body)}")
-
-    if len(body) == 0:
-      print("代替セレクターを試しています...")
-      # 他の可能性のあるセレクターを試す
-      alternative_selectors = [
-          ("div", "single__section__body"),
-          ("div", "entry-content"),
-          ("div", "post-content"),
-          ("div", "content"),
-          ("article", None),
-          ("main", None),
-      ]
-
-      for tag, class_name in alternative_selectors:
-        if class_name:
-          elements = soup.find_all(tag, class_=class_name)
+    async with FetchEngine(per_host_limit=per_host_limit,
+                           scheduler=PolitenessScheduler(request_interval, jitter),
+                           stats=stats,
+                           base_url=base_url,
+                           browser_fetch=browser_fetch,
+                           needs_browser=partial(needs_browser, parser=parser),
+                           policy=policy) as engine:
+      done = 0
+      async for result in engine.fetch_all(pending_urls, headers_for):
+        done += 1
+        url = result["url"]
+        name = names[url]
+        known = journal.is_done(url)
+        logger.debug("🌱 %s 取得完了 (%d/%d) [%s] %s", name, done, len(pending_urls),
+                     result['via'], url)
+        if done % 50 == 0 or done == len(pending_urls):
+          logger.info("🔄 取得 %d/%d 件", done, len(pending_urls))
+
+        if result["error"]:
+          logger.warning("❌ %s のスクレイピング中にエラーが発生 (%s, %d回試行): %s", url,
+                         result['failure'], result['attempts'], result['error'])
+          changes["failed"].append(url)
+          dead_letters.add(url, "detail", result["failure"], result["error"],
+                           status=result["status"], attempts=result["attempts"], name=name)
+          # 以前に取得できている内容は失敗で上書きしない
+          if not known:
+            journal.record(url, name, [], error=result["error"])
+          continue
+
+        validators.update(url, etag=result["etag"], last_modified=result["last_modified"])
+
+        # 304 Not Modified、またはHTMLが前回と同一なら解析を省略
+        html_hash = content_hash(result["html"]) if not result["not_modified"] else None
+        if known and (result["not_modified"] or html_hash == validators.get(url, "html_hash")):
+          logger.debug("⏭️ %s: 変更なし（解析をスキップ）", name)
+          changes["unchanged"].append(url)
+          dead_letters.resolve(url)
+          continue
+
+        try:
+          content = extract_plant_content(result["html"], parser)
+        except Exception as e:
+          logger.warning("❌ %s の解析中にエラーが発生: %s", url, e)
+          changes["failed"].append(url)
+          dead_letters.add(url, "detail", "parse", f"解析エラー: {e}",
+                           status=result["status"], attempts=result["attempts"], name=name)
+          if not known:
+            journal.record(url, name, [], error=f"解析エラー: {e}")
+          continue
+
+        validators.update(url, html_hash=html_hash, content_hash=content_hash(content))
+        if not known:
+          changes["new"].append(url)
+        elif content_hash(content) == content_hash(journal.content(url)):
+          # HTMLは変わったが本文は同じ（広告・日付などの差分）
+          logger.debug("⏭️ %s: 本文に変更なし", name)
+          changes["unchanged"].append(url)
+          dead_letters.resolve(url)
+          continue
+        else:
+          changes["changed"].append(url)
+
+        journal.record(url, name, content)
+        if content:
+          logger.debug("✅ %s: %d 個のテキスト要素を取得", name, len(content))
+          dead_letters.resolve(url)
         else:
-          elements = soup.find_all(tag)
-
-        if elements:
-          for elem in elements:
-            paragraphs = elem.find_all("p")
-            if paragraphs:
-              print(
-                  f"✅ {tag}.{class_name if class_name else 'なし'}: {len(paragraphs)} 個の段落を発見")
-              body = elements  # 見つかったら使用
-              break
-          if body:
-            break
-
-    # テキスト抽出
-    plant_content = []
-    text_found = False
-
-    for section in body:
-      for elem in section.find_all(["h2", "h3", "p"]):
-        text = elem.get_text().strip()
-        if text:
-          plant_content.append(text)
-          text_found = True
-
-    if text_found:
-      print(f"✅ {plant_name}: {len(plant_content)} 個のテキスト要素を取得")
-      scraped_data[plant_name] = plant_content
-
-    else:
-      print(f"❌ {plant_name}: テキストが見つかりませんでした")
-      scraped_data[plant_name] = []
-
-      # 全てのpタグを確認
-      all_p_tags = soup.find_all("p")
-      if all_p_tags:
-        print(f"ページ内の全pタグ数: {len(all_p_tags)}")
-        for j, p in enumerate(all_p_tags[:3]):
-          text = p.get_text().strip()
-          if text:
-            print(f"p{j+1}: {text[:100]}...")
-
-  except Exception as e:
-    print(f"❌ {plant_name} のスクレイピング中にエラーが発生: {str(e)}")
-    scraped_data[plant_name] = []
-
-  # 次のページへのアクセス間隔を設ける
-  time.sleep(2)
-
-# ドライバー終了
-driver.quit()
-
-# 結果をまとめて表示
-print(f"\n{'='*60}")
-print("スクレイピング結果まとめ")
-print(f"{'='*60}")
-
-for plant_name, content in scraped_data.items():
-  print(f"\n🌱 {plant_name}:")
-  print(f"   取得したテキスト数: {len(content)}")
+          logger.warning("❌ %s: テキストが見つかりませんでした", name)
+          dead_letters.add(url, "detail", "empty", "本文が見つかりません",
+                           status=result["status"], attempts=result["attempts"], name=name)
+  finally:
+    if browser_fetch:
+      browser_fetch.close()
+
+  stats.print_summary()
+
+  # 前回まで取得していたがCSVから消えたページ
+  removed_urls = [url for url in validators.entries if url not in seen_urls]
+  changes["removed"] = [url for url in removed_urls if url in journal.entries]
+  validators.remove(removed_urls)
+  for entry in dead_letters.list("detail"):
+    if entry["url"] not in seen_urls:
+      dead_letters.resolve(entry["url"])
+
+  return changes
+
+
+def iter_scraped_records(plant_pages: List[Dict], journal: CrawlJournal,
+                         duplicate_urls: Optional[Dict[str, str]] = None):
+  """CSVの順番で (植物名, テキスト一覧) をクロール記録から1件ずつ返す
+
+  別のURLの植物に同じ名前がある場合は URL の末尾を付けた名前で区別し、
+  上書きし合わないようにする。duplicate_urls に含まれる重複ページは返さない。
+  """
+  duplicate_urls = duplicate_urls or {}
+  # 評価（PlantStore）と同じく、重複ページを除いてから表示名を付ける
+  names = display_names(page for page in plant_pages if page["url"] not in duplicate_urls)
+  written = set()
+  for page in plant_pages:
+    url = page["url"]
+    if url not in written and url not in duplicate_urls:
+      written.add(url)
+      yield names[url], journal.content(url)
+
+
+def iter_store_pages(plant_pages: List[Dict], journal: CrawlJournal):
+  """クロール記録の結果をデータベースに書き込む形 (url, status, texts, ...) で返す"""
+  seen = set()
+  for page in plant_pages:
+    url = page["url"]
+    entry = journal.entries.get(url)
+    if entry is None or url in seen:
+      continue
+    seen.add(url)
+    texts = journal.content(url) if entry["status"] == "ok" else []
+    yield {"url": url, "status": entry["status"], "error": entry["error"], "texts": texts,
+           "content_hash": content_hash(texts)}
+
+
+def print_plant_summary(plant_name: str, content: List[str]):
+  """植物ごとの取得結果（--log-level DEBUG の時だけ表示）"""
+  if not logger.isEnabledFor(logging.DEBUG):
+    return
+  logger.debug("🌱 %s: 取得したテキスト数 %d", plant_name, len(content))
   if content:
-    print(f"   最初のテキスト: {content[0][:100]}...")
+    logger.debug("   最初のテキスト: %s...", content[0][:100])
+  else:
+    logger.debug("   ❌ テキストが取得できませんでした")
+
+
+def main():
+  parser = argparse.ArgumentParser(description="植物詳細ページのスクレイピング")
+  parser.add_argument("--db", default=DEFAULT_DB_PATH,
+                      help="URL一覧を読み込み、本文を保存するデータベース")
+  parser.add_argument("--csv", default=None,
+                      help="URL一覧をデータベースではなくCSVから読み込む（データベースにも取り込む）")
+  parser.add_argument("--output", default=None,
+                      help="ファイルにも書き出す場合の出力先（.jsonl: 1行1植物 / .json: 従来形式）")
+  parser.add_argument("--concurrency", type=int, default=4, help="ホストごとの同時接続数")
+  parser.add_argument("--interval", type=float, default=0.5,
+                      help="同一ホストへのリクエスト間隔（秒）")
+  parser.add_argument("--jitter", type=float, default=0,
+                      help="リクエスト間隔に加えるランダムな揺らぎの上限（秒）")
+  parser.add_argument("--ready-timeout", type=float, default=10,
+                      help="ブラウザで本文の描画を待つ最大秒数")
+  parser.add_argument("--browsers", type=int, default=1,
+                      help="JavaScriptが必要なページに使うブラウザのセッション数")
+  parser.add_argument("--base-url", default=None,
+                      help="取得先を差し替えるベースURL（例: http://localhost:8000）")
+  parser.add_argument("--no-browser", action="store_true",
+                      help="JavaScriptが必要なページでもブラウザを使わない")
+  parser.add_argument("--journal", default="crawl_journal.jsonl",
+                      help="途中結果を記録するクロール記録ファイル")
+  parser.add_argument("--restart", action="store_true",
+                      help="クロール記録を破棄して最初から取得し直す")
+  parser.add_argument("--incremental", action="store_true",
+                      help="全ページに条件付きリクエストを送り、変更されたページだけ更新する")
+  parser.add_argument("--validators", default="crawl_validators.json",
+                      help="ETag/Last-Modified・コンテンツハッシュの保存先")
+  parser.add_argument("--changes", default=DEFAULT_CHANGES_PATH,
+                      help="変更一覧（新規・変更・削除）の出力先")
+  parser.add_argument("--parser", default="auto", choices=["auto"] + list(BACKENDS),
+                      help="HTMLの抽出方式（auto は基準の bs4。速い方式は壊れたHTMLで結果が異なることがある）")
+  parser.add_argument("--rate", type=float, default=None,
+                      help="同一ホストへの1秒あたりのリクエスト数の上限（トークンバケット）")
+  parser.add_argument("--burst", type=int, default=1, help="--rate の上限を超えて連続で送れる数")
+  parser.add_argument("--retries", type=int, default=3,
+                      help="タイムアウト・429・5xxなどの再試行回数")
+  parser.add_argument("--dead-letters", default=DEFAULT_DEAD_LETTERS_PATH,
+                      help="取得・解析に失敗したページ・本文が空のページの一覧")
+  parser.add_argument("--replay-dead-letters", action="store_true",
+                      help="失敗したページの一覧にある植物ページだけを取得し直す")
+  add_logging_arguments(parser)
+  args = parser.parse_args()
+  configure_logging(args.log_level)
+
+  # --- URL一覧を読み込み ---
+  store = PlantStore(args.db)
+  if args.csv:
+    try:
+      plant_pages = load_plant_pages(args.csv)
+    except FileNotFoundError:
+      print(f"❌ {args.csv} ファイルが見つかりません")
+      store.close()
+      return
+    store.upsert_urls(plant_pages)
+    print(f" CSVファイルから {len(plant_pages)} 件のデータを読み込みました")
   else:
-    print("   ❌ テキストが取得できませんでした")
+    plant_pages = store.list_urls()
+    print(f" {args.db} から {len(plant_pages)} 件のURLを読み込みました")
+    if not plant_pages:
+      print("❌ URLがありません。先に get_urls.py を実行してください")
+      store.close()
+      return
+
+  if args.restart:
+    for path in (args.journal, args.validators):
+      if os.path.exists(path):
+        os.remove(path)
+    store.clear_duplicates()
+
+  journal = CrawlJournal(args.journal)
+  validators = ValidatorStore(args.validators)
+  dead_letters = DeadLetterList(args.dead_letters)
+  if args.replay_dead_letters:
+    print(f"🔁 {args.dead_letters} の植物ページ {len(dead_letters.list('detail'))}件を取得し直します")
+  try:
+    changes = asyncio.run(scrape_all(
+        plant_pages,
+        journal,
+        validators,
+        incremental=args.incremental,
+        per_host_limit=args.concurrency,
+        request_interval=args.interval,
+        jitter=args.jitter,
+        ready_timeout=args.ready_timeout,
+        browsers=args.browsers,
+        base_url=args.base_url,
+        use_browser=not args.no_browser,
+        parser=args.parser,
+        duplicate_urls=store.duplicate_urls(),
+        policy=FetchPolicy(rate=args.rate, burst=args.burst, retries=args.retries),
+        dead_letters=dead_letters,
+        replay=args.replay_dead_letters))
+
+    print(f"\nクロール記録 ({args.journal}): {journal.status_counts()}")
+    print(f"変更状況: 変更なし {len(changes['unchanged'])}件, 変更 {len(changes['changed'])}件, "
+          f"新規 {len(changes['new'])}件, 削除 {len(changes['removed'])}件, 失敗 {len(changes['failed'])}件")
+    failed_pages = dead_letters.list("detail")
+    if failed_pages:
+      print(f"⚠️ 取得・解析できなかった・本文が空の植物ページ: {len(failed_pages)}件 "
+            f"({dead_letters.kind_counts('detail')})")
+      print(f"   {args.dead_letters} に記録しました。python web_scraping.py --replay-dead-letters で取得し直せます")
+
+    # 結果をまとめて表示
+    print(f"\n{'='*60}")
+    print("スクレイピング結果まとめ")
+    print(f"{'='*60}")
+
+    # 本文をデータベースにまとめて書き込む（内容が変わったページだけ書き換える）
+    # 既存の代表ページと同じ・ほぼ同じ本文のページは重複として記録し、評価の対象から外す
+    detector = load_detector(store)
+    counts = store.write_pages(dedup_pages(iter_store_pages(plant_pages, journal), detector))
+    duplicate_urls = store.duplicate_urls()
+    # 再評価が必要な植物の一覧を保存（Growability_Assessmentで利用）
+    # 重複の判定を書き込んだ後に、評価と同じ表示名（重複ページを除いて付けた名前）にする
+    fallback_names = {url: entry["name"] for url, entry in journal.entries.items()}
+    fallback_names.update((page["url"], page["name"]) for page in plant_pages)
+    changes = changes_by_name(changes, store.display_names(), fallback_names)
+    with open(args.changes, "w", encoding="utf-8") as f:
+      json.dump(changes, f, ensure_ascii=False, indent=2)
+    print(f"💾 {args.db}: 本文を更新 {counts['written']}件, 変更なし {counts['unchanged']}件, "
+          f"重複 {counts['duplicates']}件（完全一致 {detector.counts['exact']}件, "
+          f"類似 {detector.counts['near']}件）")
+
+    if logger.isEnabledFor(logging.DEBUG):
+      for plant_name, content in iter_scraped_records(plant_pages, journal, duplicate_urls):
+        print_plant_summary(plant_name, content)
+
+    if args.output and args.output.endswith(".jsonl"):
+      # 1植物ずつクロール記録から読み出して書き出す（全件をメモリに持たない）
+      with PlantRecordWriter(args.output) as writer:
+        for plant_name, content in iter_scraped_records(plant_pages, journal, duplicate_urls):
+          writer.write(plant_name, content)
+    elif args.output:
+      scraped_data = dict(iter_scraped_records(plant_pages, journal, duplicate_urls))
+      with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(scraped_data, f, ensure_ascii=False, indent=2)
+  finally:
+    journal.close()
+    validators.save()
+    dead_letters.save()
+    store.close()
+
+  print(f"\n✅ 完了：{args.output or args.db} に保存されました")
+  print_stage_summary()
+  if args.metrics:
+    write_summary(args.metrics, {"script": "web_scraping", "changes": {
+        kind: len(names) for kind, names in changes.items()}})
 
-# JSONとして保存
-with open("all_plants_data.json", "w", encoding="utf-8") as f:
-  json.dump(scraped_data, f, ensure_ascii=False, indent=2)
 
-print("\n✅ 完了：all_plant_data.json に保存されました")
+if __name__ == "__main__":
+  main()
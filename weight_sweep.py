@@ -0,0 +1,214 @@
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+from scipy import stats
+
+from Growability_Assessment import LEVEL_THRESHOLDS, LOWEST_LEVEL, get_keyword_matcher
+from keyword_matcher import KeywordMatcher
+from keyword_matrix import (KeywordMatrix, get_keyword_matrix, iter_corpus_records,
+                            normalize_weights)
+from plant_store import DEFAULT_DB_PATH
+from text_normalization import normalize_text
+
+LEVELS = [level for _, level in LEVEL_THRESHOLDS] + [LOWEST_LEVEL]
+
+
+def baseline_weights() -> Dict[str, float]:
+  """現在のキーワード辞書の重み"""
+  matcher = get_keyword_matcher()
+  return dict(zip(matcher.keywords, matcher.weights))
+
+
+def resolve_config(config: Dict, base: Dict[str, float]) -> Dict[str, float]:
+  """設定から キーワード → 重み の辞書を作る
+
+  - weights: 重みの辞書をそのまま使う（基準を置き換える）
+  - scale: {"easy": 倍率, "hard": 倍率, "3.0": 倍率, ...} で基準の重みを段ごとに拡大・縮小。
+    段は元の重みで選び、1つのキーワードには1つの倍率だけを掛ける（段の指定が easy / hard より優先）
+  - overrides: 個別キーワードの重みを上書き・追加
+  - remove: 使わないキーワードの一覧
+  キーワードは辞書ファイルと同じく normalize_text() で正規化してから照合する。
+  """
+  weights = normalize_weights(config["weights"]) if "weights" in config else dict(base)
+  scale = config.get("scale", {})
+  tiers = {float(key): factor for key, factor in scale.items() if key not in ("easy", "hard")}
+  for keyword, weight in weights.items():
+    if weight in tiers:
+      weights[keyword] = weight * tiers[weight]
+    elif weight > 0 and "easy" in scale:
+      weights[keyword] = weight * scale["easy"]
+    elif weight < 0 and "hard" in scale:
+      weights[keyword] = weight * scale["hard"]
+  weights.update(normalize_weights(config.get("overrides", {})))
+  for keyword in config.get("remove", []):
+    weights.pop(normalize_text(keyword), None)
+  return weights
+
+
+def tier_grid(base: Dict[str, float], factors: List[float]) -> List[Dict]:
+  """基準の重みの段（±1, ±2, ±3 など）ごとに倍率を掛けた全組み合わせの設定"""
+  tiers = sorted({weight for weight in base.values()}, reverse=True)
+  configs = []
+  for combination in itertools.product(factors, repeat=len(tiers)):
+    name = " ".join(f"{tier:+g}x{factor:g}" for tier, factor in zip(tiers, combination))
+    configs.append({"name": name, "scale": {str(tier): factor
+                                            for tier, factor in zip(tiers, combination)}})
+  return configs
+
+
+def level_counts(scores: np.ndarray) -> Dict[str, int]:
+  """score_to_level と同じ区切りで評価レベルごとの件数を数える"""
+  counts = {}
+  remaining = np.ones(len(scores), dtype=bool)
+  for threshold, level in LEVEL_THRESHOLDS:
+    hit = remaining & (scores >= threshold)
+    counts[level] = int(hit.sum())
+    remaining &= ~hit
+  counts[LOWEST_LEVEL] = int(remaining.sum())
+  return counts
+
+
+def _level_index(scores: np.ndarray) -> np.ndarray:
+  index = np.full(len(scores), len(LEVEL_THRESHOLDS))
+  for i, (threshold, _) in reversed(list(enumerate(LEVEL_THRESHOLDS))):
+    index[scores >= threshold] = i
+  return index
+
+
+def _ranking(scores: np.ndarray) -> np.ndarray:
+  """assess_all_plants と同じ並び（小数1桁に丸めたスコアの降順、同点は元の順）"""
+  return np.argsort(-np.round(scores, 1), kind="stable")
+
+
+def evaluate_scores(scores: np.ndarray, baseline: np.ndarray, top: int = 10) -> Dict:
+  """1つの設定のスコア分布・レベル別件数・基準との順位の違い"""
+  tau = stats.kendalltau(baseline, scores).statistic if len(scores) > 1 else 1.0
+  base_top = set(_ranking(baseline)[:top].tolist())
+  top_overlap = len(base_top & set(_ranking(scores)[:top].tolist()))
+  return {
+      "mean": float(scores.mean()) if len(scores) else 0.0,
+      "std": float(scores.std()) if len(scores) else 0.0,
+      "min": float(scores.min()) if len(scores) else 0.0,
+      "p50": float(np.percentile(scores, 50)) if len(scores) else 0.0,
+      "max": float(scores.max()) if len(scores) else 0.0,
+      "levels": level_counts(scores),
+      "kendall_tau": None if np.isnan(tau) else float(tau),
+      "level_changes": int((_level_index(scores) != _level_index(baseline)).sum()),
+      f"top{top}_overlap": top_overlap,
+  }
+
+
+def _evaluate_chunk(args) -> List[Dict]:
+  """ワーカープロセスで設定のまとまり（スコア行列の列）を評価する"""
+  scores, baseline, top = args
+  return [evaluate_scores(scores[:, i], baseline, top) for i in range(scores.shape[1])]
+
+
+def sweep(matrix: KeywordMatrix, configs: List[Dict], workers: int = 1,
+          top: int = 10, chunk_size: int = 64) -> List[Dict]:
+  """全設定を一括評価する
+
+  各設定の重みを並べた行列と出現行列の積で全設定のスコアを1回で求め、
+  分布・順位の比較は workers>1 ならプロセスプールで並列に計算する。
+  """
+  base = baseline_weights()
+  weight_matrix = np.column_stack(
+      [matrix.weight_vector(base)] +
+      [matrix.weight_vector(resolve_config(config, base)) for config in configs])
+  all_scores = matrix.scores(weight_matrix)
+  baseline, scores = all_scores[:, 0], all_scores[:, 1:]
+
+  chunks = [(scores[:, i:i + chunk_size], baseline, top)
+            for i in range(0, scores.shape[1], chunk_size)]
+  if workers > 1 and len(chunks) > 1:
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+      evaluations = [result for chunk in executor.map(_evaluate_chunk, chunks) for result in chunk]
+  else:
+    evaluations = [result for chunk in map(_evaluate_chunk, chunks) for result in chunk]
+
+  return [dict(evaluation, name=config.get("name", f"config{i + 1}"))
+          for i, (config, evaluation) in enumerate(zip(configs, evaluations))]
+
+
+def prepare_matrix(corpus_path: str, configs: List[Dict]) -> KeywordMatrix:
+  """全設定のキーワードを数えられる行列を用意する
+
+  既存の辞書に無いキーワードを使う設定がある場合だけ、
+  それらを加えた行列を作り直す（保存はしない）。キーワードは正規化してから比べる。
+  """
+  base = baseline_weights()
+  extra = []
+  for config in configs:
+    for keyword in (list(normalize_weights(config.get("weights", {}))) +
+                    list(normalize_weights(config.get("overrides", {})))):
+      if keyword not in base and keyword not in extra:
+        extra.append(keyword)
+  if not extra:
+    return get_keyword_matrix(corpus_path)
+
+  print(f"🔄 辞書に無いキーワード {len(extra)}語を含めて行列を作成します")
+  matcher = KeywordMatcher(list(base.items()) + [(keyword, 0.0) for keyword in extra])
+  return KeywordMatrix.build(iter_corpus_records(corpus_path), matcher=matcher)
+
+
+def print_sweep(results: List[Dict], top: int = 10, limit: Optional[int] = None):
+  print(f"\n{'設定':<40}{'平均':>6}{'標準偏差':>8}  " +
+        "".join(f"{level:>10}" for level in LEVELS) +
+        f"{'tau':>7}{'レベル変化':>10}{f'TOP{top}一致':>10}")
+  for result in results[:limit]:
+    tau = "-" if result["kendall_tau"] is None else f"{result['kendall_tau']:.3f}"
+    print(f"{result['name'][:40]:<40}{result['mean']:>6.2f}{result['std']:>8.2f}  " +
+          "".join(f"{result['levels'][level]:>10}" for level in LEVELS) +
+          f"{tau:>7}{result['level_changes']:>10}{result[f'top{top}_overlap']:>10}")
+
+
+def main():
+  parser = argparse.ArgumentParser(description="キーワードの重み・辞書の候補を一括比較する")
+  parser.add_argument("--input", default=DEFAULT_DB_PATH, help="植物データ（.db / .jsonl / .json）")
+  parser.add_argument("--configs", default=None,
+                      help='候補の設定ファイル（JSON: {"configs": [{"name", "weights"|"scale"|"overrides"|"remove"}]}）')
+  parser.add_argument("--grid", default=None,
+                      help="重みの段ごとに掛ける倍率の候補（例: 0.5,1,1.5）。全組み合わせを評価する")
+  parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="並列に使うプロセス数")
+  parser.add_argument("--top", type=int, default=10, help="上位何件の一致を比べるか")
+  parser.add_argument("--sort", choices=["none", "tau", "mean", "level_changes"], default="none",
+                      help="表示の並び順")
+  parser.add_argument("--limit", type=int, default=50, help="表示する設定の数")
+  parser.add_argument("--output", default="weight_sweep_results.json", help="全設定の結果の保存先")
+  args = parser.parse_args()
+
+  configs = []
+  if args.configs:
+    with open(args.configs, encoding="utf-8") as f:
+      configs.extend(json.load(f)["configs"])
+  if args.grid:
+    configs.extend(tier_grid(baseline_weights(), [float(x) for x in args.grid.split(",")]))
+  if not configs:
+    parser.error("--configs か --grid を指定してください")
+
+  matrix = prepare_matrix(args.input, configs)
+  start = time.perf_counter()
+  results = sweep(matrix, configs, workers=args.workers, top=args.top)
+  print(f"⏱️ {len(configs)}通りの設定 × {len(matrix.names)}件の植物を "
+        f"{time.perf_counter() - start:.2f}秒で評価しました")
+
+  baseline = sweep(matrix, [{"name": "基準（現在の辞書）"}], top=args.top)
+  if args.sort == "tau":
+    results.sort(key=lambda r: -1 if r["kendall_tau"] is None else r["kendall_tau"], reverse=True)
+  elif args.sort != "none":
+    results.sort(key=lambda r: r[args.sort], reverse=(args.sort == "mean"))
+  print_sweep(baseline + results, args.top, args.limit and args.limit + 1)
+
+  with open(args.output, "w", encoding="utf-8") as f:
+    json.dump({"baseline": baseline[0], "results": results}, f, ensure_ascii=False, indent=2)
+  print(f"\n✅ 全{len(results)}件の結果を保存しました: {args.output}")
+
+
+if __name__ == "__main__":
+  main()
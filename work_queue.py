@@ -0,0 +1,863 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# 何回リースしても完了しなかった作業を dead にする回数（nack でもリースの期限切れでも数える）
+DEFAULT_MAX_ATTEMPTS = 3
+# リースの既定の有効期間（秒）。この間に ack / extend しないと他のワーカーに渡る
+DEFAULT_VISIBILITY = 120
+
+STATES = ("pending", "leased", "done", "dead")
+
+# リースの期限が切れたまま max_attempts に達した作業の失敗（ワーカーが落ちる・止まるページ）
+LEASE_EXPIRED = "lease_expired"
+LEASE_EXPIRED_ERROR = "処理中にリースの期限が切れたまま試行回数の上限に達しました"
+
+# recover() で拾う作業の最短の経過時間（秒）。登録の途中の作業を拾わないための猶予
+RECOVER_GRACE = 60
+
+
+def work_id(kind: str, url: str) -> str:
+  """作業の識別子（同じ種類・URLの作業は何度 put しても1つ）"""
+  return hashlib.sha1(f"{kind}\n{url}".encode("utf-8")).hexdigest()[:20]
+
+
+def make_item(kind: str, url: str, **payload) -> Dict:
+  """put に渡す作業 {"id", "kind", "payload"}（payload には url も入る）"""
+  return {"id": work_id(kind, url), "kind": kind, "payload": {"url": url, **payload}}
+
+
+class WorkQueue:
+  """リースと確認応答（ack）を持つ作業キューの共通部分
+
+  - put: 作業を登録する。同じ id の作業は1回しか登録されない（冪等）
+  - lease: 作業を visibility 秒のリースで取り出す。期限内に ack / nack / extend が
+    無ければ（ワーカーが落ちた等）他のワーカーに渡る。取り出すたびに attempts が増える
+  - ack: 結果を報告して完了にする。リースが切れて他のワーカーに渡った後の ack は
+    token が一致しないので無視され（False）、同じ作業の結果が二重に記録されることはない
+  - nack: 失敗を報告する。attempts が max_attempts 未満なら待ちに戻し、そうでなければ dead
+  - 期限切れのリースも同じく、attempts が max_attempts に達していれば待ちに戻さず dead にする
+    （ワーカーを落とす・止めるページを何度も配らない）。lease / counts の時に回収する
+  - recover: 登録の途中でプロセスが落ちて、どの状態にも入らなかった作業を待ちに戻す
+  各方式は _put / lease / extend / ack / nack / counts / iter_items / requeue_dead / clear を実装する。
+  リースは {"id", "kind", "payload", "token", "attempts"}。
+  """
+
+  name = ""
+
+  def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+    self.max_attempts = max_attempts
+
+  def put(self, items: Iterable[Dict]) -> int:
+    """作業を登録し、新しく登録した件数を返す"""
+    return self._put(list(items))
+
+  def _put(self, items: List[Dict]) -> int:
+    raise NotImplementedError
+
+  def lease(self, worker: str, count: int = 1, visibility: float = DEFAULT_VISIBILITY) -> List[Dict]:
+    raise NotImplementedError
+
+  def extend(self, lease: Dict, visibility: float = DEFAULT_VISIBILITY) -> bool:
+    """リースを今から visibility 秒に延ばす（リースが切れていれば False）"""
+    raise NotImplementedError
+
+  def ack(self, lease: Dict, result: Dict) -> bool:
+    raise NotImplementedError
+
+  def nack(self, lease: Dict, error: str, failure: Optional[str] = None) -> bool:
+    raise NotImplementedError
+
+  def counts(self) -> Dict[str, int]:
+    """状態ごとの件数（期限切れのリースを回収してから数える）"""
+    raise NotImplementedError
+
+  def iter_items(self, state: str, kind: Optional[str] = None) -> Iterator[Dict]:
+    """done / dead の作業を {"id", "kind", "payload", "attempts", "result" / "error"} で返す"""
+    raise NotImplementedError
+
+  def requeue_dead(self) -> int:
+    """dead の作業を attempts を0にして待ちに戻し、件数を返す"""
+    raise NotImplementedError
+
+  def clear(self):
+    raise NotImplementedError
+
+  def recover(self) -> int:
+    """内容だけが登録され、どの状態にも無い作業を待ちに戻して件数を返す
+
+    状態の変更が1回の操作で済む方式（SQLite のトランザクション、Redis のスクリプト）では
+    起きないので何もしない。
+    """
+    return 0
+
+  def unfinished(self) -> int:
+    """まだ完了していない（待ち・リース中の）作業の数"""
+    counts = self.counts()
+    return counts["pending"] + counts["leased"]
+
+  def close(self):
+    pass
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_items (
+  seq INTEGER PRIMARY KEY AUTOINCREMENT,
+  id TEXT NOT NULL UNIQUE,
+  kind TEXT NOT NULL,
+  payload TEXT NOT NULL,
+  state TEXT NOT NULL DEFAULT 'pending',
+  attempts INTEGER NOT NULL DEFAULT 0,
+  token TEXT,
+  lease_until REAL,
+  worker TEXT,
+  result TEXT,
+  error TEXT,
+  updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS work_items_state ON work_items(state, lease_until);
+"""
+
+
+class SqliteWorkQueue(WorkQueue):
+  """SQLiteの作業キュー（同じマシンの複数プロセスで共有する。ネットワーク上のファイルでは使わない）
+
+  取り出しは BEGIN IMMEDIATE の中で選んで更新するので、同じ作業を2つのワーカーが取ることはない。
+  """
+
+  name = "sqlite"
+
+  def __init__(self, path: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+    super().__init__(max_attempts)
+    self.path = path
+    self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    self.conn.execute("PRAGMA journal_mode=WAL")
+    self.conn.executescript(SQLITE_SCHEMA)
+    self._lock = threading.Lock()
+
+  def _write(self, sql: str, params=()) -> int:
+    with self._lock:
+      return self.conn.execute(sql, params).rowcount
+
+  def _put(self, items: List[Dict]) -> int:
+    now = time.time()
+    with self._lock:
+      self.conn.execute("BEGIN IMMEDIATE")
+      try:
+        added = sum(self.conn.execute(
+            "INSERT OR IGNORE INTO work_items (id, kind, payload, updated_at) VALUES (?, ?, ?, ?)",
+            (item["id"], item["kind"], json.dumps(item["payload"], ensure_ascii=False), now)).rowcount
+                    for item in items)
+        self.conn.execute("COMMIT")
+      except BaseException:
+        self.conn.execute("ROLLBACK")
+        raise
+    return added
+
+  def _reap(self, now: float):
+    """期限切れのリースのうち max_attempts に達したものを dead にする（残りは lease が取り直す）"""
+    self.conn.execute(
+        """UPDATE work_items SET state = 'dead', error = ?, token = NULL, lease_until = NULL,
+             updated_at = ? WHERE state = 'leased' AND lease_until < ? AND attempts >= ?""",
+        (json.dumps({"error": LEASE_EXPIRED_ERROR, "failure": LEASE_EXPIRED}, ensure_ascii=False),
+         now, now, self.max_attempts))
+
+  def lease(self, worker: str, count: int = 1, visibility: float = DEFAULT_VISIBILITY) -> List[Dict]:
+    now = time.time()
+    leases = []
+    with self._lock:
+      self.conn.execute("BEGIN IMMEDIATE")
+      try:
+        self._reap(now)
+        rows = self.conn.execute(
+            """SELECT id, kind, payload, attempts FROM work_items
+               WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?)
+               ORDER BY seq LIMIT ?""", (now, count)).fetchall()
+        for item_id, kind, payload, attempts in rows:
+          token = uuid.uuid4().hex
+          self.conn.execute(
+              """UPDATE work_items SET state = 'leased', token = ?, lease_until = ?, worker = ?,
+                   attempts = attempts + 1, updated_at = ? WHERE id = ?""",
+              (token, now + visibility, worker, now, item_id))
+          leases.append({"id": item_id, "kind": kind, "payload": json.loads(payload),
+                         "token": token, "attempts": attempts + 1})
+        self.conn.execute("COMMIT")
+      except BaseException:
+        self.conn.execute("ROLLBACK")
+        raise
+    return leases
+
+  def extend(self, lease: Dict, visibility: float = DEFAULT_VISIBILITY) -> bool:
+    return self._write(
+        "UPDATE work_items SET lease_until = ? WHERE id = ? AND token = ? AND state = 'leased'",
+        (time.time() + visibility, lease["id"], lease["token"])) == 1
+
+  def ack(self, lease: Dict, result: Dict) -> bool:
+    return self._write(
+        """UPDATE work_items SET state = 'done', result = ?, error = NULL, token = NULL,
+             lease_until = NULL, updated_at = ? WHERE id = ? AND token = ? AND state = 'leased'""",
+        (json.dumps(result, ensure_ascii=False), time.time(), lease["id"], lease["token"])) == 1
+
+  def nack(self, lease: Dict, error: str, failure: Optional[str] = None) -> bool:
+    return self._write(
+        """UPDATE work_items SET state = CASE WHEN attempts >= ? THEN 'dead' ELSE 'pending' END,
+             error = ?, token = NULL, lease_until = NULL, updated_at = ?
+           WHERE id = ? AND token = ? AND state = 'leased'""",
+        (self.max_attempts, json.dumps({"error": error, "failure": failure}, ensure_ascii=False),
+         time.time(), lease["id"], lease["token"])) == 1
+
+  def counts(self) -> Dict[str, int]:
+    now = time.time()
+    counts = dict.fromkeys(STATES, 0)
+    with self._lock:
+      self._reap(now)
+      for state, expired, count in self.conn.execute(
+          """SELECT state, state = 'leased' AND lease_until < ?, COUNT(*) FROM work_items
+             GROUP BY 1, 2""", (now,)):
+        counts["pending" if expired else state] += count
+    return counts
+
+  def iter_items(self, state: str, kind: Optional[str] = None) -> Iterator[Dict]:
+    with self._lock:
+      rows = self.conn.execute(
+          "SELECT id, kind, payload, attempts, result, error FROM work_items "
+          "WHERE state = ? AND (? IS NULL OR kind = ?) ORDER BY seq", (state, kind, kind)).fetchall()
+    for item_id, item_kind, payload, attempts, result, error in rows:
+      item = {"id": item_id, "kind": item_kind, "payload": json.loads(payload), "attempts": attempts}
+      if state == "done":
+        item["result"] = json.loads(result)
+      else:
+        item.update(json.loads(error) if error else {"error": None, "failure": None})
+      yield item
+
+  def requeue_dead(self) -> int:
+    return self._write("UPDATE work_items SET state = 'pending', attempts = 0, updated_at = ? "
+                       "WHERE state = 'dead'", (time.time(),))
+
+  def clear(self):
+    self._write("DELETE FROM work_items")
+
+  def close(self):
+    self.conn.close()
+
+
+class FileWorkQueue(WorkQueue):
+  """ディレクトリの作業キュー（共有ディレクトリを複数のマシンからマウントして使える）
+
+  状態はファイル名で表し、状態の変更は全てファイルの rename（アトミック）で行う。
+  - items/<id>.json: 作業の内容。一時ファイルに書いてから link で公開するので、
+    二重登録されず、書きかけの内容が見えることもない。
+    これと pending の作成の間にプロセスが落ちた作業は recover() で待ちに戻す
+  - pending/<id>~<attempts>
+  - leased/<id>~<token>~<attempts>~<期限(ミリ秒)>
+  - done/<id>~<attempts>~<ackごとの値>（結果は results/<同じ名前>.json）
+  - dead/<id>~<attempts>（失敗は errors/<id>.json）
+  rename に成功したワーカーだけがその状態変更の持ち主になるので、取り出し・ack・期限切れの
+  回収が競合しても1つだけが成功する。
+  """
+
+  name = "file"
+  DIRS = ("items", "pending", "leased", "done", "dead", "results", "errors")
+
+  def __init__(self, directory: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+    super().__init__(max_attempts)
+    self.directory = directory
+    for name in self.DIRS:
+      os.makedirs(os.path.join(directory, name), exist_ok=True)
+
+  def _path(self, *parts: str) -> str:
+    return os.path.join(self.directory, *parts)
+
+  def _rename(self, source: str, target: str) -> bool:
+    try:
+      os.rename(source, target)
+      return True
+    except FileNotFoundError:
+      return False
+
+  def _write_json(self, path: str, data: Dict):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+      json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+  def _read_json(self, path: str) -> Dict:
+    with open(path, encoding="utf-8") as f:
+      return json.load(f)
+
+  @staticmethod
+  def _lease_name(lease: Dict) -> str:
+    return f"{lease['id']}~{lease['token']}~{lease['attempts']}~{lease['expires']}"
+
+  def _put(self, items: List[Dict]) -> int:
+    added = 0
+    for item in items:
+      path = self._path("items", f"{item['id']}.json")
+      if os.path.exists(path):
+        continue
+      tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+      with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"kind": item["kind"], "payload": item["payload"]}, f, ensure_ascii=False)
+      try:
+        # link は既にあれば失敗する（rename と違って上書きしない）ので、登録は1回だけ
+        os.link(tmp_path, path)
+      except FileExistsError:
+        continue
+      finally:
+        os.remove(tmp_path)
+      open(self._path("pending", f"{item['id']}~0"), "w").close()
+      added += 1
+    return added
+
+  def _reap(self, now_ms: int):
+    """期限切れのリースを待ちに戻す（max_attempts に達したものは dead にする）"""
+    for name in os.listdir(self._path("leased")):
+      item_id, _, attempts, expires = name.split("~")
+      if int(expires) >= now_ms:
+        continue
+      state = "dead" if int(attempts) >= self.max_attempts else "pending"
+      if self._rename(self._path("leased", name), self._path(state, f"{item_id}~{attempts}")) \
+          and state == "dead":
+        self._write_json(self._path("errors", f"{item_id}.json"),
+                         {"error": LEASE_EXPIRED_ERROR, "failure": LEASE_EXPIRED})
+
+  @staticmethod
+  def _oldest_first(directory: str) -> List[os.DirEntry]:
+    """ファイルの更新時刻（待ちに入った時刻）の古い順。途中で他のワーカーが動かしたものは除く"""
+    entries = []
+    for entry in os.scandir(directory):
+      try:
+        entries.append((entry.stat().st_mtime_ns, entry))
+      except FileNotFoundError:
+        continue
+    return [entry for _, entry in sorted(entries, key=lambda pair: (pair[0], pair[1].name))]
+
+  def lease(self, worker: str, count: int = 1, visibility: float = DEFAULT_VISIBILITY) -> List[Dict]:
+    now_ms = int(time.time() * 1000)
+    self._reap(now_ms)
+    leases = []
+    for entry in self._oldest_first(self._path("pending")):
+      if len(leases) >= count:
+        break
+      item_id, attempts = entry.name.split("~")
+      lease = {"id": item_id, "token": uuid.uuid4().hex, "attempts": int(attempts) + 1,
+               "expires": now_ms + int(visibility * 1000)}
+      leased_path = self._path("leased", self._lease_name(lease))
+      if not self._rename(entry.path, leased_path):
+        continue  # 他のワーカーが先に取り出した
+      try:
+        item = self._read_json(self._path("items", f"{item_id}.json"))
+      except (OSError, ValueError) as e:
+        # 以前の版で登録の途中に落ちて内容が空のまま残ったもの等。配らずに dead にする
+        if self._rename(leased_path, self._path("dead", f"{item_id}~{lease['attempts']}")):
+          self._write_json(self._path("errors", f"{item_id}.json"),
+                           {"error": f"作業の内容を読み込めません: {e}", "failure": "unreadable"})
+        continue
+      lease.update(kind=item["kind"], payload=item["payload"], worker=worker)
+      leases.append(lease)
+    return leases
+
+  def extend(self, lease: Dict, visibility: float = DEFAULT_VISIBILITY) -> bool:
+    renewed = dict(lease, expires=int((time.time() + visibility) * 1000))
+    if not self._rename(self._path("leased", self._lease_name(lease)),
+                        self._path("leased", self._lease_name(renewed))):
+      return False
+    lease["expires"] = renewed["expires"]
+    return True
+
+  def ack(self, lease: Dict, result: Dict) -> bool:
+    # 結果は ack ごとのファイルに先に書き、リースを done に移せた場合だけ有効にする
+    # （同じリースの ack が重なっても、有効な結果のファイルを上書き・削除しない）
+    done_name = f"{lease['id']}~{lease['attempts']}~{uuid.uuid4().hex}"
+    result_path = self._path("results", f"{done_name}.json")
+    self._write_json(result_path, result)
+    if self._rename(self._path("leased", self._lease_name(lease)), self._path("done", done_name)):
+      return True
+    os.remove(result_path)
+    return False
+
+  def nack(self, lease: Dict, error: str, failure: Optional[str] = None) -> bool:
+    state = "dead" if lease["attempts"] >= self.max_attempts else "pending"
+    if not self._rename(self._path("leased", self._lease_name(lease)),
+                        self._path(state, f"{lease['id']}~{lease['attempts']}")):
+      return False
+    self._write_json(self._path("errors", f"{lease['id']}.json"), {"error": error, "failure": failure})
+    return True
+
+  def counts(self) -> Dict[str, int]:
+    now_ms = int(time.time() * 1000)
+    self._reap(now_ms)
+    counts = {state: len(os.listdir(self._path(state))) for state in STATES}
+    expired = sum(1 for name in os.listdir(self._path("leased")) if int(name.rsplit("~", 1)[1]) < now_ms)
+    counts["leased"] -= expired
+    counts["pending"] += expired
+    return counts
+
+  def iter_items(self, state: str, kind: Optional[str] = None) -> Iterator[Dict]:
+    for name in sorted(os.listdir(self._path(state))):
+      item_id, attempts = name.split("~")[:2]
+      try:
+        item = self._read_json(self._path("items", f"{item_id}.json"))
+      except (OSError, ValueError):
+        continue
+      if kind is not None and item["kind"] != kind:
+        continue
+      record = {"id": item_id, "kind": item["kind"], "payload": item["payload"],
+                "attempts": int(attempts)}
+      if state == "done":
+        record["result"] = self._read_json(self._path("results", f"{name}.json"))
+      else:
+        try:
+          record.update(self._read_json(self._path("errors", f"{item_id}.json")))
+        except FileNotFoundError:
+          record.update(error=None, failure=None)
+      yield record
+
+  def requeue_dead(self) -> int:
+    requeued = 0
+    for name in os.listdir(self._path("dead")):
+      item_id = name.split("~")[0]
+      requeued += self._rename(self._path("dead", name), self._path("pending", f"{item_id}~0"))
+    return requeued
+
+  def recover(self, grace: float = RECOVER_GRACE) -> int:
+    """内容（items/）だけがあり、どの状態のディレクトリにも無い作業を待ちに戻す
+
+    登録中の作業を拾わないよう、内容のファイルが grace 秒より古いものだけを戻す。
+    複数のプロセスが同時に呼ぶと同じ作業が2回処理されることがあるが、結果は ack に従う。
+    """
+    known = {name.split("~")[0] for state in STATES for name in os.listdir(self._path(state))}
+    deadline = time.time() - grace
+    recovered = 0
+    for entry in os.scandir(self._path("items")):
+      if not entry.name.endswith(".json"):
+        continue  # 登録中の一時ファイル
+      item_id = entry.name[:-len(".json")]
+      if item_id in known:
+        continue
+      try:
+        if entry.stat().st_mtime > deadline:
+          continue
+        fd = os.open(self._path("pending", f"{item_id}~0"), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+      except (FileNotFoundError, FileExistsError):
+        continue
+      os.close(fd)
+      recovered += 1
+    return recovered
+
+  def clear(self):
+    for name in self.DIRS:
+      for file_name in os.listdir(self._path(name)):
+        os.remove(self._path(name, file_name))
+
+
+# RedisWorkQueue の状態の変更。1つのスクリプトは他のコマンドに割り込まれずに実行されるので、
+# 途中でワーカーが落ちても作業がどの状態にも無くなることはない
+
+# KEYS: items, pending / ARGV: id, 内容, id, 内容, ...
+_PUT_SCRIPT = """
+local added = 0
+for i = 1, #ARGV, 2 do
+  if redis.call('HSETNX', KEYS[1], ARGV[i], ARGV[i + 1]) == 1 then
+    redis.call('LPUSH', KEYS[2], ARGV[i])
+    added = added + 1
+  end
+end
+return added
+"""
+
+# KEYS: pending, leases, attempts / ARGV: 期限, token, token, ... → {id, attempts, id, attempts, ...}
+_LEASE_SCRIPT = """
+local leased = {}
+for i = 2, #ARGV do
+  local id = redis.call('RPOP', KEYS[1])
+  if not id then
+    break
+  end
+  redis.call('ZADD', KEYS[2], ARGV[1], id .. '~' .. ARGV[i])
+  table.insert(leased, id)
+  table.insert(leased, redis.call('HINCRBY', KEYS[3], id, 1))
+end
+return leased
+"""
+
+# KEYS: leases, pending, attempts, dead / ARGV: 現在時刻, max_attempts, 失敗の種類, 失敗の内容
+_REAP_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+for _, member in ipairs(expired) do
+  local id = string.match(member, '^[^~]+')
+  local attempts = tonumber(redis.call('HGET', KEYS[3], id) or '0')
+  redis.call('ZREM', KEYS[1], member)
+  if attempts >= tonumber(ARGV[2]) then
+    redis.call('HSET', KEYS[4], id,
+               cjson.encode({error = ARGV[4], failure = ARGV[3], attempts = attempts}))
+  else
+    redis.call('RPUSH', KEYS[2], id)
+  end
+end
+return #expired
+"""
+
+# KEYS: leases, done / ARGV: "id~token", id, 結果
+_ACK_SCRIPT = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+  return 0
+end
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[3])
+return 1
+"""
+
+# KEYS: leases, pending, dead / ARGV: "id~token", id, 失敗（空なら待ちに戻す）
+_NACK_SCRIPT = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+  return 0
+end
+if ARGV[3] == '' then
+  redis.call('LPUSH', KEYS[2], ARGV[2])
+else
+  redis.call('HSET', KEYS[3], ARGV[2], ARGV[3])
+end
+return 1
+"""
+
+# KEYS: dead, attempts, pending
+_REQUEUE_SCRIPT = """
+local ids = redis.call('HKEYS', KEYS[1])
+for _, id in ipairs(ids) do
+  redis.call('HDEL', KEYS[2], id)
+  redis.call('LPUSH', KEYS[3], id)
+end
+redis.call('DEL', KEYS[1])
+return #ids
+"""
+
+
+class RedisWorkQueue(WorkQueue):
+  """Redis（互換サーバーを含む）の作業キュー。複数のマシンのワーカーで共有する
+
+  - <prefix>:items（ハッシュ）: id → 作業の内容。HSETNX で二重登録を防ぐ
+  - <prefix>:pending（リスト）: 待ちの id。RPOP で1つのワーカーだけが取り出す
+  - <prefix>:leases（ソート済み集合）: "id~token" → 期限。ZREM に成功した1者だけが
+    ack / nack / 期限切れの回収をできるので、古いリースの ack は無視される
+  - <prefix>:attempts / :done / :dead（ハッシュ）: 試行回数・結果・失敗
+  複数のキーにまたがる状態の変更（登録・取り出し・回収・ack・nack）は Lua スクリプトで
+  まとめて実行する（Redis はスクリプトの実行中に他のコマンドを割り込ませない）。
+  client は redis-py と同じメソッド（register_script を含む）を持つもの（decode_responses=True）。
+  テストなどでは MemoryRedis で置き換えられる。
+  """
+
+  name = "redis"
+
+  def __init__(self, client, prefix: str = "crawl", max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+    super().__init__(max_attempts)
+    self.client = client
+    self.prefix = prefix
+    self._put_script = client.register_script(_PUT_SCRIPT)
+    self._lease_script = client.register_script(_LEASE_SCRIPT)
+    self._reap_script = client.register_script(_REAP_SCRIPT)
+    self._ack_script = client.register_script(_ACK_SCRIPT)
+    self._nack_script = client.register_script(_NACK_SCRIPT)
+    self._requeue_script = client.register_script(_REQUEUE_SCRIPT)
+
+  def _key(self, name: str) -> str:
+    return f"{self.prefix}:{name}"
+
+  def _keys(self, *names: str) -> List[str]:
+    return [self._key(name) for name in names]
+
+  def _put(self, items: List[Dict]) -> int:
+    if not items:
+      return 0
+    args = []
+    for item in items:
+      args += [item["id"], json.dumps({"kind": item["kind"], "payload": item["payload"]},
+                                      ensure_ascii=False)]
+    return int(self._put_script(keys=self._keys("items", "pending"), args=args))
+
+  def _reap(self, now: float):
+    """期限切れのリースを待ちの先頭に戻す（max_attempts に達したものは dead にする）"""
+    self._reap_script(keys=self._keys("leases", "pending", "attempts", "dead"),
+                      args=[now, self.max_attempts, LEASE_EXPIRED, LEASE_EXPIRED_ERROR])
+
+  def lease(self, worker: str, count: int = 1, visibility: float = DEFAULT_VISIBILITY) -> List[Dict]:
+    now = time.time()
+    self._reap(now)
+    tokens = [uuid.uuid4().hex for _ in range(count)]
+    leased = self._lease_script(keys=self._keys("pending", "leases", "attempts"),
+                                args=[now + visibility] + tokens)
+    leases = []
+    for item_id, attempts, token in zip(leased[::2], leased[1::2], tokens):
+      item = json.loads(self.client.hget(self._key("items"), item_id))
+      leases.append({"id": item_id, "kind": item["kind"], "payload": item["payload"],
+                     "token": token, "attempts": int(attempts), "worker": worker})
+    return leases
+
+  def extend(self, lease: Dict, visibility: float = DEFAULT_VISIBILITY) -> bool:
+    # XX: 既にあるリースだけを更新（回収済みなら何もしない）、CH: 更新した数を返す
+    return bool(self.client.zadd(self._key("leases"),
+                                 {f"{lease['id']}~{lease['token']}": time.time() + visibility},
+                                 xx=True, ch=True))
+
+  def ack(self, lease: Dict, result: Dict) -> bool:
+    data = json.dumps({"result": result, "attempts": lease["attempts"]}, ensure_ascii=False)
+    return bool(self._ack_script(keys=self._keys("leases", "done"),
+                                 args=[f"{lease['id']}~{lease['token']}", lease["id"], data]))
+
+  def nack(self, lease: Dict, error: str, failure: Optional[str] = None) -> bool:
+    data = ""
+    if lease["attempts"] >= self.max_attempts:
+      data = json.dumps({"error": error, "failure": failure, "attempts": lease["attempts"]},
+                        ensure_ascii=False)
+    return bool(self._nack_script(keys=self._keys("leases", "pending", "dead"),
+                                  args=[f"{lease['id']}~{lease['token']}", lease["id"], data]))
+
+  def counts(self) -> Dict[str, int]:
+    now = time.time()
+    self._reap(now)
+    leased = self.client.zcard(self._key("leases"))
+    expired = len(self.client.zrangebyscore(self._key("leases"), "-inf", now))
+    return {"pending": self.client.llen(self._key("pending")) + expired,
+            "leased": leased - expired,
+            "done": self.client.hlen(self._key("done")),
+            "dead": self.client.hlen(self._key("dead"))}
+
+  def iter_items(self, state: str, kind: Optional[str] = None) -> Iterator[Dict]:
+    for item_id, data in sorted(self.client.hgetall(self._key(state)).items()):
+      item = json.loads(self.client.hget(self._key("items"), item_id))
+      if kind is not None and item["kind"] != kind:
+        continue
+      record = {"id": item_id, "kind": item["kind"], "payload": item["payload"], **json.loads(data)}
+      yield record
+
+  def requeue_dead(self) -> int:
+    return int(self._requeue_script(keys=self._keys("dead", "attempts", "pending")))
+
+  def clear(self):
+    self.client.delete(*self._keys("items", "pending", "leases", "attempts", "done", "dead"))
+
+
+class MemoryRedis:
+  """RedisWorkQueue が使うコマンドだけを持つ、プロセス内の Redis の代わり
+
+  同じプロセスのスレッド間でキューを共有する場合や、Redis サーバーの無い環境での確認に使う。
+  値は decode_responses=True の redis-py と同じく文字列で返す。
+  Lua は実行できないため、register_script は同じ動作の Python 実装（_MEMORY_SCRIPTS）を
+  ロックを取ったまま実行する関数を返す。
+  """
+
+  def __init__(self):
+    self._data: Dict[str, object] = {}
+    self._lock = threading.RLock()
+
+  def _get(self, key: str, factory):
+    value = self._data.get(key)
+    if value is None:
+      value = self._data[key] = factory()
+    return value
+
+  def register_script(self, script: str):
+    function = _MEMORY_SCRIPTS[script]
+
+    def run(keys=(), args=()):
+      with self._lock:
+        return function(self, list(keys), [str(arg) for arg in args])
+    return run
+
+  def hsetnx(self, key: str, field: str, value: str) -> int:
+    with self._lock:
+      table = self._get(key, dict)
+      if field in table:
+        return 0
+      table[field] = value
+      return 1
+
+  def hset(self, key: str, field: str, value: str) -> int:
+    with self._lock:
+      table = self._get(key, dict)
+      added = field not in table
+      table[field] = value
+      return int(added)
+
+  def hget(self, key: str, field: str) -> Optional[str]:
+    with self._lock:
+      return self._data.get(key, {}).get(field)
+
+  def hdel(self, key: str, *fields: str) -> int:
+    with self._lock:
+      table = self._data.get(key, {})
+      return sum(table.pop(field, None) is not None for field in fields)
+
+  def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+    with self._lock:
+      table = self._get(key, dict)
+      table[field] = str(int(table.get(field, 0)) + amount)
+      return int(table[field])
+
+  def hkeys(self, key: str) -> List[str]:
+    with self._lock:
+      return list(self._data.get(key, {}))
+
+  def hgetall(self, key: str) -> Dict[str, str]:
+    with self._lock:
+      return dict(self._data.get(key, {}))
+
+  def hlen(self, key: str) -> int:
+    with self._lock:
+      return len(self._data.get(key, {}))
+
+  def lpush(self, key: str, *values: str) -> int:
+    with self._lock:
+      items = self._get(key, list)
+      for value in values:
+        items.insert(0, value)
+      return len(items)
+
+  def rpush(self, key: str, *values: str) -> int:
+    with self._lock:
+      items = self._get(key, list)
+      items.extend(values)
+      return len(items)
+
+  def rpop(self, key: str) -> Optional[str]:
+    with self._lock:
+      items = self._data.get(key)
+      return items.pop() if items else None
+
+  def llen(self, key: str) -> int:
+    with self._lock:
+      return len(self._data.get(key, []))
+
+  def zadd(self, key: str, mapping: Dict[str, float], xx: bool = False, ch: bool = False) -> int:
+    with self._lock:
+      scores = self._get(key, dict)
+      changed = 0
+      for member, score in mapping.items():
+        if xx and member not in scores:
+          continue
+        if member not in scores or (ch and scores[member] != float(score)):
+          changed += 1
+        scores[member] = float(score)
+      return changed
+
+  def zrem(self, key: str, *members: str) -> int:
+    with self._lock:
+      scores = self._data.get(key, {})
+      return sum(scores.pop(member, None) is not None for member in members)
+
+  def zrangebyscore(self, key: str, low, high) -> List[str]:
+    low, high = float(low), float(high)
+    with self._lock:
+      items = sorted(self._data.get(key, {}).items(), key=lambda item: item[1])
+      return [member for member, score in items if low <= score <= high]
+
+  def zcard(self, key: str) -> int:
+    with self._lock:
+      return len(self._data.get(key, {}))
+
+  def delete(self, *keys: str) -> int:
+    with self._lock:
+      return sum(self._data.pop(key, None) is not None for key in keys)
+
+
+def _memory_put(client: MemoryRedis, keys: List[str], args: List[str]) -> int:
+  added = 0
+  for item_id, data in zip(args[::2], args[1::2]):
+    if client.hsetnx(keys[0], item_id, data):
+      client.lpush(keys[1], item_id)
+      added += 1
+  return added
+
+
+def _memory_lease(client: MemoryRedis, keys: List[str], args: List[str]) -> List:
+  leased = []
+  for token in args[1:]:
+    item_id = client.rpop(keys[0])
+    if item_id is None:
+      break
+    client.zadd(keys[1], {f"{item_id}~{token}": args[0]})
+    leased += [item_id, client.hincrby(keys[2], item_id, 1)]
+  return leased
+
+
+def _memory_reap(client: MemoryRedis, keys: List[str], args: List[str]) -> int:
+  expired = client.zrangebyscore(keys[0], "-inf", args[0])
+  for member in expired:
+    item_id = member.split("~")[0]
+    attempts = int(client.hget(keys[2], item_id) or 0)
+    client.zrem(keys[0], member)
+    if attempts >= int(args[1]):
+      client.hset(keys[3], item_id, json.dumps(
+          {"error": args[3], "failure": args[2], "attempts": attempts}, ensure_ascii=False))
+    else:
+      client.rpush(keys[1], item_id)
+  return len(expired)
+
+
+def _memory_ack(client: MemoryRedis, keys: List[str], args: List[str]) -> int:
+  if not client.zrem(keys[0], args[0]):
+    return 0
+  client.hset(keys[1], args[1], args[2])
+  return 1
+
+
+def _memory_nack(client: MemoryRedis, keys: List[str], args: List[str]) -> int:
+  if not client.zrem(keys[0], args[0]):
+    return 0
+  if args[2] == "":
+    client.lpush(keys[1], args[1])
+  else:
+    client.hset(keys[2], args[1], args[2])
+  return 1
+
+
+def _memory_requeue(client: MemoryRedis, keys: List[str], args: List[str]) -> int:
+  ids = client.hkeys(keys[0])
+  for item_id in ids:
+    client.hdel(keys[1], item_id)
+    client.lpush(keys[2], item_id)
+  client.delete(keys[0])
+  return len(ids)
+
+
+_MEMORY_SCRIPTS = {
+    _PUT_SCRIPT: _memory_put,
+    _LEASE_SCRIPT: _memory_lease,
+    _REAP_SCRIPT: _memory_reap,
+    _ACK_SCRIPT: _memory_ack,
+    _NACK_SCRIPT: _memory_nack,
+    _REQUEUE_SCRIPT: _memory_requeue,
+}
+
+
+# 同じプロセス内で memory:// を開いた場合は同じキューを共有する
+_memory_servers: Dict[str, MemoryRedis] = {}
+
+
+def open_queue(url: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> WorkQueue:
+  """URLから作業キューを開く
+
+  - sqlite:///path/to/queue.db（または .db で終わるパス）: SQLite
+  - file:///path/to/dir（またはディレクトリのパス）: ファイル
+  - redis://host:6379/0[#prefix]: Redis（redis パッケージが必要）
+  - memory://name[#prefix]: プロセス内の MemoryRedis（Redis の代わり）
+  """
+  if url.startswith("redis://") or url.startswith("rediss://") or url.startswith("memory://"):
+    location, _, prefix = url.partition("#")
+    if location.startswith("memory://"):
+      client = _memory_servers.setdefault(location, MemoryRedis())
+    else:
+      import redis
+      client = redis.Redis.from_url(location, decode_responses=True)
+    return RedisWorkQueue(client, prefix or "crawl", max_attempts)
+  if url.startswith("sqlite://"):
+    return SqliteWorkQueue(url[len("sqlite://"):], max_attempts)
+  if url.startswith("file://"):
+    return FileWorkQueue(url[len("file://"):], max_attempts)
+  if url.endswith(".db"):
+    return SqliteWorkQueue(url, max_attempts)
+  return FileWorkQueue(url, max_attempts)